@@ -1,8 +1,281 @@
-from fastapi import FastAPI
+"""HTTP API for the dashboards.
+
+``/search`` answers full-text and faceted queries from an in-process
+:class:`search.SearchIndex`. :class:`CatalogFeed` loads the catalog from
+Supabase once at startup and then polls ``latest_snapshots`` every
+``API_POLL_SECONDS`` for rows it has not applied yet, so each ingestion run
+reaches the index without any per-request database query. The same
+batches are diffed by :class:`push.Broadcaster` and pushed to ``/stream``
+subscribers as Server-Sent Events. ``/history`` returns downsampled,
+columnar chart series (see ``series.py``).
+
+``/search``, ``/snapshots`` and ``/history`` also answer in MessagePack or
+as an Arrow IPC stream and are compressed per ``Accept-Encoding`` (see
+``formats.py``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from common import _chunked, http_get
+from formats import NotAcceptable, respond
+from push import Broadcaster
+from search import SearchIndex
+from series import build_series, decode
+
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SERVICE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+SUPA_HEADERS = {
+    "apikey": SERVICE_KEY or "",
+    "Authorization": f"Bearer {SERVICE_KEY}" if SERVICE_KEY else "",
+}
+# browsers on the static dashboard call /history, /search and /stream
+API_CORS_ORIGINS = os.environ.get("API_CORS_ORIGINS", "*").split(",")
+API_POLL_SECONDS = float(os.environ.get("API_POLL_SECONDS", "15"))
+# loaders stamp rows with their start time but write them at the end, so a
+# slow run lands rows older than the newest already seen; each poll re-reads
+# this far behind its cursor (longer than a loader run)
+API_POLL_OVERLAP_SECONDS = float(os.environ.get("API_POLL_OVERLAP_SECONDS", "900"))
+PAGE_SIZE = 1000
+# market ids per ``in.(...)`` filter; keeps request URLs short
+IN_FILTER_SIZE = 200
+
+MARKET_COLUMNS = "market_id,market_name,market_description,event_name,tags,source,status,expiration"
+
+
+def fetch_all(table: str, params: dict) -> list[dict]:
+    """Return every row of *table* matching PostgREST *params*, page by page."""
+    url = f"{SUPABASE_URL}/rest/v1/{table}"
+    rows: list[dict] = []
+    offset = 0
+    while True:
+        page = {**params, "limit": PAGE_SIZE, "offset": offset}
+        r = http_get(url, headers=SUPA_HEADERS, params=page, timeout=60)
+        r.raise_for_status()
+        batch = r.json()
+        rows.extend(batch)
+        if len(batch) < PAGE_SIZE:
+            return rows
+        offset += PAGE_SIZE
+
+
+def _parse_ts(value: str) -> datetime:
+    dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+class CatalogFeed:
+    """Keep *index* in sync with Supabase and fan new batches out to listeners."""
+
+    def __init__(self, index: SearchIndex, interval: float = API_POLL_SECONDS,
+                 overlap: float = API_POLL_OVERLAP_SECONDS):
+        self.index = index
+        self.interval = interval
+        self.overlap = overlap
+        self.cursor: datetime | None = None
+        # market_id → timestamp of the snapshot last applied
+        self._seen: dict[str, datetime] = {}
+        # callables receiving each batch of new latest_snapshots rows
+        self.listeners: list = []
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def load(self) -> None:
+        markets = fetch_all("markets", {"select": MARKET_COLUMNS, "order": "market_id"})
+        self.index.upsert(markets)
+        self._apply(fetch_all("latest_snapshots", {"select": "*", "order": "timestamp.asc"}))
+        logging.info("search index loaded %s markets", len(self.index.docs))
+
+    def poll(self) -> list[dict]:
+        """Fetch and apply the snapshots not applied yet.
+
+        Reads ``overlap`` seconds behind the newest timestamp seen and drops
+        rows whose market already has that snapshot or a later one.
+        """
+        params = {"select": "*", "order": "timestamp.asc"}
+        if self.cursor:
+            since = self.cursor - timedelta(seconds=self.overlap)
+            params["timestamp"] = f"gt.{since.isoformat().replace('+00:00', 'Z')}"
+        rows = [r for r in fetch_all("latest_snapshots", params) if self._is_new(r)]
+        unknown = sorted({r["market_id"] for r in rows
+                          if r.get("market_id") not in self.index.docs})
+        for ids in _chunked(unknown, IN_FILTER_SIZE):
+            self.index.upsert(fetch_all("markets", {
+                "select": MARKET_COLUMNS,
+                "market_id": f"in.({','.join(ids)})",
+                "order": "market_id",
+            }))
+        self._apply(rows)
+        return rows
+
+    def _is_new(self, row: dict) -> bool:
+        seen = self._seen.get(row.get("market_id"))
+        return seen is None or not row.get("timestamp") or _parse_ts(row["timestamp"]) > seen
+
+    def _apply(self, rows: list[dict]) -> None:
+        if not rows:
+            return
+        self.index.upsert(rows)
+        for r in rows:
+            if r.get("timestamp"):
+                ts = _parse_ts(r["timestamp"])
+                self._seen[r["market_id"]] = ts
+                if self.cursor is None or ts > self.cursor:
+                    self.cursor = ts
+        for listener in self.listeners:
+            try:
+                listener(rows)
+            except Exception:  # a broken listener must not stop the feed
+                logging.exception("catalog listener failed")
+
+    def _run(self) -> None:
+        try:
+            self.load()
+        except Exception:
+            logging.exception("initial catalog load failed")
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                logging.exception("catalog poll failed")
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="catalog-feed", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+INDEX = SearchIndex()
+FEED = CatalogFeed(INDEX)
+BROADCASTER = Broadcaster()
+FEED.listeners.append(lambda rows: BROADCASTER.publish(rows))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if SUPABASE_URL:
+        FEED.start()
+    yield
+    FEED.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=API_CORS_ORIGINS, allow_methods=["GET"])
+
+
+@app.exception_handler(NotAcceptable)
+async def not_acceptable(request: Request, exc: NotAcceptable):
+    return JSONResponse({"detail": str(exc)}, status_code=406)
 
-app = FastAPI()
 
 @app.get("/")
 async def read_root():
     return {"message": "Prediction Pulse API"}
 
+
+def _filters(source, category, status, expiry=None) -> dict:
+    return {
+        "source": source,
+        "category": category.lower() if category else None,
+        "status": status.upper() if status else None,
+        "expiry": expiry,
+    }
+
+
+@app.get("/search")
+def search(
+    request: Request,
+    q: str = "",
+    source: str | None = None,
+    category: str | None = None,
+    status: str | None = None,
+    expiry: str | None = Query(None, description="expired, 24h, 7d, 30d, later or none"),
+    sort: str = Query("volume", pattern="^(volume|change|expiration)$"),
+    limit: int = Query(20, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+):
+    """Search market names, descriptions, events and tags with facet counts."""
+    filters = _filters(source, category, status, expiry)
+    try:
+        found = INDEX.search(q, filters=filters, sort=sort, limit=limit, offset=offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return respond(request, {"total": found["total"], "facets": found["facets"]}, found["results"])
+
+
+@app.get("/snapshots")
+def snapshots(
+    request: Request,
+    source: str | None = None,
+    category: str | None = None,
+    status: str | None = None,
+    expiry: str | None = None,
+):
+    """Return the latest snapshot of every market in the catalog.
+
+    Meant for bulk consumers: ask for ``application/vnd.apache.arrow.stream``
+    to load the result directly into a dataframe.
+    """
+    filters = _filters(source, category, status, expiry)
+    found = INDEX.search(filters=filters, limit=max(len(INDEX.docs), 1))
+    return respond(request, {"total": found["total"]}, found["results"])
+
+
+def _split(value: str | None) -> list[str]:
+    return [v for v in (value or "").split(",") if v]
+
+
+@app.get("/stream")
+async def stream(markets: str | None = None, sources: str | None = None):
+    """Push price deltas as Server-Sent Events.
+
+    ``markets`` and ``sources`` are optional comma-separated filters.
+    """
+    sub = BROADCASTER.subscribe(asyncio.get_running_loop(), _split(markets), _split(sources))
+    if sub is None:
+        raise HTTPException(status_code=503, detail="too many open streams",
+                            headers={"Retry-After": "30"})
+    return StreamingResponse(
+        BROADCASTER.events(sub),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/history/{market_id}")
+def history(
+    request: Request,
+    market_id: str,
+    days: float = Query(30, gt=0, le=365),
+    width: int = Query(600, ge=3, le=5000, description="target number of points"),
+):
+    """Return a market's price series downsampled to *width* points.
+
+    ``t0`` is the first epoch second, ``dt`` the gaps between points and
+    ``p`` prices in units of ``1/scale``. As Arrow the series is two
+    columns, ``t`` (epoch seconds) and ``p`` (probability).
+    """
+    if not SUPABASE_URL:
+        raise HTTPException(status_code=503, detail="SUPABASE_URL is not configured")
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    rows = fetch_all("market_snapshots", {
+        "select": "timestamp,price",
+        "market_id": f"eq.{market_id}",
+        "timestamp": f"gte.{since}",
+        "order": "timestamp.asc",
+    })
+    series = build_series(rows, width)
+    ts, prices = decode(series)
+    return respond(request, {"market_id": market_id, **series}, columns={"t": ts, "p": prices})
@@ -0,0 +1,199 @@
+"""Columnar Parquet archive for history pruned from Supabase.
+
+``cleanup_markets.py`` calls :func:`write_archive` with the rows it is about to
+delete. Files are laid out hive-style so they can be scanned with any Parquet
+reader::
+
+    <root>/<table>/date=2024-05-01/source=kalshi/part-<run>.parquet
+
+:func:`read_archive` memory-maps those files and only materialises the
+requested columns and partitions, which keeps long-range backtests cheap.
+"""
+
+from __future__ import annotations
+
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from dateutil import parser
+
+# pyarrow is imported on first use so ``cleanup_markets`` starts fast when
+# archiving is disabled
+pa = ds = pafs = pq = None
+
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR")
+COMPRESSION = os.environ.get("ARCHIVE_COMPRESSION", "zstd")
+
+# Column used to pick the ``date=`` partition for each table.
+PARTITION_FIELD = {
+    "market_snapshots": "timestamp",
+    "market_prices": "timestamp",
+    "market_outcomes": "timestamp",
+    "markets": "expiration",
+}
+
+# ``source`` lives in the directory name, so it is not repeated in the files.
+_TS = ("timestamp", "expiration", "bucket")
+
+
+def _schema(table: str):
+    """Return the Arrow schema for *table* or ``None`` to infer one."""
+    ts = pa.timestamp("us", tz="UTC")
+    schemas = {
+        "market_snapshots": pa.schema([
+            ("id", pa.int64()),
+            ("market_id", pa.string()),
+            ("price", pa.float64()),
+            ("yes_bid", pa.float64()),
+            ("no_bid", pa.float64()),
+            ("volume", pa.int64()),
+            ("dollar_volume", pa.float64()),
+            ("vwap", pa.float64()),
+            ("liquidity", pa.float64()),
+            ("expiration", ts),
+            ("timestamp", ts),
+            ("bucket", ts),
+        ]),
+        "market_prices": pa.schema([
+            ("id", pa.int64()),
+            ("market_id", pa.string()),
+            ("price", pa.float64()),
+            ("change_24h", pa.float64()),
+            ("percent_change_24h", pa.float64()),
+            ("timestamp", ts),
+            ("bucket", ts),
+        ]),
+        "market_outcomes": pa.schema([
+            ("id", pa.int64()),
+            ("market_id", pa.string()),
+            ("outcome_name", pa.string()),
+            ("price", pa.float64()),
+            ("volume", pa.int64()),
+            ("timestamp", ts),
+            ("bucket", ts),
+        ]),
+        "markets": pa.schema([
+            ("market_id", pa.string()),
+            ("market_name", pa.string()),
+            ("market_description", pa.string()),
+            ("event_name", pa.string()),
+            ("event_ticker", pa.string()),
+            ("expiration", ts),
+            ("tags", pa.list_(pa.string())),
+            ("status", pa.string()),
+        ]),
+    }
+    return schemas.get(table)
+
+
+def _require_pyarrow() -> None:
+    global pa, ds, pafs, pq
+    if pa is not None:
+        return
+    try:
+        import pyarrow as pa  # type: ignore
+        import pyarrow.dataset as ds  # type: ignore
+        import pyarrow.fs as pafs  # type: ignore
+        import pyarrow.parquet as pq  # type: ignore
+    except ModuleNotFoundError:  # pragma: no cover - optional dependency
+        raise RuntimeError("The 'pyarrow' library is required for archiving")
+
+
+def _parse_ts(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    dt = parser.isoparse(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def partition_rows(rows: list[dict], ts_field: str = "timestamp") -> dict:
+    """Group *rows* by ``(YYYY-MM-DD, source)`` of their *ts_field*."""
+    parts: dict[tuple[str, str], list[dict]] = defaultdict(list)
+    for r in rows:
+        dt = _parse_ts(r.get(ts_field))
+        day = dt.date().isoformat() if dt else "unknown"
+        parts[(day, r.get("source") or "unknown")].append(r)
+    return dict(parts)
+
+
+def _to_table(table: str, rows: list[dict]):
+    schema = _schema(table)
+    cleaned = []
+    for r in rows:
+        row = {k: v for k, v in r.items() if k != "source"}
+        for k in _TS:
+            if k in row:
+                row[k] = _parse_ts(row[k])
+        cleaned.append(row)
+    if schema is None:
+        return pa.Table.from_pylist(cleaned)
+    return pa.Table.from_pylist(cleaned, schema=schema)
+
+
+def write_archive(table: str, rows: list[dict], root: str | None = None,
+                  *, compression: str = COMPRESSION) -> list[str]:
+    """Write *rows* of *table* under *root* and return the created paths.
+
+    Each call writes a fresh ``part-*.parquet`` file per partition, so
+    re-running an interrupted cleanup never overwrites earlier exports.
+    """
+    root = root or ARCHIVE_DIR
+    if not root:
+        raise RuntimeError("ARCHIVE_DIR must be set to archive rows")
+    if not rows:
+        return []
+    _require_pyarrow()
+
+    run = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:8]
+    ts_field = PARTITION_FIELD.get(table, "timestamp")
+    paths = []
+    for (day, source), part in sorted(partition_rows(rows, ts_field).items()):
+        folder = os.path.join(root, table, f"date={day}", f"source={source}")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"part-{run}.parquet")
+        pq.write_table(_to_table(table, part), path, compression=compression)
+        paths.append(path)
+    return paths
+
+
+def read_archive(table: str, root: str | None = None, *, columns=None,
+                 start: str | None = None, end: str | None = None,
+                 sources=None):
+    """Return archived rows of *table* as a ``pyarrow.Table``.
+
+    ``start``/``end`` are inclusive ``YYYY-MM-DD`` bounds on the ``date``
+    partition and ``sources`` restricts the ``source`` partition; both prune
+    whole directories before any file is opened. Only *columns* are read from
+    the memory-mapped files.
+    """
+    root = root or ARCHIVE_DIR
+    if not root:
+        raise RuntimeError("ARCHIVE_DIR must be set to read the archive")
+    _require_pyarrow()
+
+    base = os.path.join(root, table)
+    if not os.path.isdir(base):
+        return pa.table({c: [] for c in columns or []})
+
+    part_schema = pa.schema([("date", pa.string()), ("source", pa.string())])
+    dataset = ds.dataset(
+        base,
+        format="parquet",
+        partitioning=ds.partitioning(part_schema, flavor="hive"),
+        filesystem=pafs.LocalFileSystem(use_mmap=True),
+    )
+
+    flt = None
+    if start:
+        flt = ds.field("date") >= start
+    if end:
+        cond = ds.field("date") <= end
+        flt = cond if flt is None else flt & cond
+    if sources:
+        cond = ds.field("source").isin(list(sources))
+        flt = cond if flt is None else flt & cond
+    return dataset.to_table(columns=columns, filter=flt)
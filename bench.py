@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+"""CPU micro-benchmarks for the ingestion hot paths.
+
+Every case runs on deterministic synthetic fixtures (fixed seed) so numbers
+are comparable across commits on the same machine::
+
+  python bench.py --out bench.json                      # record a baseline
+  python bench.py --baseline bench.json --threshold 0.2 # fail on >20% slowdowns
+  python bench.py --max-size 10000 -k trades            # quick subset
+
+No network is touched: the HTTP lookups inside the loaders are replaced by
+precomputed fixture values and only the pure row/aggregation code is timed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+# loaders read credentials at import; benchmarks never use them
+for _k, _v in {
+    "SUPABASE_URL": "https://example.supabase.co",
+    "SUPABASE_SERVICE_ROLE_KEY": "bench",
+    "KALSHI_API_KEY": "bench",
+}.items():
+    os.environ.setdefault(_k, _v)
+
+MARKET_SIZES = (1_000, 10_000, 100_000)
+TRADE_SIZES = (10_000, 100_000, 1_000_000)
+REPEAT = int(os.environ.get("BENCH_REPEAT", "3"))
+THRESHOLD = float(os.environ.get("BENCH_THRESHOLD", "0.2"))
+SEED = 1234
+# markets per Kalshi event; outcome replication is quadratic in this
+EVENT_SIZE = 8
+
+NOW = datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+TS = NOW.isoformat().replace("+00:00", "Z")
+
+
+# ───────────────────────── fixtures
+def _iso(dt: datetime) -> str:
+    return dt.isoformat().replace("+00:00", "Z")
+
+
+def make_trades(n: int, seed: int = SEED) -> list[dict]:
+    """Trades spread over the last 48h, half of them inside the 24h window."""
+    rnd = random.Random(seed)
+    return [
+        {
+            "timestamp": _iso(NOW - timedelta(seconds=rnd.randrange(172_800))),
+            "price": rnd.randint(1, 99),
+            "amount": rnd.randint(1, 500),
+            "size": rnd.randint(1, 500),
+        }
+        for _ in range(n)
+    ]
+
+
+def make_kalshi_events(n_markets: int, seed: int = SEED) -> list[tuple[dict, list[dict]]]:
+    """Return ``(event, markets)`` pairs totalling *n_markets* markets."""
+    rnd = random.Random(seed)
+    events = []
+    for e in range(0, n_markets, EVENT_SIZE):
+        evt = f"EVT{e // EVENT_SIZE}"
+        markets = [
+            {
+                "ticker": f"{evt}-C{i}",
+                "close_time": _iso(NOW + timedelta(days=rnd.randint(1, 90))),
+                "last_price": rnd.randint(1, 99),
+                "yes_bid": rnd.randint(1, 98),
+                "yes_ask": rnd.randint(2, 99),
+                "volume": rnd.randint(0, 100_000),
+                "volume_24h": rnd.randint(0, 10_000),
+                "open_interest": rnd.randint(0, 50_000),
+                "status": "active",
+            }
+            for i in range(min(EVENT_SIZE, n_markets - e))
+        ]
+        events.append(({"event_ticker": evt, "title": f"Event {evt}"}, markets))
+    return events
+
+
+def make_gamma(n: int, seed: int = SEED) -> list[dict]:
+    rnd = random.Random(seed)
+    return [
+        {
+            "id": str(100_000 + i),
+            "slug": f"will-thing-{i}-happen",
+            "question": f"Will thing {i} happen?",
+            "description": "Synthetic market " * 4,
+            "endDate": _iso(NOW + timedelta(days=rnd.randint(1, 365))),
+            "lastTradePrice": rnd.random(),
+            "volume24Hr": str(rnd.uniform(0, 1e6)),
+            "liquidity": str(rnd.uniform(0, 1e5)),
+            "category": rnd.choice(["Politics", "Sports", "Crypto"]),
+            "status": "active",
+        }
+        for i in range(n)
+    ]
+
+
+def make_clob(seed: int = SEED) -> dict:
+    rnd = random.Random(seed)
+    p = rnd.random()
+    return {
+        "outcomes": [
+            {"name": "Yes", "price": p, "bestBid": max(0.0, p - 0.01), "volume": 10},
+            {"name": "No", "price": 1 - p, "bestBid": max(0.0, 0.99 - p), "volume": 10},
+        ],
+        "liquidity": 1234.5,
+    }
+
+
+# ───────────────────────── cases
+# each case is ``setup(n) -> fn`` and the returned zero-argument fn is timed
+
+def case_kalshi_trades(n):
+    from common import aggregate_trades
+    from records import to_prob
+
+    trades = make_trades(n)
+    cutoff = NOW - timedelta(hours=24)
+    return lambda: aggregate_trades(trades, cutoff, size_key="size", to_price=to_prob)
+
+
+def case_polymarket_trades(n):
+    from common import aggregate_trades
+
+    trades = make_trades(n)
+    cutoff = NOW - timedelta(hours=24)
+    return lambda: aggregate_trades(trades, cutoff)
+
+
+def case_kalshi_fetch_rows(n):
+    from kalshi_fetch import build_event_rows
+
+    events = make_kalshi_events(n)
+    past = lambda ticker: 0.5  # noqa: E731
+
+    def run():
+        for event, markets in events:
+            build_event_rows(event, markets, TS, price_24h_ago=past)
+    return run
+
+
+def case_polymarket_fetch_rows(n):
+    from polymarket_fetch import build_rows, to_candidate
+
+    gamma = make_gamma(n)
+    clob = make_clob()
+    stats = (1234.5, 100, 0.42)
+
+    def run():
+        for g in gamma:
+            build_rows(to_candidate(g), clob, stats, TS)
+    return run
+
+
+def case_kalshi_outcomes(n):
+    from kalshi_update_prices import replicate_outcomes
+
+    tickers = [m["ticker"] for _, ms in make_kalshi_events(n) for m in ms]
+    event_prices: dict[str, dict[str, float]] = {}
+    for t in tickers:
+        evt, cand = t.rsplit("-", 1)
+        event_prices.setdefault(evt, {})[cand] = 0.5
+    return lambda: replicate_outcomes(tickers, event_prices, TS)
+
+
+def case_serialize(n):
+    from common import _chunked
+    from records import SnapshotRow, dumps
+
+    rows = [
+        SnapshotRow(market_id=f"M{i}", price=0.5, yes_bid=0.49, no_bid=0.51,
+                    volume=i, dollar_volume=i * 0.5, liquidity=1000.0,
+                    expiration=TS, timestamp=TS, source="kalshi")
+        for i in range(n)
+    ]
+    return lambda: [dumps(chunk) for chunk in _chunked(rows, 500)]
+
+
+def case_parse_timestamps(n):
+    from dateutil import parser
+
+    stamps = [t["timestamp"] for t in make_trades(n)]
+    return lambda: [parser.parse(s) for s in stamps]
+
+
+def case_stream_listing(n):
+    from common import STREAM_CHUNK_BYTES, iter_json_items
+    from kalshi_update_prices import MARKET_FIELDS
+
+    body = json.dumps({
+        "markets": [m for _, ms in make_kalshi_events(n) for m in ms], "cursor": "",
+    }).encode()
+    chunks = [body[i:i + STREAM_CHUNK_BYTES] for i in range(0, len(body), STREAM_CHUNK_BYTES)]
+    return lambda: list(iter_json_items(chunks, "markets", MARKET_FIELDS))
+
+
+# name → (setup, sizes)
+CASES = {
+    "kalshi_trades": (case_kalshi_trades, TRADE_SIZES),
+    "polymarket_trades": (case_polymarket_trades, TRADE_SIZES),
+    "kalshi_fetch_rows": (case_kalshi_fetch_rows, MARKET_SIZES),
+    "polymarket_fetch_rows": (case_polymarket_fetch_rows, MARKET_SIZES),
+    "kalshi_outcomes": (case_kalshi_outcomes, MARKET_SIZES),
+    "serialize": (case_serialize, MARKET_SIZES),
+    "parse_timestamps": (case_parse_timestamps, TRADE_SIZES),
+    "stream_listing": (case_stream_listing, MARKET_SIZES),
+}
+
+
+# ───────────────────────── runner
+def time_call(fn, repeat: int = REPEAT) -> float:
+    """Return the best wall time of *repeat* calls, with GC paused."""
+    best = float("inf")
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            t = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t)
+    finally:
+        if enabled:
+            gc.enable()
+    return best
+
+
+def run(names=None, *, max_size: int | None = None, repeat: int = REPEAT,
+        log=print) -> dict:
+    """Run the selected cases and return a results document."""
+    results = {}
+    for name, (setup, sizes) in CASES.items():
+        if names and not any(k in name for k in names):
+            continue
+        for n in sizes:
+            if max_size and n > max_size:
+                continue
+            fn = setup(n)
+            secs = time_call(fn, repeat)
+            key = f"{name}[{n}]"
+            results[key] = {"seconds": round(secs, 6), "n": n,
+                            "per_sec": round(n / secs) if secs else None}
+            log(f"{key:<32} {secs * 1000:10.2f} ms  {n / secs:14,.0f}/s")
+            del fn
+            gc.collect()
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float = THRESHOLD) -> list[str]:
+    """Return a message for every case more than *threshold* slower."""
+    regressions = []
+    base = baseline.get("results", {})
+    for key, cur in current.get("results", {}).items():
+        old = base.get(key)
+        if not old or not old.get("seconds"):
+            continue
+        ratio = cur["seconds"] / old["seconds"]
+        if ratio > 1 + threshold:
+            regressions.append(
+                f"{key}: {old['seconds'] * 1000:.2f} ms → {cur['seconds'] * 1000:.2f} ms "
+                f"(+{(ratio - 1) * 100:.0f}%)"
+            )
+    return regressions
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="CPU micro-benchmarks for the loaders")
+    ap.add_argument("-k", dest="names", action="append",
+                    help="only run cases whose name contains this (repeatable)")
+    ap.add_argument("--max-size", type=int, help="skip fixtures larger than this")
+    ap.add_argument("--repeat", type=int, default=REPEAT)
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--baseline", help="results JSON from an earlier commit")
+    ap.add_argument("--threshold", type=float, default=THRESHOLD,
+                    help="allowed slowdown vs the baseline (0.2 = 20%%)")
+    args = ap.parse_args(argv)
+
+    doc = run(args.names, max_size=args.max_size, repeat=args.repeat)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(doc, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(doc, json.load(f), args.threshold)
+        for msg in regressions:
+            print(f"❌ {msg}")
+        if regressions:
+            return 1
+        print(f"✅ no case regressed by more than {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
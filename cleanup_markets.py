@@ -7,6 +7,12 @@ Usage:
 If no timestamp argument is supplied, ``SNAPSHOT_CUTOFF`` is read from the
 environment. Set ``DELETE_LOW_VOLUME=1`` or pass ``--low-volume`` to also
 remove low‑volume markets (not implemented via REST API).
+
+When ``ARCHIVE_DIR`` is set (or ``--archive-dir`` is passed) every row past the
+cutoff is first exported to date/source partitioned Parquet files via
+``archive.write_archive``. Rows are archived a page at a time and each page
+is deleted by its keys once its export succeeded, so memory stays flat and a
+row that starts matching mid-run is never deleted unarchived.
 """
 
 from __future__ import annotations
@@ -18,6 +24,10 @@ from datetime import datetime, timezone
 
 import requests
 
+from archive import write_archive
+from common import _chunked, http_get
+from metrics import METRICS
+
 SUPABASE_URL = os.environ["SUPABASE_URL"]
 SERVICE_KEY = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
 
@@ -30,11 +40,72 @@ HEADERS = {
 }
 
 
+PAGE_SIZE = 1000
+# keys per ``in.(...)`` delete filter; keeps request URLs short
+KEY_CHUNK = 200
+
+# column used to page deterministically through each table
+ORDER_KEY = {"markets": "market_id"}
+
+
+def fetch_where(table: str, where: dict, limit: int = PAGE_SIZE) -> list[dict]:
+    """Return the first *limit* rows of *table* matching *where*, in key order."""
+    url = f"{SUPABASE_URL}/rest/v1/{table}"
+    params = {
+        "select": "*",
+        "order": ORDER_KEY.get(table, "id"),
+        "limit": limit,
+        **where,
+    }
+    r = http_get(url, headers=HEADERS, params=params, timeout=60)
+    r.raise_for_status()
+    return r.json()
+
+
+def delete_keys(table: str, keys: list) -> int:
+    """Delete the rows of *table* with these keys and return the count."""
+    column = ORDER_KEY.get(table, "id")
+    deleted = 0
+    for chunk in _chunked(keys, KEY_CHUNK):
+        deleted += delete_where(table, {column: f"in.({','.join(map(str, chunk))})"})
+    return deleted
+
+
+def archive_and_delete(table: str, where: dict, archive_dir: str | None) -> int | None:
+    """Delete rows matching *where*, exporting them first if *archive_dir*.
+
+    Each page is archived and then deleted by key, so only archived rows are
+    ever deleted. Returns the number deleted, or ``None`` if an export failed
+    so the caller can keep dependent rows; pages already archived stay gone.
+    """
+    if not archive_dir:
+        return delete_where(table, where)
+    archived = deleted = files = 0
+    while True:
+        try:
+            with METRICS.stage("archive"):
+                rows = fetch_where(table, where)
+                files += len(write_archive(table, rows, archive_dir))
+        except Exception as exc:
+            print(f"❌ {table} archive failed, keeping rows: {exc}")
+            return None
+        archived += len(rows)
+        column = ORDER_KEY.get(table, "id")
+        n = delete_keys(table, [r[column] for r in rows])
+        deleted += n
+        # a short delete means a key filter failed; retry it next run
+        if n < len(rows) or len(rows) < PAGE_SIZE:
+            break
+    print(f"📦 archived {archived} {table} rows to {files} files")
+    return deleted
+
+
 def delete_where(table: str, where: dict) -> int:
     """Delete rows from *table* matching *where* and return count."""
     url = f"{SUPABASE_URL}/rest/v1/{table}"
     try:
-        r = requests.delete(url, headers=HEADERS, params=where, timeout=30)
+        with METRICS.stage("delete"):
+            r = requests.delete(url, headers=HEADERS, params=where, timeout=30)
         if r.status_code not in (200, 204):
             print(f"❌ {table} delete failed {r.status_code}: {r.text[:200]}")
             return 0
@@ -52,21 +123,32 @@ def delete_where(table: str, where: dict) -> int:
         return 0
 
 
-def delete_old_snapshots(cutoff: str) -> None:
-    count = delete_where("market_snapshots", {"timestamp": f"lt.{cutoff}"})
+def delete_old_snapshots(cutoff: str, archive_dir: str | None = None) -> None:
+    where = {"timestamp": f"lt.{cutoff}"}
+    count = archive_and_delete("market_snapshots", where, archive_dir)
+    if count is None:
+        return
     print(f"📉 deleted {count} old snapshots (< {cutoff})")
 
 
-def delete_expired_markets(now: str) -> None:
-    count_s = delete_where("market_snapshots", {"expiration": f"lt.{now}"})
+def delete_expired_markets(now: str, archive_dir: str | None = None) -> None:
+    where = {"expiration": f"lt.{now}"}
+    count_s = archive_and_delete("market_snapshots", where, archive_dir)
+    if count_s is None:
+        return
     print(f"🗑️  deleted {count_s} expired snapshots")
-    count_m = delete_where("markets", {"expiration": f"lt.{now}"})
+    count_m = archive_and_delete("markets", where, archive_dir)
+    if count_m is None:
+        return
     print(f"🗑️  deleted {count_m} expired markets")
 
 
-def delete_inactive_markets() -> None:
+def delete_inactive_markets(archive_dir: str | None = None) -> None:
     # remove markets marked as resolved or cancelled
-    count = delete_where("markets", {"status": "in.(RESOLVED,CANCELLED)"})
+    where = {"status": "in.(RESOLVED,CANCELLED)"}
+    count = archive_and_delete("markets", where, archive_dir)
+    if count is None:
+        return
     print(f"🗑️  deleted {count} inactive markets")
 
 
@@ -78,12 +160,13 @@ def delete_low_volume_markets(threshold: int = 10) -> None:
     )
 
 
-def main(cutoff: str, *, low_volume: bool = False) -> None:
+def main(cutoff: str, *, low_volume: bool = False,
+         archive_dir: str | None = None) -> None:
     print("== Cleanup starting ==")
-    delete_old_snapshots(cutoff)
+    delete_old_snapshots(cutoff, archive_dir)
     now = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
-    delete_expired_markets(now)
-    delete_inactive_markets()
+    delete_expired_markets(now, archive_dir)
+    delete_inactive_markets(archive_dir)
     if low_volume:
         delete_low_volume_markets()
     print("== Cleanup done ==")
@@ -98,6 +181,11 @@ if __name__ == "__main__":
         help="delete low-volume markets (requires DELETE_LOW_VOLUME=1)",
         default=os.getenv("DELETE_LOW_VOLUME") == "1",
     )
+    parser.add_argument(
+        "--archive-dir",
+        help="export rows to Parquet under this directory before deleting",
+        default=os.getenv("ARCHIVE_DIR"),
+    )
     args = parser.parse_args()
 
     cutoff = args.cutoff or os.getenv("SNAPSHOT_CUTOFF")
@@ -105,4 +193,4 @@ if __name__ == "__main__":
         print("Provide cutoff timestamp or set SNAPSHOT_CUTOFF")
         sys.exit(1)
 
-    main(cutoff, low_volume=args.low_volume)
+    main(cutoff, low_volume=args.low_volume, archive_dir=args.archive_dir)
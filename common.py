@@ -21,18 +21,37 @@ except ModuleNotFoundError:  # pragma: no cover - handled in tests
             )
 
     requests = _RequestsPlaceholder()
+import codecs
+import hashlib
 import itertools
+import json
+import math
+import re
+import threading
 import time
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    TimeoutError as FutureTimeout,
+    as_completed,
+    wait,
+)
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+from metrics import METRICS, host_of
+from records import dumps, to_dicts
 
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SERVICE_KEY  = os.getenv("SUPABASE_SERVICE_ROLE_KEY")   # long service key
 
-if not SUPABASE_URL or not SERVICE_KEY:
-    raise RuntimeError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set")
+
+def _require_supabase() -> None:
+    """Fail fast before the first Supabase call rather than at import."""
+    if not SUPABASE_URL or not SERVICE_KEY:
+        raise RuntimeError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set")
 
 BASE_HEADERS = {
     "apikey":        SERVICE_KEY,
@@ -51,42 +70,467 @@ def _chunked(iterable, size: int = 500):
             break
         yield batch
 
+def _nbytes(r) -> int:
+    # test doubles don't always carry a body; metrics must never break a call
+    body = getattr(r, "content", None)
+    return len(body) if isinstance(body, (bytes, bytearray)) else 0
+
+def http_get(url: str, **kwargs):
+    """``requests.get`` that records latency, status and size in ``METRICS``."""
+    t = time.perf_counter()
+    try:
+        r = requests.get(url, **kwargs)
+    except Exception:
+        METRICS.observe_http(url, time.perf_counter() - t, "error")
+        raise
+    # reading .content would pull a streamed body into memory
+    size = 0 if kwargs.get("stream") else _nbytes(r)
+    METRICS.observe_http(url, time.perf_counter() - t,
+                         getattr(r, "status_code", None), size)
+    return r
+
+def _post(url: str, body: bytes, *, table: str, rows: int):
+    t = time.perf_counter()
+    r = requests.post(url, headers=BASE_HEADERS, data=body, timeout=30)
+    dt = time.perf_counter() - t
+    METRICS.observe_http(url, dt, r.status_code)
+    if r.status_code in (201, 204):
+        METRICS.rows_written(table, rows, len(body), dt)
+    return r
+
 def request_json(url: str, *, headers=None, params=None,
                  tries: int = 3, backoff: float = 1.5, timeout: int = 20):
     """Return JSON response from *url* with simple retries."""
     for i in range(tries):
         try:
-            r = requests.get(url, headers=headers, params=params, timeout=timeout)
+            r = http_get(url, headers=headers, params=params, timeout=timeout)
             r.raise_for_status()
             return r.json()
         except Exception as e:
             print(f"request failed ({i + 1}/{tries}) {url}: {e}")
             if i == tries - 1:
                 return None
+            METRICS.retry(url)
             time.sleep(backoff * (2 ** i))
 
+# ───────────────── incremental JSON
+STREAM_CHUNK_BYTES = int(os.environ.get("STREAM_CHUNK_BYTES", str(64 * 1024)))
+_DECODER = json.JSONDecoder()
+_SPACE = re.compile(r"[ \t\r\n]*")
+# what may still follow a number cut short by a chunk boundary
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+
+
+class _JsonStream:
+    """Text cursor over a JSON body arriving as byte chunks."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decode = codecs.getincrementaldecoder("utf-8")().decode
+        self.buf, self.pos, self.eof = "", 0, False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        try:
+            text = self._decode(next(self._chunks))
+        except StopIteration:
+            self.eof = True
+            text = self._decode(b"", True)
+        # consumed text is dropped only here, not after every item
+        self.buf = self.buf[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Return the next non-blank character, or ``""`` at the end."""
+        while True:
+            self.pos = _SPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, ch: str) -> None:
+        if self.peek() != ch:
+            raise ValueError(f"expected {ch!r} in JSON stream")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # a number ending the buffer may go on in the next chunk, even
+            # when a dangling "." or "e" was left out of the decoded prefix
+            if (isinstance(obj, (int, float)) and not isinstance(obj, bool)
+                    and _NUMBER_TAIL.match(self.buf, end).end() == len(self.buf)
+                    and self._fill()):
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_json_items(chunks, key: str | None = None, fields=None):
+    """Yield the items of a JSON array as its body arrives in *chunks*.
+
+    The array is the whole document or the value of top-level *key* (a bare
+    array is accepted either way). Items are decoded one at a time, so
+    neither the full text nor the full object tree is ever held; with
+    *fields*, only those keys of each object item are kept.
+    """
+    s = _JsonStream(chunks)
+    if key is not None and s.peek() == "{":
+        s.pos += 1
+        while True:
+            if s.peek() == "}":
+                return
+            name = s.value()
+            s.expect(":")
+            if name == key:
+                break
+            s.value()
+            if s.peek() == ",":
+                s.pos += 1
+        if s.peek() != "[":
+            return
+    s.expect("[")
+    if s.peek() == "]":
+        return
+    while True:
+        item = s.value()
+        if fields is not None and isinstance(item, dict):
+            item = {k: item[k] for k in fields if k in item}
+        yield item
+        c = s.peek()
+        s.pos += 1
+        if c == "]":
+            return
+        if c != ",":
+            raise ValueError("expected ',' or ']' in JSON array")
+
+
+def get_json_items(url: str, key: str | None = None, *, fields=None,
+                   headers=None, params=None, timeout: int = 20) -> list:
+    """GET *url* once and return its array items, parsed as the body streams.
+
+    The items are still returned as one list, since failover must know the
+    whole response succeeded before handing it on; streaming saves memory
+    (no full body text, and only *fields* of each item are kept), not time
+    to the first row. Raises on any HTTP or parse error; see
+    :func:`iter_json_items`.
+    """
+    r = http_get(url, headers=headers, params=params, timeout=timeout, stream=True)
+    try:
+        r.raise_for_status()
+        return list(iter_json_items(r.iter_content(STREAM_CHUNK_BYTES), key, fields))
+    finally:
+        r.close()
+
+
+# ───────────────── host failover
+# After BREAKER_FAILURES consecutive failures a host is skipped for
+# BREAKER_COOLDOWN seconds, then one half-open probe decides whether it is
+# back. HEDGE_AFTER > 0 sends a duplicate GET when the first has not
+# answered within that many seconds and keeps whichever succeeds first.
+BREAKER_FAILURES = int(os.environ.get("BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN = float(os.environ.get("BREAKER_COOLDOWN", "30"))
+HEDGE_AFTER = float(os.environ.get("HEDGE_AFTER", "0"))
+HEDGE_WORKERS = int(os.environ.get("HEDGE_WORKERS", "32"))
+
+
+class CircuitBreaker:
+    """Closed / open / half-open state per host, shared by every call."""
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN,
+                 clock=time.monotonic):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._clock = clock
+        self._lock = threading.Lock()
+        # host → {"fails", "opened_at", "probing"}
+        self._hosts: dict[str, dict] = {}
+
+    def state(self, host: str) -> str:
+        with self._lock:
+            h = self._hosts.get(host)
+            if h is None or h["opened_at"] is None:
+                return "closed"
+            if h["probing"] or self._clock() - h["opened_at"] >= self.cooldown:
+                return "half-open"
+            return "open"
+
+    def allow(self, host: str) -> bool:
+        """Return whether to send a request to *host* now.
+
+        Once an open host's cooldown has passed, exactly one caller gets
+        ``True`` (the probe) until it reports back.
+        """
+        with self._lock:
+            h = self._hosts.get(host)
+            if h is None or h["opened_at"] is None:
+                return True
+            if h["probing"] or self._clock() - h["opened_at"] < self.cooldown:
+                return False
+            h["probing"] = True
+            return True
+
+    def retry_after(self, host: str) -> float:
+        """Return seconds until *host* takes a request again (0 if now)."""
+        with self._lock:
+            h = self._hosts.get(host)
+            if h is None or h["opened_at"] is None:
+                return 0.0
+            if h["probing"]:
+                # another caller's probe will settle the state shortly
+                return min(1.0, self.cooldown)
+            return max(0.0, h["opened_at"] + self.cooldown - self._clock())
+
+    def success(self, host: str) -> None:
+        with self._lock:
+            self._hosts.pop(host, None)
+
+    def failure(self, host: str) -> None:
+        with self._lock:
+            h = self._hosts.setdefault(host, {"fails": 0, "opened_at": None, "probing": False})
+            h["fails"] += 1
+            if h["probing"] or h["fails"] >= self.failures:
+                if h["opened_at"] is None:
+                    print(f"⚠️  {host}: circuit open after {h['fails']} failures")
+                h["opened_at"] = self._clock()
+                h["probing"] = False
+                METRICS.inc("pulse_circuit_open_total", host=host)
+
+
+BREAKER = CircuitBreaker()
+_hedge_pool = None
+_hedge_lock = threading.Lock()
+# a host answered 4xx: it is healthy and no other host will do better
+_MISSING = object()
+
+
+class HostsUnavailable(RuntimeError):
+    """Every host of a request has an open circuit breaker."""
+
+
+def _call_host(fetch, url: str):
+    host = host_of(url)
+    try:
+        result = fetch(url)
+    except Exception as e:
+        print(f"request failed {url}: {e}")
+        status = getattr(getattr(e, "response", None), "status_code", None)
+        if status is not None and 400 <= status < 500 and status != 429:
+            BREAKER.success(host)
+            return _MISSING
+        result = None
+    if result is None:
+        BREAKER.failure(host)
+    else:
+        BREAKER.success(host)
+    return result
+
+
+def _hedged(fetch, url: str, alt: str, delay: float):
+    global _hedge_pool
+    with _hedge_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(HEDGE_WORKERS, thread_name_prefix="hedge")
+    started = threading.Event()
+
+    def primary():
+        started.set()
+        return _call_host(fetch, url)
+
+    first = _hedge_pool.submit(primary)
+    # time spent queued behind other callers must not count as slowness
+    started.wait()
+    try:
+        return first.result(timeout=delay)
+    except FutureTimeout:
+        pass
+    METRICS.inc("pulse_http_hedged_total", host=host_of(alt))
+    second = _hedge_pool.submit(_call_host, fetch, alt)
+    for f in as_completed((first, second)):
+        result = f.result()
+        if result is not None:
+            return result
+    return None
+
+
+def get_with_failover(fetch, urls, *, tries: int = 3, backoff: float = 1.5,
+                      hedge_after: float = HEDGE_AFTER):
+    """Return ``fetch(url)`` from the first healthy of *urls*.
+
+    *urls* name the same resource on different hosts, preferred first.
+    *fetch* performs one idempotent GET and returns ``None`` or raises on
+    failure. Every failure counts against its host in :data:`BREAKER`, so
+    once a host is open its calls go straight to the next one without
+    retries or backoff. A 4xx (other than 429) ends the call at once.
+    Returns ``None`` when every host failed *tries* times.
+
+    Raises :class:`HostsUnavailable` without sleeping when every host is
+    open (the breaker lets one caller per cooldown probe a half-open host);
+    callers should abort the run rather than wait out the outage.
+    """
+    urls = list(dict.fromkeys(urls))
+    attempt = 0
+    while attempt < tries:
+        tried = False
+        for i, url in enumerate(urls):
+            if not BREAKER.allow(host_of(url)):
+                continue
+            tried = True
+            if hedge_after > 0:
+                # hedge onto the next healthy host, else the same one
+                alt = next((u for u in urls[i + 1:]
+                            if BREAKER.state(host_of(u)) == "closed"), url)
+                result = _hedged(fetch, url, alt, hedge_after)
+            else:
+                result = _call_host(fetch, url)
+            if result is _MISSING:
+                return None
+            if result is not None:
+                return result
+        if not tried:
+            retry_in = min(BREAKER.retry_after(host_of(u)) for u in urls)
+            raise HostsUnavailable(
+                f"every host of {urls[0]} is down; next probe in {retry_in:.0f}s")
+        attempt += 1
+        if attempt < tries:
+            METRICS.retry(urls[0])
+            time.sleep(backoff * (2 ** (attempt - 1)))
+    return None
+
+def _upsert_url(table: str, conflict_key: str | None) -> str:
+    _require_supabase()
+    url = f"{SUPABASE_URL}/rest/v1/{table}"
+    if conflict_key:
+        url += f"?on_conflict={conflict_key}"
+    return url
+
+def post_rows(table: str, rows: list, conflict_key: str | None = "market_id"):
+    """POST *rows* to *table* in chunks, raising on the first rejected chunk.
+
+    Used as the sink of the write spool, which must know whether a batch was
+    accepted before acknowledging it. A 4xx other than 408/429 raises
+    ``spool.Rejected``: resending the same rows will not help.
+    """
+    from spool import Rejected
+
+    url = _upsert_url(table, conflict_key)
+    for chunk in _chunked(rows):
+        r = _post(url, dumps(chunk), table=table, rows=len(chunk))
+        if r.status_code not in (201, 204):
+            msg = f"{table} → {r.status_code}: {r.text[:150]}"
+            if 400 <= r.status_code < 500 and r.status_code not in (408, 429):
+                raise Rejected(msg)
+            raise RuntimeError(msg)
+        print(f"✅ {table}: inserted {len(chunk)} rows")
+
+# ───────────────── write spool
+# With ``SPOOL_DIR`` set, writes are appended to a local on-disk spool and a
+# background thread drains it into Supabase; see ``spool.py``.
+SPOOL_DIR = os.environ.get("SPOOL_DIR")
+SPOOL_DRAIN_TIMEOUT = float(os.environ.get("SPOOL_DRAIN_TIMEOUT", "60"))
+_spool = None
+_flusher = None
+
+def _get_spool():
+    global _spool, _flusher
+    if _spool is None:
+        import atexit
+        from spool import Spool, SpoolFlusher
+
+        _spool = Spool(SPOOL_DIR)
+        _flusher = SpoolFlusher(_spool, post_rows)
+        _flusher.start()
+        atexit.register(drain_spool)
+    return _spool
+
+def drain_spool(timeout: float | None = None) -> bool:
+    """Stop the background flusher after a final flush.
+
+    Returns ``True`` when nothing is left on disk. Anything that could not be
+    delivered stays spooled and is replayed by the next run.
+    """
+    if _flusher is None or not _flusher.is_alive():
+        return True
+    drained = _flusher.stop(SPOOL_DRAIN_TIMEOUT if timeout is None else timeout)
+    if not drained:
+        print(f"⚠️ {_spool.pending()} rows left in spool {SPOOL_DIR}")
+    return drained
+
+def dedupe(rows: list, conflict_key: str) -> list:
+    """Keep the last of *rows* sharing a value of *conflict_key*.
+
+    Postgres rejects an upsert batch that hits the same key twice.
+    """
+    keys = conflict_key.split(",")
+    last = {tuple(r[k] for k in keys): r for r in rows}
+    return rows if len(last) == len(rows) else list(last.values())
+
 def insert_to_supabase(table: str, rows: list, conflict_key: str | None = "market_id"):
     """
     Bulk‑insert / upsert *rows* into Supabase table *table*.
 
-    - If `conflict_key` is a string  → adds ?on_conflict=<key> for UPSERT behaviour.
+    - If `conflict_key` is a string  → adds ?on_conflict=<key> for UPSERT behaviour;
+      rows repeating a key are collapsed to the last one.
     - If `conflict_key` is None      → plain INSERT (no unique‑key requirement).
+    - *rows* may be dicts or ``records`` row types.
+    - If `SPOOL_DIR` is set          → rows are spooled to disk and written
+      by a background flusher; the call returns immediately.
     """
     if not rows:
         print(f"⚠️  no data for {table}")
         return
-
-    url = f"{SUPABASE_URL}/rest/v1/{table}"
     if conflict_key:
-        url += f"?on_conflict={conflict_key}"
+        rows = dedupe(rows, conflict_key)
 
+    if SPOOL_DIR:
+        _get_spool().append(table, to_dicts(rows), conflict_key)
+        _flusher.notify()
+        return
+
+    url = _upsert_url(table, conflict_key)
     for chunk in _chunked(rows):
-        r = requests.post(url, headers=BASE_HEADERS, json=chunk, timeout=30)
+        r = _post(url, dumps(chunk), table=table, rows=len(chunk))
         if r.status_code not in (201, 204):
             print(f"❌ {table} → {r.status_code}: {r.text[:150]}")
         else:
             print(f"✅ {table}: inserted {len(chunk)} rows")
 
+def write_rows(table: str, rows: list, conflict_key: str | None = "market_id"):
+    """Like :func:`insert_to_supabase`, but raise unless *rows* are stored.
+
+    Spooled rows count as stored: the spool replays them until accepted.
+    Callers that persist their own progress (watermarks, indexes) must only
+    do so after this returns.
+    """
+    if not rows:
+        return
+    if conflict_key:
+        rows = dedupe(rows, conflict_key)
+    if SPOOL_DIR:
+        _get_spool().append(table, to_dicts(rows), conflict_key)
+        _flusher.notify()
+        return
+    post_rows(table, rows, conflict_key)
+
+def call_rpc(fn: str, params: dict | None = None, *, timeout: int = 120):
+    """Invoke the Postgres function *fn* through PostgREST and return its JSON."""
+    _require_supabase()
+    url = f"{SUPABASE_URL}/rest/v1/rpc/{fn}"
+    t = time.perf_counter()
+    r = requests.post(url, headers=BASE_HEADERS, json=params or {}, timeout=timeout)
+    METRICS.observe_http(url, time.perf_counter() - t, getattr(r, "status_code", None))
+    r.raise_for_status()
+    return r.json() if r.text else None
+
 # ───────────────── Polymarket helpers
 # Allow overriding the default endpoints via environment variables. This makes
 # it possible to point the loader at a custom proxy when direct network access
@@ -105,15 +549,145 @@ EVENTS_URL = os.environ.get(
 )
 
 
-def fetch_gamma():
-    """Return a list of all markets from Polymarket's Gamma API."""
+# ───────────────── conditional-request cache
+# Responses are remembered per URL+params together with their ETag /
+# Last-Modified validators. Repeat requests are sent as conditional GETs and
+# a 304 is answered from the cache; within an endpoint's TTL the request is
+# skipped entirely. ``HTTP_CACHE_DIR`` adds a disk tier that survives runs.
+# Bodies are kept as raw JSON text, so memory is bounded by their size and
+# every caller decodes its own copy.
+HTTP_CACHE_BYTES = int(os.environ.get("HTTP_CACHE_BYTES", str(64 * 1024 * 1024)))
+HTTP_CACHE_DIR = os.environ.get("HTTP_CACHE_DIR")
+HTTP_TTLS = {
+    "gamma": float(os.environ.get("HTTP_TTL_GAMMA", "0")),
+    "events": float(os.environ.get("HTTP_TTL_EVENTS", "300")),
+    "clob": float(os.environ.get("HTTP_TTL_CLOB", "0")),
+}
+
+
+class ResponseCache:
+    """In-memory LRU of raw response bodies, bounded by size, with an optional disk tier."""
+
+    def __init__(self, max_bytes: int = HTTP_CACHE_BYTES,
+                 disk_dir: str | None = HTTP_CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._mem: OrderedDict[str, dict] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def key(url: str, params=None) -> str:
+        items = sorted((str(k), str(v)) for k, v in (params or {}).items())
+        return hashlib.sha1(json.dumps([url, items]).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                self._mem.move_to_end(key)
+                return entry
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry.get("body"), str):
+            # written by an older version that stored parsed bodies
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: str, entry: dict) -> None:
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old["body"])
+            self._mem[key] = entry
+            self._bytes += len(entry["body"])
+            while self._bytes > self.max_bytes and self._mem:
+                _, evicted = self._mem.popitem(last=False)
+                self._bytes -= len(evicted["body"])
+
+    def put(self, key: str, entry: dict) -> None:
+        self._remember(key, entry)
+        if self.disk_dir:
+            tmp = self._path(key) + ".tmp"
+            try:
+                with open(tmp, "w") as f:
+                    json.dump(entry, f)
+                os.replace(tmp, self._path(key))
+            except (OSError, TypeError, ValueError) as e:
+                print(f"⚠️ http cache write failed: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._bytes = 0
+
+
+HTTP_CACHE = ResponseCache()
+
+
+def cached_get_json(url: str, *, headers=None, params=None, ttl: float = 0,
+                    timeout: int = 15, cache: ResponseCache | None = None):
+    """GET *url* as JSON through the conditional-request cache.
+
+    Raises ``requests.HTTPError`` (via ``raise_for_status``) for error
+    responses so callers keep their existing status handling.
+    """
+    cache = cache or HTTP_CACHE
+    key = cache.key(url, params)
+    entry = cache.get(key)
+    now = time.time()
+    if entry is not None and ttl and now - entry["fetched_at"] < ttl:
+        METRICS.inc("pulse_http_cache_total", result="fresh", host=host_of(url))
+        return json.loads(entry["body"])
+
+    hdrs = dict(headers or {})
+    if entry is not None:
+        if entry.get("etag"):
+            hdrs["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            hdrs["If-Modified-Since"] = entry["last_modified"]
+    r = http_get(url, headers=hdrs, params=params, timeout=timeout)
+    if r.status_code == 304 and entry is not None:
+        METRICS.inc("pulse_http_cache_total", result="revalidated", host=host_of(url))
+        cache.put(key, {**entry, "fetched_at": now})
+        return json.loads(entry["body"])
+    r.raise_for_status()
+    body = r.json()
+    etag = r.headers.get("ETag")
+    last_modified = r.headers.get("Last-Modified")
+    if etag or last_modified or ttl:
+        cache.put(key, {
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": now,
+            "body": r.text,
+        })
+    return body
+
+
+def _polymarket_headers() -> dict:
     headers = {}
     api_key = os.environ.get("POLYMARKET_API_KEY")
     if api_key:
         headers["X-API-Key"] = api_key
-    r = requests.get(GAMMA_URL, headers=headers, timeout=15)
-    r.raise_for_status()
-    j = r.json()
+    return headers
+
+
+def fetch_gamma():
+    """Return a list of all markets from Polymarket's Gamma API."""
+    j = cached_get_json(GAMMA_URL, headers=_polymarket_headers(),
+                        ttl=HTTP_TTLS["gamma"])
     if isinstance(j, dict) and "markets" in j:
         return j["markets"]
     return j
@@ -121,18 +695,14 @@ def fetch_gamma():
 
 def fetch_events(limit: int = 250, max_pages: int = 10, **filters):
     """Return a list of events from Polymarket's Gamma API."""
-    headers = {}
-    api_key = os.environ.get("POLYMARKET_API_KEY")
-    if api_key:
-        headers["X-API-Key"] = api_key
+    headers = _polymarket_headers()
     events = []
     offset = 0
     for _ in range(max_pages):
         params = {"limit": limit, "offset": offset}
         params.update(filters)
-        r = requests.get(EVENTS_URL, headers=headers, params=params, timeout=15)
-        r.raise_for_status()
-        j = r.json()
+        j = cached_get_json(EVENTS_URL, headers=headers, params=params,
+                            ttl=HTTP_TTLS["events"])
         batch = j.get("events") if isinstance(j, dict) else j
         if not batch:
             break
@@ -147,40 +717,58 @@ def fetch_clob(mid: str, slug: str | None = None):
     """Fetch order book details by market ID or slug."""
     for ident in filter(None, [mid, slug]):
         try:
-            r = requests.get(CLOB_URL.format(ident), timeout=8)
-            if r.status_code == 404:
-                continue
-            r.raise_for_status()
-            return r.json()
+            return cached_get_json(CLOB_URL.format(ident), timeout=8,
+                                   ttl=HTTP_TTLS["clob"])
         except requests.RequestException:
+            # 404 for this identifier or a transient error → try the next one
             continue
     return None
 
 
-def last24h_stats(mid: str):
-    """Return (dollar_volume, trade_count, vwap) for the past 24h."""
+def aggregate_trades(trades, cutoff: datetime, *, size_key: str = "amount",
+                     to_price=lambda p: p / 100):
+    """Return (dollar_volume, trade_count, vwap) of *trades* since *cutoff*.
+
+    *size_key* names the contract count field and *to_price* converts the raw
+    ``price`` to a probability; both differ between Kalshi and Polymarket.
+    Naive timestamps (and a naive *cutoff*) are taken to be UTC.
+    """
+    from dateutil import parser
+
+    if cutoff.tzinfo is None:
+        cutoff = cutoff.replace(tzinfo=timezone.utc)
+    vol_d = 0.0
+    vol_ct = 0
+    for t in trades:
+        ts = parser.parse(t["timestamp"])
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        if ts >= cutoff:
+            size = t[size_key]
+            vol_ct += size
+            vol_d += size * to_price(t["price"])
+    vwap = round(vol_d / vol_ct, 4) if vol_ct else None
+    return round(vol_d, 2), vol_ct, vwap
+
+
+def last24h_stats(mid: str, log=None):
+    """Return (dollar_volume, trade_count, vwap) for the past 24h.
+
+    The raw trades are also passed to *log* (a ``trades.TradeLog``) if given.
+    """
     try:
-        r = requests.get(TRADES_URL.format(mid), timeout=8)
+        r = http_get(TRADES_URL.format(mid), timeout=8)
         if r.status_code == 404:
             return 0.0, 0, None
         r.raise_for_status()
-        from datetime import datetime, timedelta
-        from dateutil import parser
+        trades = r.json().get("trades", [])
+        if log is not None:
+            log.record(mid, trades, size_key="amount", to_price=lambda p: p / 100)
         cutoff = datetime.utcnow() - timedelta(hours=24)
-        vol_d = 0.0
-        vol_ct = 0
-        for t in r.json().get("trades", []):
-            ts = parser.parse(t.get("timestamp"))
-            if ts >= cutoff:
-                size = t.get("amount")
-                price = t.get("price") / 100
-                vol_ct += size
-                vol_d += size * price
-        vwap = round(vol_d / vol_ct, 4) if vol_ct else None
-        return round(vol_d, 2), vol_ct, vwap
+        return aggregate_trades(trades, cutoff)
     except Exception:
         return 0.0, 0, None
-from concurrent.futures import ThreadPoolExecutor, as_completed
+
 
 def fetch_stats_concurrent(market_ids, fetch_fn):
     """Fetch trade stats concurrently using *fetch_fn*.
@@ -204,14 +792,101 @@ def fetch_stats_concurrent(market_ids, fetch_fn):
             try:
                 stats = fut.result()
                 results.append((mid, stats))
+            except HostsUnavailable:
+                for f in futures:
+                    f.cancel()
+                raise
             except Exception as e:
                 print(f"⚠️ stats fetch failed for {mid}: {e}")
                 failed.append(mid)
     return results, failed
 
 
+ENRICH_WORKERS = int(os.environ.get("ENRICH_WORKERS", "16"))
+ENRICH_TIMEOUT = float(os.environ.get("ENRICH_TIMEOUT", "20"))
+
+
+def _started(fn, item, box: list):
+    # the first lookup of an item to leave the pool queue starts its clock
+    if box[0] is None:
+        box[0] = time.monotonic()
+    return fn(item)
+
+
+def enrich_concurrent(items, lookups: dict, *, workers: int = ENRICH_WORKERS,
+                      timeout: float = ENRICH_TIMEOUT):
+    """Run every lookup in *lookups* for each of *items* concurrently.
+
+    Args:
+        items: iterable of market records
+        lookups: mapping of name → function taking one item
+        workers: thread pool size
+        timeout: seconds an item may spend once its lookups started
+    Yields:
+        ``(item, results)`` in completion order, where *results* maps each
+        lookup name to its return value, or ``None`` if it raised or did not
+        finish within *timeout*. Items are fed to the pool lazily, so callers
+        can build rows for finished markets while others are still in flight.
+        Time an item spends queued (e.g. behind timed-out lookups that still
+        hold pool threads) does not count against its timeout.
+    """
+    per_item = max(1, len(lookups))
+    max_items = max(1, workers // per_item)
+    it = iter(items)
+    exhausted = False
+    futures: dict = {}        # future → (item index, lookup name)
+    state: dict = {}          # item index → [item, results, remaining, [started]]
+    idx = 0
+
+    def deadline(s) -> float:
+        return s[3][0] + timeout if s[3][0] is not None else math.inf
+
+    ex = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        while True:
+            while not exhausted and len(state) < max_items:
+                try:
+                    item = next(it)
+                except StopIteration:
+                    exhausted = True
+                    break
+                state[idx] = [item, dict.fromkeys(lookups), set(lookups), [None]]
+                for name, fn in lookups.items():
+                    futures[ex.submit(_started, fn, item, state[idx][3])] = (idx, name)
+                idx += 1
+            if not state:
+                return
+
+            # an item that starts later than now has a deadline past now + timeout
+            now = time.monotonic()
+            first = min(min(deadline(s) for s in state.values()), now + timeout)
+            done, _ = wait(futures, timeout=max(0.0, first - now),
+                           return_when=FIRST_COMPLETED)
+            for fut in done:
+                i, name = futures.pop(fut)
+                try:
+                    state[i][1][name] = fut.result()
+                except Exception as e:
+                    print(f"⚠️ {name} lookup failed: {e}")
+                state[i][2].discard(name)
+
+            now = time.monotonic()
+            for i in [i for i, s in state.items() if not s[2] or deadline(s) <= now]:
+                item, results, remaining, _ = state.pop(i)
+                if remaining:
+                    print(f"⚠️ {sorted(remaining)} timed out after {timeout}s")
+                    for fut in [f for f, (j, _) in futures.items() if j == i]:
+                        fut.cancel()
+                        del futures[fut]
+                yield item, results
+    finally:
+        # abandoned lookups finish in the background instead of blocking us
+        ex.shutdown(wait=False, cancel_futures=True)
+
+
 def fetch_price_24h_ago(market_id: str) -> float | None:
     """Return the most recent price from 24 hours ago for *market_id*."""
+    _require_supabase()
     since = (datetime.utcnow() - timedelta(hours=24)).isoformat() + "Z"
     url = f"{SUPABASE_URL}/rest/v1/market_snapshots"
     params = {
@@ -222,7 +897,7 @@ def fetch_price_24h_ago(market_id: str) -> float | None:
         "limit": 1,
     }
     try:
-        r = requests.get(url, headers=BASE_HEADERS, params=params, timeout=10)
+        r = http_get(url, headers=BASE_HEADERS, params=params, timeout=10)
         r.raise_for_status()
         rows = r.json()
         return rows[0]["price"] if rows else None
@@ -0,0 +1,230 @@
+"""Content negotiation, binary encodings and compression for ``api.py``.
+
+List and history endpoints can be requested as JSON (default), MessagePack
+or an Arrow IPC stream, chosen by ``Accept`` or ``?format=json|msgpack|arrow``.
+Bodies are produced as a stream of chunks (rows in batches of
+``STREAM_BATCH``; Arrow record batches of the same size) and compressed on
+the fly with brotli or gzip according to ``Accept-Encoding``.
+
+Arrow lets analysts load a full catalog straight into a dataframe::
+
+    import pyarrow as pa, requests
+    r = requests.get(f"{API}/snapshots", headers={"Accept": "application/vnd.apache.arrow.stream"})
+    df = pa.ipc.open_stream(r.content).read_all().to_pandas()
+
+``msgpack`` and ``brotli`` are optional; without them those formats are
+answered with 406 and gzip is used instead of brotli.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import zlib
+
+from starlette.responses import StreamingResponse
+
+from records import dumps
+
+STREAM_BATCH = 5000
+
+MEDIA = {
+    "json": "application/json",
+    "msgpack": "application/msgpack",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+_BY_MEDIA = {
+    **{v: k for k, v in MEDIA.items()},
+    "application/x-msgpack": "msgpack",
+    "application/vnd.msgpack": "msgpack",
+    "application/vnd.apache.arrow.file": "arrow",
+}
+
+
+class NotAcceptable(Exception):
+    """The client asked for a format this server cannot produce."""
+
+
+def negotiate(accept: str | None, fmt: str | None = None) -> str:
+    """Return ``json``, ``msgpack`` or ``arrow`` for the request.
+
+    ``Accept`` q-values are honoured; a missing header or ``*/*`` means
+    JSON and a header matching none of :data:`MEDIA` raises
+    :class:`NotAcceptable`.
+    """
+    if fmt:
+        if fmt not in MEDIA:
+            raise NotAcceptable(f"unknown format {fmt!r}")
+        return fmt
+    if not (accept or "").strip():
+        return "json"
+    ranges = []
+    for i, part in enumerate(accept.split(",")):
+        media, *params = [p.strip().lower() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    pass
+        if media:
+            ranges.append((-q, i, media))
+    refused = {_BY_MEDIA[m] for q, _, m in ranges if q == 0 and m in _BY_MEDIA}
+    # highest q first; ties keep the client's order
+    for q, _, media in sorted(ranges):
+        if q == 0:
+            break
+        if media in _BY_MEDIA:
+            return _BY_MEDIA[media]
+        if media in ("*/*", "application/*"):
+            for fmt in MEDIA:  # json first
+                if fmt not in refused:
+                    return fmt
+    raise NotAcceptable(f"none of {accept!r} is available; use one of {', '.join(MEDIA.values())}")
+
+
+def choose_encoding(accept_encoding: str | None) -> str | None:
+    offered = {p.split(";")[0].strip().lower() for p in (accept_encoding or "").split(",")}
+    if "br" in offered and _brotli() is not None:
+        return "br"
+    if "gzip" in offered:
+        return "gzip"
+    return None
+
+
+def _brotli():
+    try:
+        import brotli  # type: ignore
+    except ModuleNotFoundError:  # pragma: no cover - optional dependency
+        return None
+    return brotli
+
+
+def _msgpack():
+    try:
+        import msgpack  # type: ignore
+    except ModuleNotFoundError:
+        raise NotAcceptable("MessagePack support is not installed (pip install msgpack)")
+    return msgpack
+
+
+def _batches(rows):
+    for i in range(0, len(rows), STREAM_BATCH):
+        yield rows[i:i + STREAM_BATCH]
+
+
+# ───────────── encoders; each yields bytes chunks
+def _json_chunks(meta: dict, key: str | None, rows):
+    if key is None:
+        yield dumps(meta)
+        return
+    head = dumps({**meta, key: []})
+    # everything up to the empty array's closing bracket
+    yield head[:head.rindex(b"]")]
+    first = True
+    for batch in _batches(rows):
+        body = dumps(batch)[1:-1]
+        if body:
+            yield body if first else b"," + body
+            first = False
+    yield b"]}"
+
+
+def _msgpack_chunks(meta: dict, key: str | None, rows):
+    msgpack = _msgpack()
+    packer = msgpack.Packer(default=str)
+    if key is None:
+        yield packer.pack(meta)
+        return
+    yield packer.pack_map_header(len(meta) + 1)
+    for k, v in meta.items():
+        yield packer.pack(k) + packer.pack(v)
+    yield packer.pack(key) + packer.pack_array_header(len(rows))
+    for batch in _batches(rows):
+        yield b"".join(packer.pack(r.as_dict() if hasattr(r, "as_dict") else r) for r in batch)
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa  # type: ignore
+    except ModuleNotFoundError:
+        raise NotAcceptable("Arrow support is not installed (pip install pyarrow)")
+    return pa
+
+
+def _arrow_table(meta: dict, rows=None, columns: dict | None = None):
+    pa = _pyarrow()
+    if columns is None:
+        dicts = [r.as_dict() if hasattr(r, "as_dict") else r for r in rows or ()]
+        # search docs omit None fields, so no single row names every column
+        names = dict.fromkeys(k for d in dicts for k in d)
+        columns = {k: [d.get(k) for d in dicts] for k in names}
+    table = pa.table({k: _arrow_column(pa, v) for k, v in columns.items()})
+    # totals, facets, scale… travel in the schema metadata; lists are
+    # already the table's columns
+    return table.replace_schema_metadata(
+        {k: json.dumps(v, default=str) for k, v in meta.items() if not isinstance(v, list)}
+    )
+
+
+def _arrow_column(pa, values):
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # mixed types (e.g. numbers and strings) fall back to text
+        return pa.array([None if v is None else str(v) for v in values])
+
+
+def _arrow_chunks(table):
+    pa = _pyarrow()
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=STREAM_BATCH):
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+def _compress(chunks, encoding: str):
+    if encoding == "br":
+        comp = _brotli().Compressor()
+        write, finish = comp.process, comp.finish
+    else:
+        comp = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 → gzip container
+        write, finish = comp.compress, comp.flush
+    for chunk in chunks:
+        out = write(chunk)
+        if out:
+            yield out
+    yield finish()
+
+
+def respond(request, meta: dict, rows=None, *, key: str | None = "results",
+            columns: dict | None = None) -> StreamingResponse:
+    """Stream *meta* (plus *rows* under *key*) in the negotiated format.
+
+    For Arrow, *columns* (equal-length lists) are used as the table when
+    given; otherwise the table is built from *rows* and *meta* goes into the
+    schema metadata.
+    """
+    fmt = negotiate(request.headers.get("accept"), request.query_params.get("format"))
+    if rows is None:
+        key = None
+    if fmt == "arrow":
+        chunks = _arrow_chunks(_arrow_table(meta, rows, columns))
+    elif fmt == "msgpack":
+        _msgpack()  # fail with 406 before the response starts
+        chunks = _msgpack_chunks(meta, key, rows)
+    else:
+        chunks = _json_chunks(meta, key, rows)
+
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        chunks = _compress(chunks, encoding)
+    return StreamingResponse(chunks, media_type=MEDIA[fmt], headers=headers)
@@ -1,12 +1,27 @@
 """Load events and candidate markets from Kalshi and store them."""
 
 import os
-import json
 from datetime import datetime
 from dateutil.parser import parse
 
 
-from common import insert_to_supabase, fetch_price_24h_ago, request_json
+from common import (
+    fetch_price_24h_ago,
+    get_json_items,
+    get_with_failover,
+    insert_to_supabase,
+    request_json,
+)
+from metrics import METRICS
+from records import (
+    OUTCOME_KEY,
+    SNAPSHOT_KEY,
+    MarketRow,
+    OutcomeRow,
+    PriceRow,
+    SnapshotRow,
+    to_prob,
+)
 
 SUPABASE_URL = os.environ["SUPABASE_URL"]
 SERVICE_KEY = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
@@ -29,60 +44,169 @@ API_BASE = os.environ.get(
 # backwards compatibility.
 if not API_BASE.rstrip('/').endswith("trade-api/v2"):
     API_BASE = API_BASE.rstrip('/') + '/trade-api/v2'
-FALLBACK_BASE = "https://api.elections.kalshi.com/trade-api/v2"
+FALLBACK_BASE = os.environ.get(
+    "KALSHI_FALLBACK_BASE", "https://api.elections.kalshi.com/trade-api/v2"
+)
 
 EVENTS_URL = f"{API_BASE}/events"
 MARKETS_URL = f"{API_BASE}/markets"
 
+# the only keys read from each item; the rest is dropped while parsing
+EVENT_FIELDS = ("ticker", "event_ticker", "title")
+MARKET_FIELDS = (
+    "ticker", "close_time", "closeTime", "status", "last_price", "yes_bid",
+    "yes_ask", "volume", "open_interest",
+)
 
-def _request_with_fallback(url: str, *, params=None) -> dict | None:
-    """Return JSON from *url* with fallback to the older API host."""
-    j = request_json(url, headers=HEADERS_KALSHI, params=params)
-    if j is None and API_BASE != FALLBACK_BASE:
-        alt_url = url.replace(API_BASE, FALLBACK_BASE)
-        j = request_json(alt_url, headers=HEADERS_KALSHI, params=params)
-    return j
+
+def _request_items_with_fallback(url: str, key: str, *, params=None,
+                                 fields=None) -> list[dict] | None:
+    """Stream the ``key`` array of *url*, failing over to the older API host."""
+    return get_with_failover(
+        lambda u: get_json_items(u, key, fields=fields, headers=HEADERS_KALSHI, params=params),
+        [url, url.replace(API_BASE, FALLBACK_BASE)],
+    )
 
 
 def fetch_events() -> list[dict]:
     """Return a list of election events."""
-    j = _request_with_fallback(EVENTS_URL)
-    print("\N{POLICE CARS REVOLVING LIGHT} Kalshi response:")
-    print(json.dumps(j, indent=2) if j is not None else "None")
-    return j.get("events", []) if isinstance(j, dict) else []
+    events = _request_items_with_fallback(EVENTS_URL, "events", fields=EVENT_FIELDS)
+    print(f"\N{POLICE CARS REVOLVING LIGHT} Kalshi response: {len(events or [])} events")
+    return events or []
 
 
 def fetch_markets(event_ticker: str) -> list[dict]:
     """Return markets associated with *event_ticker*."""
-    j = _request_with_fallback(
-        MARKETS_URL, params={"event_ticker": event_ticker}
-    )
-    return j.get("markets", []) if isinstance(j, dict) else []
+    return _request_items_with_fallback(
+        MARKETS_URL, "markets", params={"event_ticker": event_ticker},
+        fields=MARKET_FIELDS,
+    ) or []
 
 
-def format_market_row(event: dict, market: dict) -> dict:
-    """Return a dict for the markets table using *event* and *market* data."""
+def format_market_row(event: dict, market: dict) -> MarketRow:
+    """Return a markets row using *event* and *market* data."""
     ticker = market.get("ticker")
     candidate = ticker.split("-")[-1] if ticker else None
     expiration_raw = market.get("close_time") or market.get("closeTime")
     expiration = parse(expiration_raw).isoformat() if expiration_raw else None
     event_ticker = event.get("ticker") or event.get("event_ticker")
     title = event.get("title") or event_ticker
-    return {
-        "market_id": ticker,
-        "market_name": candidate,
-        "market_description": title,
-        "event_name": title,
-        "event_ticker": event_ticker,
-        "expiration": expiration,
-        "tags": ["kalshi"],
-        "source": "kalshi",
-        "status": market.get("status") or "TRADING",
-    }
+    return MarketRow(
+        market_id=ticker,
+        market_name=candidate,
+        market_description=title,
+        event_name=title,
+        event_ticker=event_ticker,
+        expiration=expiration,
+        tags=["kalshi"],
+        source="kalshi",
+        status=market.get("status") or "TRADING",
+    )
+
+
+def build_event_rows(event: dict, markets: list[dict], ts: str, *,
+                     price_24h_ago=None) -> tuple[list, list, list, list]:
+    """Return (markets, snapshots, prices, outcomes) rows for one event.
+
+    *price_24h_ago* maps a ticker to its price a day ago (or ``None``) and
+    defaults to a Supabase lookup per ticker.
+    """
+    price_24h_ago = price_24h_ago or fetch_price_24h_ago
+    rows_m: list[MarketRow] = []
+    rows_s: list[SnapshotRow] = []
+    rows_p: list[PriceRow] = []
+    rows_o: list[OutcomeRow] = []
+
+    # map outcome label -> latest price
+    event_prices: dict[str, float | None] = {}
+
+    for m in markets:
+        ticker = m.get("ticker")
+        if not ticker:
+            continue
+        row_m = format_market_row(event, m)
+        rows_m.append(row_m)
+
+        candidate = row_m.market_name
+        expiration = row_m.expiration
+        price = to_prob(m.get("last_price"))
+        yes_bid = to_prob(m.get("yes_bid"))
+        yes_ask = to_prob(m.get("yes_ask"))
+        avg_price = None
+        if yes_bid is not None and yes_ask is not None:
+            avg_price = round((yes_bid + yes_ask) / 2, 4)
+        elif price is not None:
+            avg_price = round(price, 4)
+
+        volume = m.get("volume")
+        dollar_volume = None
+        if volume is not None and avg_price is not None:
+            dollar_volume = round(volume * avg_price, 2)
+
+        past = price_24h_ago(ticker)
+        change_24h = None
+        pct_change = None
+        if past is not None and avg_price is not None:
+            change_24h = round(avg_price - past, 4)
+            pct_change = round(change_24h / past * 100, 2) if past else None
+
+        rows_s.append(
+            SnapshotRow(
+                market_id=ticker,
+                price=avg_price,
+                yes_bid=yes_bid,
+                no_bid=yes_ask,
+                volume=volume,
+                dollar_volume=dollar_volume,
+                liquidity=m.get("open_interest"),
+                expiration=expiration,
+                timestamp=ts,
+                source="kalshi",
+            )
+        )
+
+        rows_p.append(
+            PriceRow(
+                market_id=ticker,
+                price=avg_price,
+                change_24h=change_24h,
+                percent_change_24h=pct_change,
+                timestamp=ts,
+                source="kalshi",
+            )
+        )
+
+        event_prices[candidate] = avg_price
+
+    # insert a row per outcome for each market
+    for m in markets:
+        ticker = m.get("ticker")
+        if not ticker:
+            continue
+        for cand, pr in event_prices.items():
+            if pr is None:
+                continue
+            rows_o.append(
+                OutcomeRow(
+                    market_id=ticker,
+                    outcome_name=cand,
+                    price=pr,
+                    timestamp=ts,
+                    source="kalshi",
+                )
+            )
+
+    return rows_m, rows_s, rows_p, rows_o
+
+
+def _timed_price_24h_ago(ticker: str) -> float | None:
+    with METRICS.stage("price_24h"):
+        return fetch_price_24h_ago(ticker)
 
 
 def main() -> None:
-    events = fetch_events()
+    with METRICS.stage("events"):
+        events = fetch_events()
     ts = datetime.utcnow().isoformat() + "Z"
 
     rows_e: list[dict] = []
@@ -102,101 +226,22 @@ def main() -> None:
             "source": "kalshi",
         })
 
-        markets = fetch_markets(event_ticker)
-
-        # map outcome label -> latest price
-        event_prices: dict[str, float | None] = {}
+        with METRICS.stage("markets"):
+            markets = fetch_markets(event_ticker)
 
-        for m in markets:
-            ticker = m.get("ticker")
-            if not ticker:
-                continue
-            row_m = format_market_row(event, m)
-            rows_m.append(row_m)
-
-            candidate = row_m["market_name"]
-            expiration = row_m["expiration"]
-            price = m.get("last_price")
-            if price is not None and price > 1:
-                price /= 100
-
-            yes_bid = m.get("yes_bid")
-            if yes_bid is not None and yes_bid > 1:
-                yes_bid /= 100
-            yes_ask = m.get("yes_ask")
-            if yes_ask is not None and yes_ask > 1:
-                yes_ask /= 100
-            avg_price = None
-            if yes_bid is not None and yes_ask is not None:
-                avg_price = round((yes_bid + yes_ask) / 2, 4)
-            elif price is not None:
-                avg_price = round(price, 4)
-
-            volume = m.get("volume")
-            dollar_volume = None
-            if volume is not None and avg_price is not None:
-                dollar_volume = round(volume * avg_price, 2)
-
-            past = fetch_price_24h_ago(ticker)
-            change_24h = None
-            pct_change = None
-            if past is not None and avg_price is not None:
-                change_24h = round(avg_price - past, 4)
-                pct_change = round(change_24h / past * 100, 2) if past else None
-
-            rows_s.append(
-                {
-                    "market_id": ticker,
-                    "price": avg_price,
-                    "yes_bid": yes_bid,
-                    "no_bid": yes_ask,
-                    "volume": volume,
-                    "dollar_volume": dollar_volume,
-                    "vwap": None,
-                    "liquidity": m.get("open_interest"),
-                    "expiration": expiration,
-                    "timestamp": ts,
-                    "source": "kalshi",
-                }
-            )
-
-            rows_p.append(
-                {
-                    "market_id": ticker,
-                    "price": avg_price,
-                    "change_24h": change_24h,
-                    "percent_change_24h": pct_change,
-                    "timestamp": ts,
-                    "source": "kalshi",
-                }
-            )
-
-            event_prices[candidate] = avg_price
-
-        # insert a row per outcome for each market
-        for m in markets:
-            ticker = m.get("ticker")
-            if not ticker:
-                continue
-            for cand, pr in event_prices.items():
-                if pr is None:
-                    continue
-                rows_o.append(
-                    {
-                        "market_id": ticker,
-                        "outcome_name": cand,
-                        "price": pr,
-                        "volume": None,
-                        "timestamp": ts,
-                        "source": "kalshi",
-                    }
-                )
+        m_rows, s_rows, p_rows, o_rows = build_event_rows(
+            event, markets, ts, price_24h_ago=_timed_price_24h_ago,
+        )
+        rows_m.extend(m_rows)
+        rows_s.extend(s_rows)
+        rows_p.extend(p_rows)
+        rows_o.extend(o_rows)
 
     # insert_to_supabase("events", rows_e, conflict_key="event_id")
     # insert_to_supabase("markets", rows_m)
-    # insert_to_supabase("market_snapshots", rows_s, conflict_key=None)
-    # insert_to_supabase("market_prices", rows_p, conflict_key=None)
-    # insert_to_supabase("market_outcomes", rows_o, conflict_key=None)
+    # insert_to_supabase("market_snapshots", rows_s, conflict_key=SNAPSHOT_KEY)
+    # insert_to_supabase("market_prices", rows_p, conflict_key=SNAPSHOT_KEY)
+    # insert_to_supabase("market_outcomes", rows_o, conflict_key=OUTCOME_KEY)
 
     diag_url = (
         f"{SUPABASE_URL}/rest/v1/latest_snapshots?select=market_id,source,price&order=timestamp.desc&limit=3"
@@ -2,7 +2,20 @@ import os
 import logging
 from datetime import datetime, timedelta, timezone
 from dateutil import parser
-from common import insert_to_supabase, fetch_stats_concurrent, request_json
+from common import (
+    HostsUnavailable,
+    aggregate_trades,
+    fetch_stats_concurrent,
+    get_json_items,
+    get_with_failover,
+    insert_to_supabase,
+    request_json,
+)
+from metrics import METRICS
+from records import OUTCOME_KEY, SNAPSHOT_KEY, OutcomeRow, SnapshotRow, to_prob
+from scheduler import RefreshScheduler, run_every
+from sharding import ShardLease
+from trades import TradeLog
 import requests
 import time
 
@@ -35,20 +48,35 @@ API_BASE = os.environ.get(
 # ``/trade-api/v2`` path if it's missing so callers don't need to include it.
 if not API_BASE.rstrip('/').endswith("trade-api/v2"):
     API_BASE = API_BASE.rstrip('/') + '/trade-api/v2'
-FALLBACK_BASE = "https://api.elections.kalshi.com/trade-api/v2"
+FALLBACK_BASE = os.environ.get(
+    "KALSHI_FALLBACK_BASE", "https://api.elections.kalshi.com/trade-api/v2"
+)
 
 MARKETS_URL = f"{API_BASE}/markets"
 TRADES_ENDPOINT = f"{API_BASE}/markets/{{}}/trades"
 
+# the only listing and trade fields main() reads; the rest of each item is
+# dropped while the page is parsed
+MARKET_FIELDS = (
+    "ticker", "last_price", "yes_bid", "no_bid", "volume_24h", "open_interest",
+    "close_time", "closeTime", "expiration",
+)
+TRADE_FIELDS = ("trade_id", "timestamp", "price", "size")
+# raw trades are also kept when TRADES_STATE_DIR is set (see trades.py)
+TRADE_LOG = TradeLog.for_loader("kalshi")
+
 
-def _request_with_fallback(url: str, *, params=None) -> dict | None:
-    """Fetch *url* with fallback to the older API host if needed."""
-    j = request_json(url, headers=HEADERS_KALSHI, params=params)
-    if j is None and API_BASE != FALLBACK_BASE:
-        alt_url = url.replace(API_BASE, FALLBACK_BASE)
-        j = request_json(alt_url, headers=HEADERS_KALSHI, params=params)
-    return j
+def _request_items_with_fallback(url: str, key: str, *, params=None,
+                                 fields=None) -> list[dict] | None:
+    """Stream the ``key`` array of *url*, failing over to the older host.
 
+    Hosts are tracked by ``common.BREAKER``: once the primary is down, calls
+    go straight to ``FALLBACK_BASE`` until a probe finds it healthy again.
+    """
+    return get_with_failover(
+        lambda u: get_json_items(u, key, fields=fields, headers=HEADERS_KALSHI, params=params),
+        [url, url.replace(API_BASE, FALLBACK_BASE)],
+    )
 
 def fetch_all_markets(limit: int = 1000) -> list[dict]:
     """Return a list of all Kalshi markets."""
@@ -56,12 +84,10 @@ def fetch_all_markets(limit: int = 1000) -> list[dict]:
     seen: set[str] = set()
     offset = 0
     while True:
-        j = _request_with_fallback(
-            MARKETS_URL, params={"limit": limit, "offset": offset}
+        batch = _request_items_with_fallback(
+            MARKETS_URL, "markets", params={"limit": limit, "offset": offset},
+            fields=MARKET_FIELDS,
         )
-        if j is None:
-            break
-        batch = j.get("markets", [])
         if not batch:
             break
         tickers = [m.get("ticker") for m in batch if m.get("ticker")]
@@ -89,65 +115,102 @@ def fetch_active_market_info() -> dict[str, datetime | None]:
 
 def fetch_trade_stats(ticker: str):
     try:
-        j = _request_with_fallback(TRADES_ENDPOINT.format(ticker))
-        if j is None:
+        trades = _request_items_with_fallback(
+            TRADES_ENDPOINT.format(ticker), "trades", fields=TRADE_FIELDS)
+        if trades is None:
             return 0.0, 0, None
-        trades = j.get("trades", [])
+        if TRADE_LOG is not None:
+            TRADE_LOG.record(ticker, trades, size_key="size", to_price=to_prob)
         cutoff = datetime.now(timezone.utc) - timedelta(hours=24)
-
-        total_contracts = 0
-        total_dollar_volume = 0.0
-
-        for t in trades:
-            ts = parser.parse(t["timestamp"])
-            if ts >= cutoff:
-                size = t["size"]
-                price = t["price"]
-                if price is not None and price > 1:
-                    price /= 100
-                total_contracts += size
-                total_dollar_volume += size * price
-
-        vwap = total_dollar_volume / total_contracts if total_contracts else None
-        return round(total_dollar_volume, 2), total_contracts, round(vwap, 4) if vwap else None
+        return aggregate_trades(trades, cutoff, size_key="size", to_price=to_prob)
+    except HostsUnavailable:
+        raise
     except Exception as e:
         logging.warning("trade fetch failed for %s: %s", ticker, e)
         return 0.0, 0, None
 
-def main():
+def rank_key(m: dict) -> tuple:
+    """Sort key for refresh priority using fields already in the listing."""
+    return (m.get("volume_24h") or 0, m.get("open_interest") or 0)
+
+def replicate_outcomes(tickers, event_prices: dict[str, dict[str, float]],
+                       ts: str) -> list[OutcomeRow]:
+    """Return a row for every sibling candidate of each ticker's event."""
+    rows = []
+    for mid in tickers:
+        if not mid:
+            continue
+        evt = mid.rsplit("-", 1)[0]
+        cand_self = mid.split("-")[-1]
+        for cand, price in event_prices.get(evt, {}).items():
+            if cand == cand_self or price is None:
+                continue
+            rows.append(OutcomeRow(
+                market_id=mid,
+                outcome_name=cand,
+                price=price,
+                timestamp=ts,
+                source="kalshi",
+            ))
+    return rows
+
+def main(lease: ShardLease | None = None):
     now = datetime.now(timezone.utc)
     ts = now.isoformat().replace("+00:00", "Z")
-    markets = fetch_all_markets()
+    with METRICS.stage("listing"):
+        markets = fetch_all_markets()
 
-    active = fetch_active_market_info()
+    with METRICS.stage("active"):
+        active = fetch_active_market_info()
     logging.info("loaded %s active market ids", len(active))
 
-    tickers = [m.get("ticker") for m in markets if m.get("ticker") in active]
-    stats_list, failed = fetch_stats_concurrent(tickers, fetch_trade_stats)
+    candidates = [m for m in markets if m.get("ticker") in active]
+    if lease is not None:
+        candidates = lease.filter(candidates, key=lambda m: m["ticker"])
+        logging.info("%s markets in leased shards", len(candidates))
+    sched = RefreshScheduler.for_loader("kalshi")
+    if sched is not None:
+        sched.sync(m["ticker"] for m in candidates)
+        due = set(sched.due())
+        candidates = [m for m in candidates if m["ticker"] in due]
+        logging.info("%s markets due for refresh", len(candidates))
+
+    # rank on the listing's own activity signals; trades are only
+    # downloaded for the markets that make the cut
+    if sched is not None:
+        # most overdue first, so busy markets can't starve the rest; the
+        # listing signals only break ties (every new market is due at once)
+        candidates.sort(key=lambda m: (sched.state[m["ticker"]]["due"],
+                                       [-x for x in rank_key(m)]))
+        top_markets = candidates[:FETCH_LIMIT]
+    else:
+        top_markets = sorted(candidates, key=rank_key, reverse=True)[:FETCH_LIMIT]
+
+    if lease is not None:
+        # a heartbeat may have handed shards on since the listing was split;
+        # once fetched, a market is written even if its shard moves
+        top_markets = lease.filter(top_markets, key=lambda m: m["ticker"])
+    tickers = [m.get("ticker") for m in top_markets]
+    with METRICS.stage("trades"):
+        stats_list, failed = fetch_stats_concurrent(tickers, fetch_trade_stats)
     stats_map = {mid: stats for mid, stats in stats_list}
-    for m in markets:
-        tkr = m.get("ticker")
-        if not tkr:
-            continue
-        dv, ct, vw = stats_map.get(tkr, (0.0, 0, None))
+    for m in top_markets:
+        dv, ct, vw = stats_map.get(m.get("ticker"), (0.0, 0, None))
         m["volume_24h"] = ct
         m["dollar_volume_24h"] = dv
         m["vwap_24h"] = vw
     if failed:
         logging.warning("failed trade stats for %s", failed)
-
-    # rank by past 24h volume but only include known/active markets
-    top_markets = sorted(
-        [m for m in markets if m.get("ticker") in active],
-        key=lambda m: m.get("volume_24h", 0),
-        reverse=True,
-    )[:FETCH_LIMIT]
+    if TRADE_LOG is not None:
+        with METRICS.stage("trade_log"):
+            TRADE_LOG.flush()
 
     # only insert snapshots for markets already present in the DB
     known_ids = set(active.keys())
 
     snapshots, outcomes = [] , []
     event_prices: dict[str, dict[str, float]] = {}
+    refreshed: dict[str, dict] = {}
     skipped = 0
     for m in top_markets:
         mid = m.get("ticker")
@@ -167,15 +230,9 @@ def main():
             skipped += 1
             continue
 
-        last_price = m.get("last_price")
-        if last_price is not None and last_price > 1:
-            last_price /= 100
-        yes_bid = m.get("yes_bid")
-        if yes_bid is not None and yes_bid > 1:
-            yes_bid /= 100
-        no_bid = m.get("no_bid")
-        if no_bid is not None and no_bid > 1:
-            no_bid /= 100
+        last_price = to_prob(m.get("last_price"))
+        yes_bid = to_prob(m.get("yes_bid"))
+        no_bid = to_prob(m.get("no_bid"))
         if last_price is None and yes_bid is None and no_bid is None:
             logging.info("skipping %s: no price data", mid)
             skipped += 1
@@ -185,57 +242,60 @@ def main():
         dollar_volume   = m.get("dollar_volume_24h", 0.0)
         vwap            = m.get("vwap_24h")
 
-        snapshots.append({
-            "market_id":  mid,
-            "price":      round(last_price, 4) if last_price is not None else None,
-            "yes_bid":    yes_bid,
-            "no_bid":     no_bid,
-            "volume":     contract_volume,
+        refreshed[mid] = {
+            "price": last_price,
             "dollar_volume": dollar_volume,
-            "vwap":       vwap,
-            "liquidity":  m.get("open_interest"),
-            "timestamp":  ts,
-            "source":     "kalshi",
-        })
+            "expiration": exp_dt,
+        }
+        snapshots.append(SnapshotRow(
+            market_id=mid,
+            price=round(last_price, 4) if last_price is not None else None,
+            yes_bid=yes_bid,
+            no_bid=no_bid,
+            volume=contract_volume,
+            dollar_volume=dollar_volume,
+            vwap=vwap,
+            liquidity=m.get("open_interest"),
+            timestamp=ts,
+            source="kalshi",
+        ))
 
         if last_price is not None:
             cand = mid.split("-")[-1]
             evt  = mid.rsplit("-", 1)[0]
             event_prices.setdefault(evt, {})[cand] = last_price
-            outcomes.append({
-                "market_id":    mid,
-                "outcome_name": cand,
-                "price":        last_price,
-                "volume":       None,
-                "timestamp":    ts,
-                "source":       "kalshi",
-            })
+            outcomes.append(OutcomeRow(
+                market_id=mid,
+                outcome_name=cand,
+                price=last_price,
+                timestamp=ts,
+                source="kalshi",
+            ))
 
     # replicate full outcome set for each market
-    for m in top_markets:
-        mid = m.get("ticker")
-        if not mid:
-            continue
-        evt = mid.rsplit("-", 1)[0]
-        cand_self = mid.split("-")[-1]
-        for cand, price in event_prices.get(evt, {}).items():
-            if cand == cand_self or price is None:
-                continue
-            outcomes.append({
-                "market_id":    mid,
-                "outcome_name": cand,
-                "price":        price,
-                "volume":       None,
-                "timestamp":    ts,
-                "source":       "kalshi",
-            })
+    outcomes.extend(replicate_outcomes(
+        [m.get("ticker") for m in top_markets], event_prices, ts,
+    ))
+
+    if sched is not None:
+        for m in top_markets:
+            if m["ticker"] in failed:
+                sched.retry(m["ticker"])
+            else:
+                sched.record(m["ticker"], **refreshed.get(m["ticker"], {}))
+        sched.save()
 
     logging.info("writing %s snapshots and %s outcomes", len(snapshots), len(outcomes))
-    # insert_to_supabase("market_snapshots", snapshots, conflict_key=None)
-    # insert_to_supabase("market_outcomes", outcomes, conflict_key=None)
+    # insert_to_supabase("market_snapshots", snapshots, conflict_key=SNAPSHOT_KEY)
+    # insert_to_supabase("market_outcomes", outcomes, conflict_key=OUTCOME_KEY)
     if skipped:
         logging.info("skipped %s markets", skipped)
     logging.info("done")
 
 if __name__ == "__main__":
-    main()
+    lease = ShardLease.for_loader("kalshi-update")
+    if lease is None:
+        run_every(main)
+    else:
+        with lease:
+            run_every(lambda: main(lease))
@@ -1,8 +1,15 @@
+import hashlib
+import json
 import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-import feedparser
-from datetime import datetime, timedelta
-import openai
+
+from common import http_get
+from metrics import METRICS
 
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SERVICE_KEY  = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
@@ -14,88 +21,219 @@ SUPA_HEADERS = {
     "Content-Type":  "application/json",
 }
 
-openai.api_key = OPENAI_KEY
-
 NEWS_RSS = "https://news.google.com/rss/search?q={query}&hl=en-US&gl=US&ceid=US:en"
 
-def fetch_latest_price(mid: str):
-    url = f"{SUPABASE_URL}/rest/v1/latest_snapshots?select=price,volume,market_name&market_id=eq.{mid}"
-    r = requests.get(url, headers=SUPA_HEADERS, timeout=10)
-    r.raise_for_status()
-    rows = r.json()
-    return rows[0] if rows else None
+# mover detection thresholds (change is in percentage points of probability)
+MOVER_CHANGE_PCT = float(os.environ.get("MOVER_CHANGE_PCT", "5"))
+MOVER_MIN_VOLUME = int(os.environ.get("MOVER_MIN_VOLUME", "10000"))
+MOVER_CANDIDATES = int(os.environ.get("MOVER_CANDIDATES", "1000"))
+MOVER_LIMIT = int(os.environ.get("MOVER_LIMIT", "10"))
 
-def fetch_price_24h_ago(mid: str):
-    since = (datetime.utcnow() - timedelta(hours=24)).isoformat() + "Z"
-    url = (
-        f"{SUPABASE_URL}/rest/v1/market_snapshots?select=price&market_id=eq.{mid}&timestamp=lt.{since}&order=timestamp.desc&limit=1"
-    )
-    r = requests.get(url, headers=SUPA_HEADERS, timeout=10)
-    r.raise_for_status()
-    rows = r.json()
-    return rows[0]["price"] if rows else None
+NEWS_CACHE_PATH = os.environ.get("NEWS_CACHE_PATH", ".cache/news.sqlite")
+NEWS_FEED_TTL = int(os.environ.get("NEWS_FEED_TTL", "1800"))
+NEWS_WORKERS = int(os.environ.get("NEWS_WORKERS", "4"))
+
+class NewsCache:
+    """Persistent SQLite cache for RSS feeds and AI summaries.
+
+    Feeds expire after *feed_ttl* seconds. Summaries never expire: they are
+    keyed by market and a hash of the headlines they were written from, so a
+    story only gets re-summarized once its headlines change.
+    """
+
+    def __init__(self, path: str = NEWS_CACHE_PATH, feed_ttl: int = NEWS_FEED_TTL):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.feed_ttl = feed_ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(
+            """
+            create table if not exists feeds (
+                query text primary key,
+                fetched_at real not null,
+                articles text not null
+            );
+            create table if not exists summaries (
+                market text not null,
+                digest text not null,
+                summary text not null,
+                created_at real not null,
+                primary key (market, digest)
+            );
+            """
+        )
+
+    def get_feed(self, query: str):
+        with self._lock:
+            row = self._db.execute(
+                "select fetched_at, articles from feeds where query = ?", (query,)
+            ).fetchone()
+        if not row or time.time() - row[0] > self.feed_ttl:
+            return None
+        return [tuple(a) for a in json.loads(row[1])]
+
+    def put_feed(self, query: str, articles) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "insert or replace into feeds values (?, ?, ?)",
+                (query, time.time(), json.dumps(articles)),
+            )
+
+    def get_summary(self, market: str, digest: str):
+        with self._lock:
+            row = self._db.execute(
+                "select summary from summaries where market = ? and digest = ?",
+                (market, digest),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_summary(self, market: str, digest: str, summary: str) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "insert or replace into summaries values (?, ?, ?, ?)",
+                (market, digest, summary, time.time()),
+            )
+
+
+def headlines_digest(articles) -> str:
+    """Return a stable hash of the headlines in *articles*."""
+    titles = "\n".join(sorted(t for t, _ in articles))
+    return hashlib.sha256(titles.encode()).hexdigest()
 
-def fetch_google_news(query: str, limit: int = 3):
+def fetch_google_news(query: str, limit: int = 3, cache: NewsCache | None = None):
+    if cache is not None:
+        hit = cache.get_feed(query)
+        if hit is not None:
+            return hit[:limit]
     url = NEWS_RSS.format(query=requests.utils.quote(query))
-    r = requests.get(url, timeout=10)
+    r = http_get(url, timeout=10)
     r.raise_for_status()
+    import feedparser  # imported lazily: only the news path needs it
+
     feed = feedparser.parse(r.content)
-    return [(e.title, e.link) for e in feed.entries[:limit]]
+    articles = [(e.title, e.link) for e in feed.entries[:limit]]
+    if cache is not None:
+        cache.put_feed(query, articles)
+    return articles
+
+_openai_client = None
+
+def _chat(prompt: str) -> str:
+    global _openai_client
+    if _openai_client is None:
+        import openai  # imported lazily: costs ~0.4s at startup
+
+        _openai_client = openai.OpenAI(api_key=OPENAI_KEY)
+    res = _openai_client.chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.7,
+    )
+    return res.choices[0].message.content.strip()
 
-def summarize_articles(market: str, articles):
-    if not OPENAI_KEY:
+def summarize_articles(market: str, articles, cache: NewsCache | None = None,
+                       chat=None):
+    if not OPENAI_KEY and chat is None:
         return "(OpenAI key missing – cannot summarize)"
+    digest = headlines_digest(articles)
+    if cache is not None:
+        hit = cache.get_summary(market, digest)
+        if hit is not None:
+            return hit
     headlines = "\n".join(f"- {t}" for t, _ in articles)
     prompt = (
         f"Recent news about {market}:\n{headlines}\n\n"
         "Write a short, punchy tweet-style summary, then give a brief outlook on future developments."
     )
     try:
-        res = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-        )
-        return res.choices[0].message["content"].strip()
+        summary = (chat or _chat)(prompt)
     except Exception as e:
+        # failures are not cached so the next run retries
         return f"(AI summary failed: {e})"
+    if cache is not None:
+        cache.put_summary(market, digest, summary)
+    return summary
 
-def detect_movers(change_pct: float = 5.0, volume_threshold: int = 10000):
-    url = f"{SUPABASE_URL}/rest/v1/latest_snapshots?select=market_id&limit=200"
-    r = requests.get(url, headers=SUPA_HEADERS, timeout=10)
-    r.raise_for_status()
-    ids = [row["market_id"] for row in r.json()]
+def summarize_movers(movers, *, cache: NewsCache | None = None,
+                     fetch_news=fetch_google_news, summarize=summarize_articles,
+                     workers: int = NEWS_WORKERS):
+    """Fetch news and summaries for *movers* with at most *workers* in flight.
+
+    Returns ``(mover, articles, summary)`` tuples in the order of *movers*.
+    """
+    def run(m):
+        try:
+            articles = fetch_news(m["market_name"], cache=cache)
+        except Exception as e:
+            print(f"⚠️ news fetch failed for {m['market_id']}: {e}")
+            articles = []
+        if not articles:
+            return m, [], "(no recent news)"
+        return m, articles, summarize(m["market_name"], articles, cache=cache)
 
+    if not movers:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(movers)))) as ex:
+        return list(ex.map(run, movers))
+
+def rank_movers(rows, change_pct: float = MOVER_CHANGE_PCT,
+                volume_threshold: int = MOVER_MIN_VOLUME,
+                limit: int = MOVER_LIMIT):
+    """Return the biggest movers in *rows*, largest absolute change first."""
     movers = []
-    for mid in ids:
-        cur = fetch_latest_price(mid)
-        if not cur:
+    for row in rows:
+        change = row.get("change_24h")
+        if change is None or row.get("price") is None:
             continue
-        prev_price = fetch_price_24h_ago(mid)
-        if prev_price is None or cur["price"] is None:
-            continue
-        change = (cur["price"] - prev_price) * 100
-        if abs(change) >= change_pct and (cur["volume"] or 0) >= volume_threshold:
+        change = change * 100
+        if abs(change) >= change_pct and (row.get("volume") or 0) >= volume_threshold:
             movers.append({
-                "market_id": mid,
-                "market_name": cur.get("market_name") or mid,
+                "market_id": row["market_id"],
+                "market_name": row.get("market_name") or row["market_id"],
+                "price": row["price"],
+                "volume": row.get("volume"),
                 "change_pct": round(change, 2),
             })
-    return movers
+    movers.sort(key=lambda m: abs(m["change_pct"]), reverse=True)
+    return movers[:limit]
+
+def detect_movers(change_pct: float = MOVER_CHANGE_PCT,
+                  volume_threshold: int = MOVER_MIN_VOLUME,
+                  limit: int = MOVER_LIMIT,
+                  candidates: int = MOVER_CANDIDATES):
+    """Return ranked movers using a single ``latest_snapshots`` query.
+
+    The view already joins each market's latest snapshot with the one 24h
+    earlier, so current price, previous price (via ``change_24h``) and volume
+    arrive together and the volume filter is applied server-side.
+    """
+    url = f"{SUPABASE_URL}/rest/v1/latest_snapshots"
+    params = {
+        "select": "market_id,market_name,price,volume,change_24h",
+        "volume": f"gte.{volume_threshold}",
+        "change_24h": "not.is.null",
+        "order": "volume.desc",
+        "limit": candidates,
+    }
+    r = http_get(url, headers=SUPA_HEADERS, params=params, timeout=20)
+    r.raise_for_status()
+    return rank_movers(r.json(), change_pct, volume_threshold, limit)
 
 def main():
-    movers = detect_movers()
+    with METRICS.stage("movers"):
+        movers = detect_movers()
     if not movers:
         print("No big movers found.")
         return
-    for m in movers:
+    cache = NewsCache()
+    with METRICS.stage("summaries"):
+        results = summarize_movers(movers, cache=cache)
+    for m, articles, summary in results:
         print(f"\n== {m['market_name']} ({m['change_pct']}% change) ==")
-        articles = fetch_google_news(m["market_name"])
         for t, link in articles:
             print(f"- {t}\n  {link}")
-        summary = summarize_articles(m["market_name"], articles)
         print("Summary:\n", summary)
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,276 @@
+"""Link Kalshi and Polymarket markets that ask the same question.
+
+Every market is reduced to a token set (title, event, description and the
+expiration month) and a MinHash signature. Signatures are split into LSH
+bands; markets sharing any band bucket become candidate pairs, so matching
+costs roughly one bucket lookup per band instead of comparing every Kalshi
+market with every Polymarket one. Candidates are confirmed on exact token
+Jaccard and expiration distance and upserted into ``market_matches``; the
+``market_spreads`` view (``schema.sql``) then exposes cross-venue prices.
+
+The index is saved to ``MATCH_STATE_PATH`` so each run only signs and
+queries markets it has not seen before.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import random
+import re
+import zlib
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from common import http_get, write_rows
+from metrics import METRICS
+
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SERVICE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+SUPA_HEADERS = {
+    "apikey": SERVICE_KEY or "",
+    "Authorization": f"Bearer {SERVICE_KEY}" if SERVICE_KEY else "",
+}
+
+MATCH_STATE_PATH = os.environ.get("MATCH_STATE_PATH", ".cache/match_index.json")
+MATCH_MIN_SCORE = float(os.environ.get("MATCH_MIN_SCORE", "0.45"))
+MATCH_MAX_EXPIRY_DAYS = float(os.environ.get("MATCH_MAX_EXPIRY_DAYS", "7"))
+PAGE_SIZE = 1000
+
+# 16 bands × 4 rows: pairs with Jaccard ≳ 0.4 collide in some band with
+# high probability, pairs below ~0.2 rarely do
+NUM_PERM = 64
+BANDS = 16
+
+_MERSENNE = (1 << 61) - 1
+_rnd = random.Random(20240501)
+_PERMS = [(_rnd.randrange(1, _MERSENNE), _rnd.randrange(_MERSENNE)) for _ in range(NUM_PERM)]
+
+STOPWORDS = frozenset(
+    "a an and are at be before by for from in is it of on or the this to will "
+    "who what which with than more less market yes no".split()
+)
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _parse_exp(value) -> datetime | None:
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def tokens(row: dict) -> frozenset[str]:
+    """Return the normalised token set used to compare *row* across venues."""
+    text = " ".join(
+        str(row.get(k) or "")
+        for k in ("market_name", "event_name", "market_description")
+    ).lower()
+    toks = {w for w in _WORD.findall(text) if w not in STOPWORDS and len(w) > 1}
+    exp = _parse_exp(row.get("expiration"))
+    if exp is not None:
+        toks.add(f"exp:{exp:%Y-%m}")
+    return frozenset(toks)
+
+
+def jaccard(a, b) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MatchIndex:
+    """MinHash/LSH index over both venues' markets."""
+
+    def __init__(self):
+        # market_id → {"source", "tokens", "expiration"}
+        self.markets: dict[str, dict] = {}
+        # (band, hash of band slice) → market ids
+        self.buckets: dict[tuple[int, int], list[str]] = defaultdict(list)
+        self._token_hashes: dict[str, list[int]] = {}
+
+    # ───────────── signatures
+    def _hashes(self, token: str) -> list[int]:
+        # tokens repeat heavily across a catalog, so each is hashed once
+        h = self._token_hashes.get(token)
+        if h is None:
+            x = zlib.crc32(token.encode())
+            h = self._token_hashes[token] = [(a * x + b) % _MERSENNE for a, b in _PERMS]
+        return h
+
+    def signature(self, toks) -> list[int]:
+        if not toks:
+            return []
+        return list(map(min, zip(*(self._hashes(t) for t in toks))))
+
+    def _band_keys(self, sig: list[int]):
+        rows = NUM_PERM // BANDS
+        for b in range(BANDS):
+            yield b, hash(tuple(sig[b * rows:(b + 1) * rows]))
+
+    # ───────────── updates and queries
+    def add(self, row: dict) -> list[tuple[str, str, float]]:
+        """Index *row* and return confirmed ``(kalshi, polymarket, score)`` pairs."""
+        mid = row.get("market_id")
+        source = row.get("source")
+        if not mid or source not in ("kalshi", "polymarket") or mid in self.markets:
+            return []
+        toks = tokens(row)
+        exp = _parse_exp(row.get("expiration"))
+        self.markets[mid] = {"source": source, "tokens": toks, "expiration": exp}
+        sig = self.signature(toks)
+        if not sig:
+            return []
+
+        seen: set[str] = set()
+        out = []
+        for key in self._band_keys(sig):
+            bucket = self.buckets[key]
+            for other in bucket:
+                if other in seen:
+                    continue
+                seen.add(other)
+                o = self.markets[other]
+                if o["source"] == source:
+                    continue
+                score = self._score(toks, exp, o)
+                if score is not None:
+                    pair = (mid, other) if source == "kalshi" else (other, mid)
+                    out.append((*pair, score))
+            bucket.append(mid)
+        return out
+
+    @staticmethod
+    def _score(toks, exp, other: dict) -> float | None:
+        o_exp = other["expiration"]
+        if exp and o_exp and abs((exp - o_exp).total_seconds()) > MATCH_MAX_EXPIRY_DAYS * 86400:
+            return None
+        score = jaccard(toks, other["tokens"])
+        return round(score, 4) if score >= MATCH_MIN_SCORE else None
+
+    def update(self, rows) -> list[tuple[str, str, float]]:
+        """Index every new market in *rows*; return the new matches."""
+        matches = []
+        for row in rows:
+            matches.extend(self.add(row))
+        return matches
+
+    def retain(self, market_ids) -> int:
+        """Forget indexed markets not in *market_ids*; return how many."""
+        keep = set(market_ids)
+        gone = {mid for mid in self.markets if mid not in keep}
+        if not gone:
+            return 0
+        for mid in gone:
+            del self.markets[mid]
+        for key in list(self.buckets):
+            ids = [mid for mid in self.buckets[key] if mid not in gone]
+            if ids:
+                self.buckets[key] = ids
+            else:
+                del self.buckets[key]
+        return len(gone)
+
+    # ───────────── persistence
+    def save(self, path: str = MATCH_STATE_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        state = {
+            mid: {
+                "source": m["source"],
+                "tokens": sorted(m["tokens"]),
+                "expiration": m["expiration"].isoformat() if m["expiration"] else None,
+            }
+            for mid, m in self.markets.items()
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = MATCH_STATE_PATH) -> "MatchIndex":
+        index = cls()
+        if not os.path.exists(path):
+            return index
+        with open(path) as f:
+            state = json.load(f)
+        for mid, m in state.items():
+            toks = frozenset(m["tokens"])
+            index.markets[mid] = {
+                "source": m["source"],
+                "tokens": toks,
+                "expiration": _parse_exp(m["expiration"]),
+            }
+            sig = index.signature(toks)
+            if sig:
+                for key in index._band_keys(sig):
+                    index.buckets[key].append(mid)
+        return index
+
+
+def fetch_markets() -> list[dict]:
+    """Return the matching columns of every Kalshi and Polymarket market."""
+    url = f"{SUPABASE_URL}/rest/v1/markets"
+    rows: list[dict] = []
+    offset = 0
+    while True:
+        params = {
+            "select": "market_id,market_name,event_name,market_description,expiration,source",
+            "source": "in.(kalshi,polymarket)",
+            "order": "market_id",
+            "limit": PAGE_SIZE,
+            "offset": offset,
+        }
+        r = http_get(url, headers=SUPA_HEADERS, params=params, timeout=60)
+        r.raise_for_status()
+        batch = r.json()
+        rows.extend(batch)
+        if len(batch) < PAGE_SIZE:
+            return rows
+        offset += PAGE_SIZE
+
+
+def fetch_spreads(limit: int = 20) -> list[dict]:
+    """Return the widest current cross-venue spreads from ``market_spreads``."""
+    url = f"{SUPABASE_URL}/rest/v1/market_spreads"
+    params = {"select": "*", "order": "abs_spread.desc.nullslast", "limit": limit}
+    r = http_get(url, headers=SUPA_HEADERS, params=params, timeout=20)
+    r.raise_for_status()
+    return r.json()
+
+
+def main():
+    index = MatchIndex.load(MATCH_STATE_PATH)
+    with METRICS.stage("markets"):
+        rows = fetch_markets()
+    with METRICS.stage("match"):
+        # markets deleted by cleanup_markets must not be paired again
+        dropped = index.retain(r["market_id"] for r in rows)
+        matches = index.update(rows)
+    now = datetime.now(timezone.utc).isoformat()
+    print(f"indexed {len(index.markets)} markets ({dropped} dropped), "
+          f"{len(matches)} new matches")
+    if matches:
+        with METRICS.stage("writes"):
+            # raises on a rejected chunk, so the index is only saved (and the
+            # pairs only count as seen) once they are stored
+            write_rows(
+                "market_matches",
+                [
+                    {"kalshi_market_id": k, "polymarket_market_id": p,
+                     "score": s, "matched_at": now}
+                    for k, p, s in matches
+                ],
+                conflict_key="kalshi_market_id,polymarket_market_id",
+            )
+    index.save(MATCH_STATE_PATH)
+    for s in fetch_spreads():
+        if s.get("spread") is not None:
+            print(f"{s['spread']:+.3f}  {s['kalshi_market_id']} ↔ {s['polymarket_market_id']}")
+
+
+if __name__ == "__main__":
+    main()
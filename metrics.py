@@ -0,0 +1,245 @@
+"""Per-run performance metrics for the ingestion jobs.
+
+``common`` records every HTTP request (latency histogram per host, status
+counts, retries, 429s, payload bytes) and every Supabase write (rows, bytes,
+seconds); loaders wrap their phases in :meth:`Metrics.stage`. At exit — and
+after every tick of a looping loader — the registry is written to
+``METRICS_DIR`` as Prometheus text (``<job>.prom``, usable with the node
+exporter's textfile collector) and as a JSON summary (``<job>.json``).
+"""
+
+from __future__ import annotations
+
+import atexit
+import bisect
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+METRICS_DIR = os.environ.get("METRICS_DIR")
+
+# seconds; covers fast cache hits up to a hung 30s request
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _job_name() -> str:
+    name = os.environ.get("METRICS_JOB") or os.path.basename(sys.argv[0] or "pulse")
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name.removesuffix(".py")) or "pulse"
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).netloc or "unknown"
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float | None:
+        """Return the upper bound of the bucket holding quantile *q*."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: tuple, extra: tuple = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in items)
+    return "{" + inner + "}"
+
+
+class Metrics:
+    """Thread-safe registry of counters and histograms."""
+
+    def __init__(self, job: str | None = None):
+        self.job = job or _job_name()
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self.counters: dict[str, dict[tuple, float]] = {}
+        self.histograms: dict[str, dict[tuple, Histogram]] = {}
+        # stage -> [calls in flight, when the first of them started]
+        self._active: dict[str, list] = {}
+
+    # ───────────── recording
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram()
+            hist.observe(value)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a loader phase, e.g. ``with METRICS.stage("gamma"):``.
+
+        Overlapping entries from several threads count once, so the stage
+        reports wall-clock time rather than the sum over threads.
+        """
+        with self._lock:
+            active = self._active.setdefault(name, [0, 0.0])
+            if not active[0]:
+                active[1] = time.perf_counter()
+            active[0] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                active[0] -= 1
+                elapsed = None if active[0] else time.perf_counter() - active[1]
+            if elapsed is not None:
+                self.inc("pulse_stage_seconds_total", elapsed, stage=name)
+
+    def timed(self, name: str, fn):
+        """Wrap *fn* so its calls are timed as stage *name* (thread-safe).
+
+        Besides the stage's wall time, the per-call time summed over threads
+        goes to ``pulse_stage_busy_seconds_total``.
+        """
+        def wrapper(*args, **kwargs):
+            t = time.perf_counter()
+            try:
+                with self.stage(name):
+                    return fn(*args, **kwargs)
+            finally:
+                self.inc("pulse_stage_busy_seconds_total",
+                         time.perf_counter() - t, stage=name)
+        return wrapper
+
+    def observe_http(self, url: str, seconds: float, status, nbytes: int = 0) -> None:
+        host = host_of(url)
+        self.observe("pulse_http_request_seconds", seconds, host=host)
+        self.inc("pulse_http_requests_total", host=host, status=status)
+        if nbytes:
+            self.inc("pulse_http_response_bytes_total", nbytes, host=host)
+        if status == 429:
+            self.inc("pulse_http_throttled_total", host=host)
+
+    def retry(self, url: str) -> None:
+        self.inc("pulse_http_retries_total", host=host_of(url))
+
+    def rows_written(self, table: str, rows: int, nbytes: int, seconds: float) -> None:
+        self.inc("pulse_rows_written_total", rows, table=table)
+        self.inc("pulse_write_bytes_total", nbytes, table=table)
+        self.inc("pulse_write_seconds_total", seconds, table=table)
+
+    # ───────────── export
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, v in sorted(series.items()):
+                    lines.append(f"{name}{_fmt_labels(key)} {v:g}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in sorted(series.items()):
+                    cum = 0
+                    for bound, n in zip(h.buckets, h.counts):
+                        cum += n
+                        lines.append(f"{name}_bucket{_fmt_labels(key, (('le', f'{bound:g}'),))} {cum}")
+                    lines.append(f"{name}_bucket{_fmt_labels(key, (('le', '+Inf'),))} {h.count}")
+                    lines.append(f"{name}_sum{_fmt_labels(key)} {h.sum:g}")
+                    lines.append(f"{name}_count{_fmt_labels(key)} {h.count}")
+        lines.append("# TYPE pulse_run_seconds gauge")
+        lines.append(f"pulse_run_seconds {time.time() - self.started:g}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        """Return a compact JSON-friendly digest of the run."""
+        def by(name, label):
+            return {dict(k)[label]: v for k, v in self.counters.get(name, {}).items()}
+
+        with self._lock:
+            http = {}
+            for key, h in self.histograms.get("pulse_http_request_seconds", {}).items():
+                http[dict(key)["host"]] = {
+                    "requests": h.count,
+                    "seconds": round(h.sum, 3),
+                    "p50_le": h.quantile(0.5),
+                    "p95_le": h.quantile(0.95),
+                }
+            for host, n in by("pulse_http_retries_total", "host").items():
+                http.setdefault(host, {})["retries"] = n
+            for host, n in by("pulse_http_throttled_total", "host").items():
+                http.setdefault(host, {})["throttled"] = n
+            for host, n in by("pulse_http_response_bytes_total", "host").items():
+                http.setdefault(host, {})["bytes"] = n
+
+            writes = {}
+            seconds = by("pulse_write_seconds_total", "table")
+            nbytes = by("pulse_write_bytes_total", "table")
+            for table, rows in by("pulse_rows_written_total", "table").items():
+                secs = seconds.get(table, 0)
+                writes[table] = {
+                    "rows": rows,
+                    "bytes": nbytes.get(table, 0),
+                    "seconds": round(secs, 3),
+                    "rows_per_sec": round(rows / secs, 1) if secs else None,
+                }
+            stages = {k: round(v, 3) for k, v in by("pulse_stage_seconds_total", "stage").items()}
+            busy = {k: round(v, 3) for k, v in by("pulse_stage_busy_seconds_total", "stage").items()}
+        return {
+            "job": self.job,
+            "started": self.started,
+            "run_seconds": round(time.time() - self.started, 3),
+            "stages": stages,
+            "stage_busy": busy,
+            "http": http,
+            "writes": writes,
+        }
+
+    def export(self, directory: str | None = None) -> None:
+        """Write ``<job>.prom`` and ``<job>.json`` to *directory*."""
+        directory = directory or METRICS_DIR
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        for ext, body in (("prom", self.to_prometheus()),
+                          ("json", json.dumps(self.summary(), indent=2))):
+            path = os.path.join(directory, f"{self.job}.{ext}")
+            with open(path + ".tmp", "w") as f:
+                f.write(body)
+            os.replace(path + ".tmp", path)
+
+
+METRICS = Metrics()
+
+if METRICS_DIR:
+    atexit.register(METRICS.export)
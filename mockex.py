@@ -0,0 +1,634 @@
+#!/usr/bin/env python
+"""Local stand-ins for Kalshi, Polymarket (Gamma/CLOB/trades) and PostgREST.
+
+The real loaders are pointed at a :class:`MockExchange` through the usual URL
+overrides (``KALSHI_API_BASE``, ``POLYMARKET_*_URL``, ``SUPABASE_URL``,
+``KALSHI_WS_URL``), so a full cycle can be timed at production scale without
+network access::
+
+  python mockex.py --kalshi-events 2000 --gamma-markets 50000 \\
+      --latency-ms 40 --fail-429 0.02 --run polymarket-fetch
+
+``--run`` executes a ``pulse`` subcommand against the mock and prints its wall
+time plus the server-side request, error and row counters. Without it the
+servers keep running and the environment to export is printed.
+
+Catalogs are generated from ``--seed`` so runs are repeatable; latencies are
+log-normal around ``--latency-ms`` and errors are injected per request.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+@dataclass
+class MockConfig:
+    seed: int = 1234
+    kalshi_events: int = 200
+    markets_per_event: int = 5
+    gamma_markets: int = 5_000
+    trades_per_market: int = 50
+    # server-side page cap; a loader asking for more gets a short page
+    max_page: int = 1_000
+    latency_ms: float = 0.0
+    # log-normal sigma; 0 gives a fixed latency
+    latency_sigma: float = 0.5
+    fail_429: float = 0.0
+    fail_5xx: float = 0.0
+    retry_after: float = 1.0
+    fail_services: set = field(default_factory=lambda: {"kalshi", "gamma", "clob"})
+    # ticker_v2 messages per second on the websocket
+    ws_rate: float = 50.0
+
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat().replace("+00:00", "Z")
+
+
+def _rng(seed: int, key: str) -> random.Random:
+    return random.Random(seed ^ zlib.crc32(key.encode()))
+
+
+class Catalog:
+    """Deterministic synthetic markets for both venues."""
+
+    def __init__(self, cfg: MockConfig):
+        self.cfg = cfg
+        now = datetime.now(timezone.utc)
+        rnd = random.Random(cfg.seed)
+        self.kalshi_events = []
+        self.kalshi_markets = []
+        for e in range(cfg.kalshi_events):
+            evt = f"KXMOCK{e}"
+            self.kalshi_events.append({"event_ticker": evt, "ticker": evt,
+                                       "title": f"Mock event {e}", "category": "Mock"})
+            for i in range(cfg.markets_per_event):
+                bid = rnd.randint(1, 97)
+                self.kalshi_markets.append({
+                    "ticker": f"{evt}-C{i}",
+                    "event_ticker": evt,
+                    "status": "active",
+                    "close_time": _iso(now + timedelta(days=rnd.randint(1, 120))),
+                    "last_price": bid + 1,
+                    "yes_bid": bid,
+                    "yes_ask": bid + 2,
+                    "no_bid": 98 - bid,
+                    "volume": rnd.randint(0, 500_000),
+                    "volume_24h": rnd.randint(0, 50_000),
+                    "open_interest": rnd.randint(0, 100_000),
+                })
+        self.gamma = []
+        for i in range(cfg.gamma_markets):
+            p = round(rnd.uniform(0.01, 0.99), 3)
+            self.gamma.append({
+                "id": str(500_000 + i),
+                "slug": f"mock-market-{i}",
+                "question": f"Will mock thing {i} happen?",
+                "description": "Synthetic market served by mockex.",
+                "endDate": _iso(now + timedelta(days=rnd.randint(1, 365))),
+                "lastTradePrice": p,
+                "volume24Hr": round(rnd.uniform(0, 2e6), 2),
+                "liquidity": round(rnd.uniform(0, 2e5), 2),
+                "category": rnd.choice(["Politics", "Sports", "Crypto", "Economy"]),
+                "closed": False,
+                "status": "active",
+            })
+        self.gamma_by_id = {g["id"]: g for g in self.gamma}
+        self.gamma_by_id.update({g["slug"]: g for g in self.gamma})
+        self.kalshi_by_ticker = {m["ticker"]: m for m in self.kalshi_markets}
+
+    def clob(self, ident: str) -> dict | None:
+        g = self.gamma_by_id.get(ident)
+        if g is None:
+            return None
+        p = g["lastTradePrice"]
+        return {
+            "condition_id": g["id"],
+            "outcomes": [
+                {"name": "Yes", "price": p, "bestBid": max(0.0, p - 0.01), "volume": 100},
+                {"name": "No", "price": round(1 - p, 3), "bestBid": max(0.0, 0.98 - p), "volume": 100},
+            ],
+            "liquidity": g["liquidity"],
+        }
+
+    def trades(self, ident: str, *, size_key: str) -> list[dict]:
+        """Trades over the last 48h; prices are in cents like both APIs."""
+        rnd = _rng(self.cfg.seed, ident)
+        now = datetime.now(timezone.utc)
+        return [
+            {
+                "trade_id": f"{ident}-{n}",
+                "timestamp": _iso(now - timedelta(seconds=rnd.randrange(172_800))),
+                "price": rnd.randint(1, 99),
+                size_key: rnd.randint(1, 500),
+            }
+            for n in range(self.cfg.trades_per_market)
+        ]
+
+    def seed_rows(self) -> list[dict]:
+        """``markets`` rows so the price updaters find known ids."""
+        rows = [
+            {"market_id": m["ticker"], "market_name": m["ticker"].rsplit("-", 1)[-1],
+             "event_name": f"Mock event {m['event_ticker'][6:]}",
+             "event_ticker": m["event_ticker"], "expiration": m["close_time"],
+             "tags": ["kalshi"], "status": "TRADING", "source": "kalshi"}
+            for m in self.kalshi_markets
+        ]
+        rows += [
+            {"market_id": g["id"], "market_name": g["question"],
+             "market_description": g["description"], "event_name": g["category"],
+             "tags": [g["category"].lower()], "slug": g["slug"], "event_ticker": g["slug"],
+             "expiration": g["endDate"], "status": "TRADING", "liquidity_type": "clob",
+             "source": "polymarket"}
+            for g in self.gamma
+        ]
+        return rows
+
+
+# ───────────────────────── PostgREST stand-in
+_OPS = {
+    "eq": lambda a, b: str(a) == b,
+    "neq": lambda a, b: str(a) != b,
+    "lt": lambda a, b: a is not None and str(a) < b,
+    "lte": lambda a, b: a is not None and str(a) <= b,
+    "gt": lambda a, b: a is not None and str(a) > b,
+    "gte": lambda a, b: a is not None and str(a) >= b,
+    "in": lambda a, b: str(a) in b.strip("()").split(","),
+}
+_RESERVED = {"select", "order", "limit", "offset", "on_conflict"}
+
+
+class Tables:
+    """In-memory tables with the slice of PostgREST the loaders use."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rows: dict[str, list[dict]] = {}
+        self.written = Counter()
+
+    @staticmethod
+    def _match(row: dict, filters: dict) -> bool:
+        for col, expr in filters.items():
+            op, _, val = expr.partition(".")
+            test = _OPS.get(op)
+            if test is not None and not test(row.get(col), val):
+                return False
+        return True
+
+    def select(self, table: str, query: dict) -> list[dict]:
+        filters = {k: v for k, v in query.items() if k not in _RESERVED}
+        with self._lock:
+            out = [r for r in self.rows.get(table, []) if self._match(r, filters)]
+        if "order" in query:
+            col, _, direction = query["order"].partition(".")
+            out.sort(key=lambda r: (r.get(col) is None, str(r.get(col))),
+                     reverse=direction.startswith("desc"))
+        offset = int(query.get("offset", 0))
+        if "limit" in query:
+            out = out[offset:offset + int(query["limit"])]
+        elif offset:
+            out = out[offset:]
+        if query.get("select", "*") != "*":
+            cols = query["select"].split(",")
+            out = [{c: r.get(c) for c in cols} for r in out]
+        return out
+
+    def upsert(self, table: str, rows: list[dict], conflict: str | None) -> None:
+        with self._lock:
+            stored = self.rows.setdefault(table, [])
+            if conflict:
+                keys = conflict.split(",")
+                index = {tuple(r.get(k) for k in keys): i for i, r in enumerate(stored)}
+                for r in rows:
+                    i = index.get(tuple(r.get(k) for k in keys))
+                    if i is None:
+                        index[tuple(r.get(k) for k in keys)] = len(stored)
+                        stored.append(r)
+                    else:
+                        stored[i] = {**stored[i], **r}
+            else:
+                stored.extend(rows)
+            self.written[table] += len(rows)
+
+    def delete(self, table: str, query: dict) -> int:
+        filters = {k: v for k, v in query.items() if k not in _RESERVED}
+        with self._lock:
+            before = self.rows.get(table, [])
+            kept = [r for r in before if not self._match(r, filters)]
+            self.rows[table] = kept
+        return len(before) - len(kept)
+
+
+class Leases:
+    """In-memory ``claim_ingest_shards`` / ``release_ingest_shards``."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.workers: dict[tuple[str, str], float] = {}
+        # (job, shard) → (owner, expires_at)
+        self.leases: dict[tuple[str, int], tuple[str, float] | None] = {}
+
+    def claim(self, p_job, p_owner, p_shards, p_ttl_seconds, now=None) -> list[int]:
+        now = time.time() if now is None else now
+        with self._lock:
+            self.workers[(p_job, p_owner)] = now
+            for key, hb in list(self.workers.items()):
+                if hb < now - p_ttl_seconds:
+                    del self.workers[key]
+            live = {o for j, o in self.workers if j == p_job}
+            for (j, shard) in list(self.leases):
+                if j == p_job and shard >= p_shards:
+                    del self.leases[(j, shard)]
+            for shard in range(p_shards):
+                lease = self.leases.get((p_job, shard))
+                if lease is None or lease[1] < now or lease[0] not in live:
+                    self.leases[(p_job, shard)] = None
+            fair = math.ceil(p_shards / len(live))
+            mine = sorted(s for s in range(p_shards)
+                          if (self.leases[(p_job, s)] or ("",))[0] == p_owner)
+            for shard in mine[fair:]:
+                self.leases[(p_job, shard)] = None
+            mine = mine[:fair]
+            free = [s for s in range(p_shards) if self.leases[(p_job, s)] is None]
+            mine += free[:max(fair - len(mine), 0)]
+            for shard in mine:
+                self.leases[(p_job, shard)] = (p_owner, now + p_ttl_seconds)
+            return sorted(mine)
+
+    def release(self, p_job, p_owner) -> None:
+        with self._lock:
+            self.workers.pop((p_job, p_owner), None)
+            for key, lease in self.leases.items():
+                if key[0] == p_job and lease and lease[0] == p_owner:
+                    self.leases[key] = None
+
+
+# ───────────────────────── HTTP server
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def log_message(self, *args):  # keep load runs quiet
+        pass
+
+    # helpers
+    def _send(self, status: int, body=None, headers: dict | None = None) -> None:
+        data = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _query(self, parts) -> dict:
+        return {k: v[-1] for k, v in parse_qs(parts.query).items()}
+
+    def _service(self, path: str) -> str:
+        if path.startswith("/rest/v1/"):
+            return "postgrest"
+        return path.split("/", 2)[1] or "root"
+
+    def _inject(self, service: str) -> bool:
+        """Sleep the configured latency; return True if an error was sent."""
+        cfg = self.server.cfg
+        if cfg.latency_ms:
+            ms = cfg.latency_ms
+            if cfg.latency_sigma:
+                ms *= math.exp(random.gauss(0, cfg.latency_sigma))
+            time.sleep(ms / 1000)
+        if service not in cfg.fail_services:
+            return False
+        roll = random.random()
+        if roll < cfg.fail_429:
+            self.server.stats["429"] += 1
+            self._send(429, {"error": "rate limited"},
+                       {"Retry-After": f"{cfg.retry_after:g}"})
+            return True
+        if roll < cfg.fail_429 + cfg.fail_5xx:
+            self.server.stats["5xx"] += 1
+            self._send(503, {"error": "unavailable"})
+            return True
+        return False
+
+    def _dispatch(self, method: str) -> None:
+        parts = urlsplit(self.path)
+        service = self._service(parts.path)
+        self.server.stats[f"{method} {service}"] += 1
+        if parts.path == "/_mock/stats":
+            return self._send(200, self.server.snapshot())
+        if self._inject(service):
+            return
+        handler = getattr(self, f"_{service}", None)
+        if handler is None:
+            return self._send(404, {"error": "unknown service"})
+        segs = [s for s in parts.path.split("/") if s]
+        handler(method, segs, self._query(parts))
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    # /kalshi/trade-api/v2/{events,markets,markets/<t>/trades}
+    def _kalshi(self, method, segs, q):
+        cat = self.server.catalog
+        rest = segs[3:]
+        limit = min(int(q.get("limit", 100)), self.server.cfg.max_page)
+        offset = int(q.get("offset") or q.get("cursor") or 0)
+        if rest == ["events"]:
+            page = cat.kalshi_events[offset:offset + limit]
+            cursor = str(offset + limit) if offset + limit < len(cat.kalshi_events) else ""
+            return self._send(200, {"events": page, "cursor": cursor})
+        if rest == ["markets"]:
+            if "event_ticker" in q:
+                evt = q["event_ticker"]
+                return self._send(200, {"markets": [
+                    m for m in cat.kalshi_markets if m["event_ticker"] == evt
+                ], "cursor": ""})
+            page = cat.kalshi_markets[offset:offset + limit]
+            cursor = str(offset + limit) if offset + limit < len(cat.kalshi_markets) else ""
+            return self._send(200, {"markets": page, "cursor": cursor})
+        if len(rest) == 3 and rest[0] == "markets" and rest[2] == "trades":
+            if rest[1] not in cat.kalshi_by_ticker:
+                return self._send(404, {"error": "not found"})
+            return self._send(200, {"trades": cat.trades(rest[1], size_key="size")})
+        self._send(404, {"error": "not found"})
+
+    # /gamma/{markets,events}
+    def _gamma(self, method, segs, q):
+        cat = self.server.catalog
+        limit = min(int(q.get("limit", 100)), self.server.cfg.max_page)
+        offset = int(q.get("offset", 0))
+        if segs[1:] == ["markets"]:
+            return self._send(200, cat.gamma[offset:offset + limit])
+        if segs[1:] == ["events"]:
+            events = [{"id": g["slug"], "title": g["question"], "markets": [g]}
+                      for g in cat.gamma[offset:offset + limit]]
+            return self._send(200, events)
+        self._send(404, {"error": "not found"})
+
+    # /clob/markets/<id>[/trades]
+    def _clob(self, method, segs, q):
+        cat = self.server.catalog
+        if len(segs) >= 3 and segs[1] == "markets":
+            ident = segs[2]
+            if ident not in cat.gamma_by_id:
+                return self._send(404, {"error": "not found"})
+            if segs[3:] == ["trades"]:
+                return self._send(200, {"trades": cat.trades(ident, size_key="amount")})
+            if not segs[3:]:
+                return self._send(200, cat.clob(ident))
+        self._send(404, {"error": "not found"})
+
+    # /rest/v1/<table> and /rest/v1/rpc/<fn>
+    def _postgrest(self, method, segs, q):
+        tables = self.server.tables
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if segs[2] == "rpc":
+            self.server.stats[f"rpc {segs[3]}"] += 1
+            params = json.loads(body or b"{}")
+            if segs[3] == "claim_ingest_shards":
+                return self._send(200, self.server.leases.claim(**params))
+            if segs[3] == "release_ingest_shards":
+                self.server.leases.release(**params)
+            return self._send(200, None)
+        table = segs[2]
+        if method == "GET":
+            return self._send(200, tables.select(table, q))
+        if method == "POST":
+            rows = json.loads(body or b"[]")
+            tables.upsert(table, rows if isinstance(rows, list) else [rows],
+                          q.get("on_conflict"))
+            return self._send(201)
+        if method == "DELETE":
+            tables.delete(table, q)
+            return self._send(204)
+        self._send(204)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # loaders open dozens of concurrent connections
+    request_queue_size = 256
+
+    def __init__(self, addr, cfg: MockConfig):
+        super().__init__(addr, _Handler)
+        self.cfg = cfg
+        self.catalog = Catalog(cfg)
+        self.tables = Tables()
+        self.leases = Leases()
+        self.tables.upsert("markets", self.catalog.seed_rows(), "market_id")
+        self.tables.written.clear()
+        self.stats = Counter()
+
+    def snapshot(self) -> dict:
+        return {"requests": dict(self.stats),
+                "rows_written": dict(self.tables.written)}
+
+
+# ───────────────────────── websocket (Kalshi ticker_v2)
+async def _ws_handler(ws, *_):
+    server = _ws_handler.server  # set by MockExchange.start
+    cfg, markets = server.cfg, server.catalog.kalshi_markets
+    rnd = random.Random(cfg.seed)
+    from websockets.exceptions import ConnectionClosed
+
+    delay = 1 / cfg.ws_rate if cfg.ws_rate else 1.0
+    seq = 0
+    try:
+        await ws.recv()  # subscribe command
+        while markets:
+            m = markets[rnd.randrange(len(markets))]
+            seq += 1
+            await ws.send(json.dumps({
+                "type": "ticker_v2",
+                "sid": 1,
+                "seq": seq,
+                "msg": {
+                    "market_ticker": m["ticker"],
+                    "price": rnd.randint(1, 99),
+                    "volume_delta": rnd.randint(1, 100),
+                    "ts": int(time.time()),
+                },
+            }))
+            await asyncio.sleep(delay)
+    except ConnectionClosed:
+        pass
+
+
+class MockExchange:
+    """Run the HTTP (and optionally websocket) stand-ins in background threads."""
+
+    def __init__(self, cfg: MockConfig | None = None, *, host: str = "127.0.0.1",
+                 port: int = 0, ws_port: int | None = None):
+        self.cfg = cfg or MockConfig()
+        self.host = host
+        self._http = _Server((host, port), self.cfg)
+        self.port = self._http.server_address[1]
+        self.ws_port = ws_port
+        self._threads: list[threading.Thread] = []
+        self._ws_loop = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def env(self) -> dict[str, str]:
+        """Environment overrides pointing every loader at this mock."""
+        env = {
+            "SUPABASE_URL": self.url,
+            "SUPABASE_SERVICE_ROLE_KEY": "mock",
+            "KALSHI_API_KEY": "mock",
+            "KALSHI_API_BASE": f"{self.url}/kalshi/trade-api/v2",
+            "KALSHI_FALLBACK_BASE": f"{self.url}/kalshi/trade-api/v2",
+            "POLYMARKET_GAMMA_URL": f"{self.url}/gamma/markets",
+            "POLYMARKET_EVENTS_URL": f"{self.url}/gamma/events",
+            "POLYMARKET_CLOB_URL": f"{self.url}/clob/markets/{{}}",
+            "POLYMARKET_TRADES_URL": f"{self.url}/clob/markets/{{}}/trades",
+        }
+        if self.ws_port is not None:
+            env["KALSHI_WS_URL"] = f"ws://{self.host}:{self.ws_port}/ws/v2"
+        return env
+
+    def stats(self) -> dict:
+        return self._http.snapshot()
+
+    def start(self) -> "MockExchange":
+        t = threading.Thread(target=self._http.serve_forever, daemon=True)
+        t.start()
+        self._threads.append(t)
+        if self.ws_port is not None:
+            self._start_ws()
+        return self
+
+    def _start_ws(self) -> None:
+        try:
+            import websockets  # type: ignore
+        except ModuleNotFoundError:  # pragma: no cover - optional dependency
+            raise RuntimeError("The 'websockets' library is required for --ws-port")
+        _ws_handler.server = self._http
+        ready = threading.Event()
+
+        async def listen():
+            return await websockets.serve(_ws_handler, self.host, self.ws_port)
+
+        def serve():
+            loop = self._ws_loop = asyncio.new_event_loop()
+            srv = loop.run_until_complete(listen())
+            self.ws_port = srv.sockets[0].getsockname()[1]
+            ready.set()
+            loop.run_forever()
+
+        t = threading.Thread(target=serve, daemon=True)
+        t.start()
+        self._threads.append(t)
+        ready.wait(10)
+
+    def stop(self) -> None:
+        self._http.shutdown()
+        self._http.server_close()
+        if self._ws_loop is not None:
+            self._ws_loop.call_soon_threadsafe(self._ws_loop.stop)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def run_job(mock: MockExchange, command: list[str], extra_env: dict | None = None) -> dict:
+    """Run ``pulse <command>`` against *mock*; return timing and server stats."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, **mock.env(), **(extra_env or {})}
+    t = time.perf_counter()
+    proc = subprocess.run([sys.executable, os.path.join(here, "pulse.py"), *command],
+                          env=env, cwd=here)
+    return {
+        "command": " ".join(command),
+        "exit_code": proc.returncode,
+        "seconds": round(time.perf_counter() - t, 3),
+        **mock.stats(),
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    d = MockConfig()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=0)
+    ap.add_argument("--ws-port", type=int, help="also serve Kalshi ticker_v2 here (0 = any)")
+    ap.add_argument("--seed", type=int, default=d.seed)
+    ap.add_argument("--kalshi-events", type=int, default=d.kalshi_events)
+    ap.add_argument("--markets-per-event", type=int, default=d.markets_per_event)
+    ap.add_argument("--gamma-markets", type=int, default=d.gamma_markets)
+    ap.add_argument("--trades-per-market", type=int, default=d.trades_per_market)
+    ap.add_argument("--max-page", type=int, default=d.max_page)
+    ap.add_argument("--latency-ms", type=float, default=d.latency_ms)
+    ap.add_argument("--latency-sigma", type=float, default=d.latency_sigma)
+    ap.add_argument("--fail-429", type=float, default=d.fail_429,
+                    help="probability of a 429 per exchange request")
+    ap.add_argument("--fail-5xx", type=float, default=d.fail_5xx,
+                    help="probability of a 503 per exchange request")
+    ap.add_argument("--retry-after", type=float, default=d.retry_after)
+    ap.add_argument("--fail-services", default=",".join(sorted(d.fail_services)),
+                    help="comma list of kalshi,gamma,clob,postgrest to inject errors into")
+    ap.add_argument("--ws-rate", type=float, default=d.ws_rate)
+    ap.add_argument("--run", nargs=argparse.REMAINDER,
+                    help="pulse subcommand (and args) to run against the mock")
+    args = ap.parse_args(argv)
+
+    cfg = MockConfig(
+        seed=args.seed, kalshi_events=args.kalshi_events,
+        markets_per_event=args.markets_per_event, gamma_markets=args.gamma_markets,
+        trades_per_market=args.trades_per_market, max_page=args.max_page,
+        latency_ms=args.latency_ms, latency_sigma=args.latency_sigma,
+        fail_429=args.fail_429, fail_5xx=args.fail_5xx, retry_after=args.retry_after,
+        fail_services=set(filter(None, args.fail_services.split(","))),
+        ws_rate=args.ws_rate,
+    )
+    with MockExchange(cfg, host=args.host, port=args.port, ws_port=args.ws_port) as mock:
+        if args.run:
+            result = run_job(mock, args.run)
+            print(json.dumps(result, indent=2))
+            # a failed job must fail the load run in CI
+            return result["exit_code"]
+        for k, v in mock.env().items():
+            print(f"export {k}='{v}'")
+        print(f"# stats: {mock.url}/_mock/stats  (Ctrl-C to stop)", file=sys.stderr)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
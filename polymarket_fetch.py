@@ -4,21 +4,49 @@ import os
 import time
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from dateutil import parser
 from dateutil.parser import parse
-from common import insert_to_supabase, fetch_price_24h_ago
+from common import (
+    insert_to_supabase,
+    fetch_price_24h_ago,
+    GAMMA_URL,
+    aggregate_trades,
+    CLOB_URL,
+    TRADES_URL,
+    HTTP_TTLS,
+    cached_get_json,
+    enrich_concurrent,
+    http_get,
+)
+from metrics import METRICS
+from records import OUTCOME_KEY, SNAPSHOT_KEY, MarketRow, OutcomeRow, SnapshotRow, to_prob
+from trades import TradeLog
 
 logging.basicConfig(level=logging.INFO,
                     format="%(asctime)s %(levelname)s %(message)s")
 
-GAMMA  = "https://gamma-api.polymarket.com/markets"
-CLOB   = "https://clob.polymarket.com/markets/{}"
-TRADES = "https://clob.polymarket.com/markets/{}/trades"
+# endpoints honour the POLYMARKET_*_URL overrides from ``common``
+GAMMA  = GAMMA_URL
+CLOB   = CLOB_URL
+TRADES = TRADES_URL
 
 FETCH_LIMIT = int(os.getenv("FETCH_LIMIT", "100"))
 MIN_DOLLAR_VOLUME = 0
 
+# full-catalog pagination: pages of GAMMA_PAGE_SIZE requested GAMMA_WORKERS
+# at a time until a short page marks the end of the catalog
+GAMMA_PAGE_SIZE = int(os.getenv("GAMMA_PAGE_SIZE", "500"))
+GAMMA_WORKERS = int(os.getenv("GAMMA_WORKERS", "8"))
+GAMMA_MAX_PAGES = int(os.getenv("GAMMA_MAX_PAGES", "400"))
+# stop paging after this many seconds so the run fits the 5-minute cadence
+GAMMA_DEADLINE = float(os.getenv("GAMMA_DEADLINE", "120"))
+# only markets that can still trade are candidates for the top-N
+GAMMA_FILTERS = {"closed": "false"}
+# raw trades are also kept when TRADES_STATE_DIR is set (see trades.py)
+TRADE_LOG = TradeLog.for_loader("polymarket")
+
 
 def _first(obj: dict, keys: list[str]):
     """Return the first present key from *obj*"""
@@ -28,218 +56,275 @@ def _first(obj: dict, keys: list[str]):
     return None
 
 # ───────────────── fetch helpers
-def fetch_gamma(limit: int = FETCH_LIMIT, max_pages: int = 1):
-    """Return full Polymarket market list via pagination."""
-    out, offset = [], 0
-    for _ in range(max_pages):
-        r = requests.get(GAMMA, params={"limit": limit, "offset": offset}, timeout=15)
-        if r.status_code == 429:
-            logging.warning("Gamma 429 – sleep 10 s")
-            time.sleep(10)
+def _gamma_page(offset: int, limit: int, *, tries: int = 6,
+                backoff: float = 2.0) -> list[dict]:
+    """Return one Gamma page, waiting out 429s instead of skipping the page."""
+    params = {"limit": limit, "offset": offset, **GAMMA_FILTERS}
+    for attempt in range(tries):
+        try:
+            j = cached_get_json(GAMMA, params=params, timeout=15,
+                                ttl=HTTP_TTLS["gamma"])
+        except requests.HTTPError as e:
+            r = e.response
+            if r is None or (r.status_code != 429 and r.status_code < 500):
+                raise
+            wait = r.headers.get("Retry-After")
+            try:
+                wait = float(wait)
+            except (TypeError, ValueError):
+                wait = backoff * (2 ** attempt)
+            logging.warning("Gamma %s at offset %s – sleep %.1f s",
+                            r.status_code, offset, wait)
+            time.sleep(wait)
             continue
-        r.raise_for_status()
-        batch = r.json() if isinstance(r.json(), list) else r.json().get("markets", [])
-        if not batch:
-            break
-        out.extend(batch)
-        offset += limit
-        logging.info("fetched %s markets", len(out))
+        return j if isinstance(j, list) else j.get("markets", [])
+    raise RuntimeError(f"Gamma page at offset {offset} failed after {tries} tries")
+
+def fetch_gamma(limit: int = GAMMA_PAGE_SIZE, max_pages: int = GAMMA_MAX_PAGES,
+                workers: int = GAMMA_WORKERS, deadline: float = GAMMA_DEADLINE):
+    """Return the full Polymarket catalog, deduplicated by market id.
+
+    Offsets are requested *workers* pages at a time; paging stops at the
+    first short page, after *max_pages* or once *deadline* seconds passed.
+    """
+    out: list[dict] = []
+    seen: set = set()
+    started = time.monotonic()
+    page = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        while page < max_pages:
+            offsets = [(page + i) * limit for i in range(min(workers, max_pages - page))]
+            page += len(offsets)
+            done = False
+            # map() keeps offset order so dedup keeps the first occurrence
+            for batch in ex.map(lambda o: _gamma_page(o, limit), offsets):
+                for m in batch:
+                    mid = m.get("id")
+                    if mid in seen:
+                        continue
+                    seen.add(mid)
+                    out.append(m)
+                if len(batch) < limit:
+                    done = True
+            logging.info("fetched %s markets", len(out))
+            if done:
+                break
+            if time.monotonic() - started > deadline:
+                logging.warning("Gamma deadline hit after %s pages", page)
+                break
     return out
 
 def fetch_clob(mid: str, slug: str | None):
     for ident in (mid, slug):
         if not ident: continue
-        r = requests.get(CLOB.format(ident), timeout=10)
-        if r.status_code == 404: continue
-        r.raise_for_status(); return r.json()
+        try:
+            return cached_get_json(CLOB.format(ident), timeout=10,
+                                   ttl=HTTP_TTLS["clob"])
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404: continue
+            raise
     return None
 
 def last24h_stats(mid: str):
     try:
-        r = requests.get(TRADES.format(mid), timeout=10)
+        r = http_get(TRADES.format(mid), timeout=10)
         if r.status_code == 404: return 0.0, 0, None
         r.raise_for_status()
+        trades = r.json().get("trades", [])
+        if TRADE_LOG is not None:
+            TRADE_LOG.record(mid, trades, size_key="amount", to_price=lambda p: p / 100)
         cutoff = datetime.utcnow() - timedelta(hours=24)
-        vol_ct = vol_d = 0
-        for t in r.json().get("trades", []):
-            if parser.parse(t["timestamp"]) >= cutoff:
-                size = t["amount"]; price = t["price"] / 100
-                vol_ct += size; vol_d += size * price
-        vwap = round(vol_d / vol_ct, 4) if vol_ct else None
-        return round(vol_d, 2), vol_ct, vwap
+        return aggregate_trades(trades, cutoff)
     except Exception as e:
         logging.warning("trade fetch failed %s: %s", mid, e)
         return 0.0, 0, None
 
-# ───────────────────────── main
-def main():
-    gamma_all = fetch_gamma(limit=FETCH_LIMIT, max_pages=1)[:FETCH_LIMIT]
+@dataclass(slots=True)
+class Candidate:
+    """The few Gamma fields needed after ranking; the raw payload is dropped."""
+    market: MarketRow
+    slug: str | None
+    price: float | None
+    dollar_volume: float
+    liquidity: float | None
 
-    now = datetime.utcnow()
 
-    live = []
-    for g in gamma_all:
-        status = (g.get("status") or g.get("state") or "TRADING").upper()
+def to_candidate(g: dict) -> Candidate:
+    """Return a :class:`Candidate` for one raw Gamma market."""
+    mid = g.get("id")
+    slug = g.get("slug")
+    status = (g.get("status") or g.get("state") or "TRADING").upper()
 
-        exp_raw = _first(g, ["end_date_iso", "endDate", "endTime", "end_time"])
-        exp_dt = parse(exp_raw) if exp_raw else None
+    exp_raw = _first(g, ["end_date_iso", "endDate", "endTime", "end_time"])
+    exp_dt = parse(exp_raw) if exp_raw else None
 
-        price = _first(g, ["lastTradePrice", "lastPrice", "price"])
-        if price is not None and price > 1:
-            price = price / 100
+    price = to_prob(_first(g, ["lastTradePrice", "lastPrice", "price"]))
 
-        volume = _first(g, ["volume24Hr", "volume24hr", "volume"])
+    volume = _first(g, ["volume24Hr", "volume24hr", "volume"])
+    try:
+        volume = float(volume)
+    except (TypeError, ValueError):
+        volume = 0.0
+
+    dollar_volume = _first(g, ["dollarVolume24Hr", "dollar_volume_24hr"])
+    if dollar_volume is None and price is not None:
+        dollar_volume = round(price * volume, 2)
+    else:
         try:
-            volume = float(volume)
+            dollar_volume = float(dollar_volume)
         except (TypeError, ValueError):
-            volume = 0.0
+            dollar_volume = 0.0
 
-        dollar_volume = _first(g, ["dollarVolume24Hr", "dollar_volume_24hr"])
-        if dollar_volume is None and price is not None:
-            dollar_volume = round(price * volume, 2)
-        else:
-            try:
-                dollar_volume = float(dollar_volume)
-            except (TypeError, ValueError):
-                dollar_volume = 0.0
+    tags = []
+    if g.get("category"):
+        tags.append(str(g["category"]).lower())
+    if g.get("categories"):
+        tags.extend([str(t).lower() for t in g["categories"]])
 
+    title = g.get("title") or g.get("question") or (
+        slug.replace("-", " ").title() if slug else mid
+    )
+    liquidity = g.get("liquidity")
+    return Candidate(
+        market=MarketRow(
+            market_id=mid,
+            market_name=title,
+            market_description=g.get("description"),
+            event_name=g.get("category") or (g.get("categories") or [None])[0],
+            event_ticker=slug or mid,
+            expiration=exp_dt.isoformat() if exp_dt else None,
+            tags=tags or ["polymarket"],
+            source="polymarket",
+            status=status,
+        ),
+        slug=slug,
+        price=price,
+        dollar_volume=dollar_volume,
+        liquidity=float(liquidity) if liquidity is not None else None,
+    )
 
 
-        tags = []
-        if g.get("category"):
-            tags.append(str(g["category"]).lower())
-        if g.get("categories"):
-            tags.extend([str(t).lower() for t in g["categories"]])
+def to_candidates(raw) -> list[Candidate]:
+    """Build candidates for *raw* Gamma markets, skipping malformed records."""
+    out = []
+    for g in raw:
+        try:
+            out.append(to_candidate(g))
+        except (TypeError, ValueError, OverflowError) as e:
+            logging.warning("skipping malformed Gamma market %s: %s", g.get("id"), e)
+    return out
+
+
+def _best_bid(tok):
+    for k in ("bestBid", "best_bid", "bid", "yesBid"):
+        v = tok.get(k)
+        if v is not None:
+            return to_prob(v)
+    return None
+
+
+def build_rows(c: Candidate, clob: dict | None, stats, ts: str):
+    """Return the snapshot and outcome rows for one enriched candidate."""
+    mid = c.market.market_id
+    exp = c.market.expiration
+
+    tokens = (
+        clob.get("outcomes") or clob.get("outcomeTokens") or []
+    ) if clob else []
+
+    yes_tok = next((t for t in tokens if t.get("name", "").lower() == "yes"), None)
+    no_tok = next((t for t in tokens if t.get("name", "").lower() == "no"), None)
+    price = c.price
+    if yes_tok:
+        alt = yes_tok.get("price") if yes_tok.get("price") is not None else yes_tok.get("probability")
+        if alt is not None:
+            price = to_prob(alt)
+
+    yes_bid = _best_bid(yes_tok) if yes_tok else None
+    no_bid = _best_bid(no_tok) if no_tok else None
+
+    vol_d, vol_ct, vwap = stats or (0.0, 0, None)
+    liquidity = None
+    if clob:
+        for k in ("liquidity", "totalLiquidity", "openInterest", "open_interest"):
+            if k in clob and clob[k] is not None:
+                liquidity = float(clob[k])
+                break
+    if liquidity is None:
+        liquidity = c.liquidity
+
+    snapshot = SnapshotRow(
+        market_id=mid,
+        price=round(price, 4) if price is not None else None,
+        yes_bid=yes_bid,
+        no_bid=no_bid,
+        volume=vol_ct if vol_ct else None,
+        dollar_volume=vol_d if vol_d else None,
+        vwap=vwap,
+        liquidity=liquidity,
+        expiration=exp,
+        timestamp=ts,
+        source="polymarket",
+    )
+
+    rows_o = []
+    added = 0
+    for t in tokens:
+        p = t.get("price") if t.get("price") is not None else t.get("probability")
+        if p is None:
+            continue
+        rows_o.append(OutcomeRow(
+            market_id=mid,
+            outcome_name=t.get("name"),
+            price=to_prob(p),
+            volume=t.get("volume"),
+            timestamp=ts,
+            source="polymarket",
+        ))
+        added += 1
+
+    if added == 0 and price is not None:
+        rows_o.append(OutcomeRow(
+            market_id=mid, outcome_name="Yes", price=price,
+            timestamp=ts, source="polymarket",
+        ))
+        rows_o.append(OutcomeRow(
+            market_id=mid, outcome_name="No", price=round(1 - price, 4),
+            timestamp=ts, source="polymarket",
+        ))
+    return snapshot, rows_o
 
-        g.update({
-            "_price": price,
-            "_volume24h": volume,
-            "_dollar_volume": dollar_volume,
-            "_expiration": exp_dt,
-            "_tags": tags or ["polymarket"],
-            "_status": status,
-        })
-        live.append(g)
 
-    top = sorted(live, key=lambda x: x.get("_dollar_volume", 0), reverse=True)[:FETCH_LIMIT]
+# ───────────────────────── main
+def main():
+    # raw payload dicts are discarded as soon as their candidate is built
+    with METRICS.stage("gamma"):
+        live = to_candidates(fetch_gamma())
+
+    top = sorted(live, key=lambda c: c.dollar_volume or 0, reverse=True)[:FETCH_LIMIT]
     logging.info("selected %s live markets", len(top))
 
     ts = datetime.utcnow().isoformat() + "Z"
     rows_m, rows_s, rows_o = [], [], []
 
-    for g in top:
-        mid = g.get("id")
-        slug = g.get("slug")
-        title = g.get("title") or g.get("question") or (
-            slug.replace("-", " ").title() if slug else mid
-        )
-
-        desc = g.get("description")
-        event_name = g.get("category") or (g.get("categories") or [None])[0]
-        exp_dt = g.get("_expiration")
-        exp = exp_dt.isoformat() if exp_dt else None
-        status = g.get("_status") or "TRADING"
-        tags = g.get("_tags") or ["polymarket"]
-        event_ticker = slug or mid
-
-        clob = fetch_clob(mid, slug)
-        tokens = (
-            clob.get("outcomes") or clob.get("outcomeTokens") or []
-        ) if clob else []
-
-        yes_tok = next((t for t in tokens if t.get("name", "").lower() == "yes"), None)
-        no_tok = next((t for t in tokens if t.get("name", "").lower() == "no"), None)
-        price = g.get("_price")
-        if yes_tok:
-            alt = yes_tok.get("price") if yes_tok.get("price") is not None else yes_tok.get("probability")
-            if alt is not None:
-                price = alt / 100 if alt > 1 else alt
-
-        def _best_bid(tok):
-            for k in ("bestBid", "best_bid", "bid", "yesBid"):
-                v = tok.get(k)
-                if v is not None:
-                    return v / 100 if v > 1 else v
-            return None
-
-        yes_bid = _best_bid(yes_tok) if yes_tok else None
-        no_bid = _best_bid(no_tok) if no_tok else None
-
-        vol_d, vol_ct, vwap = last24h_stats(mid)
-        liquidity = None
-        if clob:
-            for k in ("liquidity", "totalLiquidity", "openInterest", "open_interest"):
-                if k in clob and clob[k] is not None:
-                    liquidity = float(clob[k])
-                    break
-        if liquidity is None:
-            liquidity = g.get("liquidity")
-            liquidity = float(liquidity) if liquidity is not None else None
-
-        rows_m.append({
-            "market_id": mid,
-            "market_name": title,
-            "market_description": desc,
-            "event_name": event_name,
-            "event_ticker": event_ticker,
-            "expiration": exp,
-            "tags": tags,
-            "source": "polymarket",
-            "status": status,
-        })
-
-        rows_s.append({
-            "market_id": mid,
-            "price": round(price, 4) if price is not None else None,
-            "yes_bid": yes_bid,
-            "no_bid": no_bid,
-            "volume": vol_ct if vol_ct else None,
-            "dollar_volume": vol_d if vol_d else None,
-            "vwap": vwap,
-            "liquidity": liquidity,
-            "expiration": exp,
-            "timestamp": ts,
-            "source": "polymarket",
-        })
-
-        added = 0
-        for t in tokens:
-            p = t.get("price") if t.get("price") is not None else t.get("probability")
-            if p is None:
-                continue
-            prob = p / 100 if p > 1 else p
-            rows_o.append({
-                "market_id": mid,
-                "outcome_name": t.get("name"),
-                "price": prob,
-                "volume": t.get("volume"),
-                "timestamp": ts,
-                "source": "polymarket",
-            })
-            added += 1
-
-        if added == 0 and price is not None:
-            rows_o.append({
-                "market_id": mid,
-                "outcome_name": "Yes",
-                "price": price,
-                "volume": None,
-                "timestamp": ts,
-                "source": "polymarket",
-            })
-            rows_o.append({
-                "market_id": mid,
-                "outcome_name": "No",
-                "price": round(1 - price, 4),
-                "volume": None,
-                "timestamp": ts,
-                "source": "polymarket",
-            })
+    lookups = {
+        "clob": METRICS.timed("clob", lambda c: fetch_clob(c.market.market_id, c.slug)),
+        "stats": METRICS.timed("trades", lambda c: last24h_stats(c.market.market_id)),
+    }
+    for c, found in enrich_concurrent(top, lookups):
+        snapshot, outcomes = build_rows(c, found["clob"], found["stats"], ts)
+        rows_m.append(c.market)
+        rows_s.append(snapshot)
+        rows_o.extend(outcomes)
+
+    if TRADE_LOG is not None:
+        with METRICS.stage("trade_log"):
+            TRADE_LOG.flush()
 
     # ── insert in FK-safe order
     # insert_to_supabase("markets", rows_m)
-    # insert_to_supabase("market_snapshots", rows_s, conflict_key=None)
-    # insert_to_supabase("market_outcomes", rows_o, conflict_key=None)
+    # insert_to_supabase("market_snapshots", rows_s, conflict_key=SNAPSHOT_KEY)
+    # insert_to_supabase("market_outcomes", rows_o, conflict_key=OUTCOME_KEY)
 
     logging.info(
         "Inserted %s markets, %s snapshots, %s outcomes",
@@ -6,8 +6,15 @@ from common import (
     insert_to_supabase,
     last24h_stats,
     CLOB_URL,
+    enrich_concurrent,
+    http_get,
     request_json,
 )
+from metrics import METRICS
+from records import OUTCOME_KEY, SNAPSHOT_KEY, OutcomeRow, SnapshotRow
+from scheduler import RefreshScheduler, run_every
+from sharding import ShardLease
+from trades import TradeLog
 try:
     import requests  # type: ignore
 except ModuleNotFoundError:  # pragma: no cover - handled in tests
@@ -44,6 +51,9 @@ logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
 # environment-based overrides for Polymarket endpoints. CLOB fetching with
 # retries is implemented locally in this module.
 
+# raw trades are also kept when TRADES_STATE_DIR is set (see trades.py)
+TRADE_LOG = TradeLog.for_loader("polymarket")
+
 def load_active_market_info() -> dict[str, dict]:
     """Return mapping of active Polymarket ids to info dicts."""
     url = (
@@ -81,7 +91,7 @@ def fetch_clob_retry(mid: str, slug: str | None = None, *, tries: int = 3,
         delay = backoff
         for attempt in range(tries):
             try:
-                r = requests.get(CLOB_URL.format(ident), timeout=8)
+                r = http_get(CLOB_URL.format(ident), timeout=8)
                 if r.status_code == 404:
                     logging.info("clob 404 for %s", ident)
                     break
@@ -93,6 +103,7 @@ def fetch_clob_retry(mid: str, slug: str | None = None, *, tries: int = 3,
                         r.text[:150],
                     )
                     if attempt < tries - 1:
+                        METRICS.retry(CLOB_URL.format(ident))
                         time.sleep(delay)
                         delay *= 2
                         continue
@@ -108,22 +119,44 @@ def fetch_clob_retry(mid: str, slug: str | None = None, *, tries: int = 3,
             except requests.RequestException as e:
                 logging.warning("clob request exception for %s: %s", ident, e)
                 if attempt < tries - 1:
+                    METRICS.retry(CLOB_URL.format(ident))
                     time.sleep(delay)
                     delay *= 2
                     continue
         # try next identifier (slug or id)
     return None
 
+def _yes_price(clob: dict | None) -> float | None:
+    """Return the YES probability from a CLOB payload, if present."""
+    toks = (clob.get("outcomes") or clob.get("outcomeTokens") or []) if clob else []
+    yes_tok = next((t for t in toks if t.get("name", "").lower() == "yes"), None)
+    if not yes_tok:
+        return None
+    price = yes_tok.get("price")
+    if price is None:
+        price = yes_tok.get("probability")
+    return price / 100 if price is not None else None
+
 # ───────────────── main
-def main():
+def main(lease: ShardLease | None = None):
     now = datetime.now(timezone.utc)
     ts = now.isoformat().replace("+00:00", "Z")
-    active = load_active_market_info()
+    with METRICS.stage("active"):
+        active = load_active_market_info()
+    if lease is not None:
+        active = {mid: active[mid] for mid in lease.filter(active)}
     logging.info("refreshing %s polymarket prices", len(active))
 
     snapshots, outcomes = [], []
 
-    for mid, info in list(active.items())[:FETCH_LIMIT]:
+    sched = RefreshScheduler.for_loader("polymarket")
+    markets = list(active.items())
+    if sched is None:
+        markets = markets[:FETCH_LIMIT]
+    # with a scheduler every market is tracked and due() applies the cap,
+    # so the tiers reach past the first FETCH_LIMIT markets
+    eligible = []
+    for mid, info in markets:
         slug = info.get("slug")
         exp = info.get("expiration")
         status = info.get("status", "").upper()
@@ -136,56 +169,77 @@ def main():
         if liquidity_type != "clob" or status != "TRADING" or not (slug or mid):
             logging.warning("skip non-clob or non-trading market %s", mid)
             continue
-
-        clob = fetch_clob_retry(mid, slug)
+        eligible.append((mid, slug))
+
+    if sched is not None:
+        sched.sync(mid for mid, _ in eligible)
+        due = set(sched.due(limit=FETCH_LIMIT))
+        eligible = [m for m in eligible if m[0] in due]
+        logging.info("%s markets due for refresh", len(eligible))
+
+    lookups = {
+        "clob": METRICS.timed("clob", lambda m: fetch_clob_retry(*m)),
+        "stats": METRICS.timed("trades", lambda m: last24h_stats(m[0], log=TRADE_LOG)),
+    }
+    if lease is not None:
+        # checked as each market is handed to the pool, i.e. right before its
+        # fetch; once fetched, a market is written even if its shard moves
+        eligible = (m for m in eligible if lease.owns(m[0]))
+    for (mid, slug), found in enrich_concurrent(eligible, lookups):
+        clob = found["clob"]
+        price = _yes_price(clob)
+        vol_d, vol_ct, vwap = found["stats"] or (0.0, 0, None)
         if not clob:
             logging.info("clob fetch failed for %s", mid)
+            if sched is not None:
+                # not a refresh: try again soon instead of after MAX_INTERVAL
+                sched.retry(mid)
             continue
+        if sched is not None:
+            sched.record(mid, price=price, dollar_volume=vol_d,
+                         expiration=active[mid].get("expiration"))
 
         toks = (clob.get("outcomes") or clob.get("outcomeTokens") or [])
         if not toks:
             logging.info("no outcome data for %s", mid)
             continue
 
-        yes_tok = next((t for t in toks if t.get("name", "").lower() == "yes"), None)
-        price = None
-        if yes_tok:
-            price = yes_tok.get("price")
-            if price is None:
-                price = yes_tok.get("probability")
-            if price is not None:
-                price = price / 100
-        else:
-            logging.info("missing YES token for %s", mid)
         if price is None:
-            logging.info("no price for %s", mid)
+            logging.info("no YES price for %s", mid)
 
-        vol_d, vol_ct, vwap = last24h_stats(mid)
         if vol_ct == 0:
             logging.info("no recent trades for %s", mid)
 
-        snapshots.append({
-            "market_id":mid,
-            "price":round(price,4) if price is not None else None,
-            "yes_bid":None,"no_bid":None,
-            "volume":vol_ct,"dollar_volume":vol_d,"vwap":vwap,
-            "liquidity":None,"timestamp":ts,"source":"polymarket_clob"
-        })
+        snapshots.append(SnapshotRow(
+            market_id=mid,
+            price=round(price, 4) if price is not None else None,
+            volume=vol_ct, dollar_volume=vol_d, vwap=vwap,
+            timestamp=ts, source="polymarket_clob",
+        ))
 
         for t in toks:
             p = t.get("price") if t.get("price") is not None else t.get("probability")
             if p is None: continue
-            outcomes.append({
-                "market_id":mid,"outcome_name":t["name"],
-                "price":p/100,"volume":None,
-                "timestamp":ts,"source":"polymarket_clob"
-            })
+            outcomes.append(OutcomeRow(
+                market_id=mid, outcome_name=t["name"], price=p / 100,
+                timestamp=ts, source="polymarket_clob",
+            ))
+
+    if sched is not None:
+        sched.save()
+    if TRADE_LOG is not None:
+        with METRICS.stage("trade_log"):
+            TRADE_LOG.flush()
 
     logging.info("writing %s snapshots • %s outcomes", len(snapshots), len(outcomes))
-    # insert_to_supabase("market_snapshots", snapshots, conflict_key=None)
-    # insert_to_supabase("market_outcomes",  outcomes,  conflict_key=None)
+    # insert_to_supabase("market_snapshots", snapshots, conflict_key=SNAPSHOT_KEY)
+    # insert_to_supabase("market_outcomes",  outcomes,  conflict_key=OUTCOME_KEY)
     logging.info("done")
 
 if __name__ == "__main__":
-    from datetime import datetime
-    main()
+    lease = ShardLease.for_loader("polymarket-update")
+    if lease is None:
+        run_every(main)
+    else:
+        with lease:
+            run_every(lambda: main(lease))
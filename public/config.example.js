@@ -1,3 +1,6 @@
 // Copy this file to config.js and fill in your Supabase credentials
 export const SUPABASE_URL = "https://YOUR_PROJECT.supabase.co";
 export const SUPABASE_ANON_KEY = "YOUR_SUPABASE_ANON_KEY";
+// Optional: base URL of api.py (e.g. "https://pulse-api.onrender.com") for
+// downsampled chart history; leave empty to read market_snapshots directly
+export const API_URL = "";
@@ -1,5 +1,8 @@
 // Import Supabase credentials from config.js (not committed to git)
-import { SUPABASE_URL, SUPABASE_ANON_KEY } from "./config.js";
+import * as config from "./config.js";
+const { SUPABASE_URL, SUPABASE_ANON_KEY } = config;
+// optional Prediction Pulse API (api.py) serving downsampled chart series
+const API_URL = config.API_URL || "";
 import { Chart } from "https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.esm.min.js";
 
 let chart, sortKey = "volume", sortDir = "desc";
@@ -166,16 +169,36 @@ function applyFilters() {
   });
 }
 
-async function drawChart(marketId, label) {
-  const rows = await api(
+async function loadHistory(marketId, width) {
+  if (API_URL) {
+    const res = await fetch(
+      `${API_URL}/history/${encodeURIComponent(marketId)}?days=30&width=${width}`
+    );
+    if (!res.ok) throw new Error(`API ${res.status}: ${await res.text()}`);
+    // columnar: t0 + second deltas, prices as integers of 1/scale
+    const s = await res.json();
+    const points = [];
+    let t = s.t0;
+    s.p.forEach((p, i) => {
+      if (i) t += s.dt[i - 1];
+      points.push({ timestamp: t * 1000, price: p / s.scale });
+    });
+    return points;
+  }
+  return api(
     `/rest/v1/market_snapshots?select=timestamp,price&market_id=eq.${marketId}&order=timestamp.asc`
   );
+}
+
+async function drawChart(marketId, label) {
+  const canvas = document.getElementById("trendChart");
+  const rows = await loadHistory(marketId, Math.max(100, canvas.clientWidth || 600));
 
   const labels = rows.map(r => new Date(r.timestamp).toLocaleString());
   const data = rows.map(r => r.price == null ? null : (r.price * 100).toFixed(2));
 
   if (chart) chart.destroy();
-  chart = new Chart(document.getElementById("trendChart"), {
+  chart = new Chart(canvas, {
     type: "line",
     data: {
       labels,
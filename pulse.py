@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""Single entry point for every Prediction Pulse job.
+
+Usage:
+  python pulse.py kalshi-update            # run one job
+  python pulse.py cleanup 2024-05-01T00:00:00Z --archive-dir /data/archive
+  python pulse.py imports --budget 300     # import-time report per job
+
+Only the module behind the chosen subcommand is imported, so a cron container
+never pays for another job's dependencies. Extra arguments are passed through
+to the job's own ``__main__`` handling.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import runpy
+import subprocess
+import sys
+
+# subcommand → (module, description)
+COMMANDS = {
+    "kalshi-fetch": ("kalshi_fetch", "daily Kalshi metadata load"),
+    "kalshi-update": ("kalshi_update_prices", "Kalshi price snapshots"),
+    "kalshi-ws": ("kalshi_ws", "stream Kalshi ticker_v2 via WebSocket"),
+    "polymarket-fetch": ("polymarket_fetch", "daily Polymarket metadata load"),
+    "polymarket-update": ("polymarket_update_prices", "Polymarket price snapshots"),
+    "price-change": ("update_price_change", "record 24h price changes"),
+    "news": ("market_news_summary", "summarize big movers"),
+    "cleanup": ("cleanup_markets", "archive and prune old rows"),
+    "match": ("matching", "link Kalshi and Polymarket markets, show spreads"),
+    "trades": ("trades", "volume and VWAP over stored trades for any window"),
+    "bench": ("bench", "CPU micro-benchmarks of the loader hot paths"),
+    "mock-exchange": ("mockex", "local Kalshi/Polymarket/PostgREST stand-ins"),
+}
+
+IMPORT_BUDGET_MS = float(os.environ.get("PULSE_IMPORT_BUDGET_MS", "250"))
+
+# placeholders so modules that read credentials at import can be timed
+_DUMMY_ENV = {
+    "SUPABASE_URL": "https://example.supabase.co",
+    "SUPABASE_SERVICE_ROLE_KEY": "import-check",
+    "KALSHI_API_KEY": "import-check",
+}
+
+_TIMER = (
+    "import sys, time; t = time.perf_counter(); "
+    "__import__(sys.argv[1]); "
+    "print((time.perf_counter() - t) * 1000)"
+)
+
+
+def measure_import(module: str) -> float:
+    """Return milliseconds spent importing *module* in a fresh interpreter."""
+    env = {**_DUMMY_ENV, **os.environ}
+    out = subprocess.run(
+        [sys.executable, "-c", _TIMER, module],
+        capture_output=True, text=True, env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def import_report(commands, budget_ms: float = IMPORT_BUDGET_MS) -> int:
+    """Print import cost per subcommand; return 1 if any exceeds *budget_ms*."""
+    status = 0
+    for cmd in commands:
+        module = COMMANDS[cmd][0]
+        try:
+            ms = measure_import(module)
+        except subprocess.CalledProcessError as e:
+            print(f"❌ {cmd:<18} import failed: {e.stderr.strip().splitlines()[-1:]}")
+            status = 1
+            continue
+        over = ms > budget_ms
+        status |= over
+        mark = "❌" if over else "✅"
+        print(f"{mark} {cmd:<18} {ms:7.1f} ms  ({module})")
+    return int(status)
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else list(argv)
+    parser = argparse.ArgumentParser(prog="pulse", description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        sub.add_parser(name, help=help_text, add_help=False)
+    p_imp = sub.add_parser("imports", help="report import time per subcommand")
+    p_imp.add_argument("commands", nargs="*", metavar="command")
+    p_imp.add_argument("--budget", type=float, default=IMPORT_BUDGET_MS,
+                       help="fail when a subcommand imports slower than this (ms)")
+
+    args, rest = parser.parse_known_args(argv)
+    if args.command == "imports":
+        unknown = set(args.commands) - set(COMMANDS)
+        if unknown:
+            parser.error(f"unknown subcommand(s): {', '.join(sorted(unknown))}")
+        return import_report(args.commands or list(COMMANDS), args.budget)
+
+    module = COMMANDS[args.command][0]
+    sys.argv = [f"pulse {args.command}", *rest]
+    runpy.run_module(module, run_name="__main__", alter_sys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
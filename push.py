@@ -0,0 +1,140 @@
+"""Server-Sent Events fan-out of price deltas for ``api.py``.
+
+:class:`Broadcaster` is registered as a :class:`api.CatalogFeed` listener.
+Every new ``latest_snapshots`` batch is diffed against the last values seen
+per market; only changed fields are pushed, keyed by one-letter names::
+
+    {"m": "KXFED-25DEC-T4", "p": 0.41, "c": -0.03, "t": "2024-05-01T12:00:00Z"}
+
+Each subscriber owns a dict of pending deltas keyed by market rather than a
+queue. A slow client therefore never holds more than one entry per market:
+newer deltas are merged into the pending one and the client gets the latest
+state on its next read. The number of open streams is capped.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+
+MAX_STREAMS = int(os.environ.get("API_MAX_STREAMS", "500"))
+HEARTBEAT_SECONDS = float(os.environ.get("API_HEARTBEAT_SECONDS", "15"))
+
+# row field → delta key
+FIELDS = {
+    "price": "p",
+    "change_24h": "c",
+    "dollar_volume": "v",
+    "yes_bid": "b",
+    "no_bid": "a",
+}
+
+
+class Subscriber:
+    """One open stream with its filter and coalesced pending deltas."""
+
+    __slots__ = ("markets", "sources", "pending", "_event", "_loop")
+
+    def __init__(self, loop, markets=None, sources=None):
+        self.markets = frozenset(markets or ())
+        self.sources = frozenset(sources or ())
+        self.pending: dict[str, dict] = {}
+        self._loop = loop
+        self._event = asyncio.Event()
+
+    def wants(self, delta: dict) -> bool:
+        if self.markets and delta["m"] not in self.markets:
+            return False
+        return not self.sources or delta.get("s") in self.sources
+
+    def push(self, delta: dict) -> None:
+        # called under the broadcaster lock from the feed thread
+        prev = self.pending.get(delta["m"])
+        self.pending[delta["m"]] = {**prev, **delta} if prev else delta
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    def drain(self) -> list[dict]:
+        out = list(self.pending.values())
+        self.pending.clear()
+        self._event.clear()
+        return out
+
+
+class Broadcaster:
+    """Diff snapshot batches and fan the deltas out to subscribers."""
+
+    def __init__(self, max_streams: int = MAX_STREAMS):
+        self.max_streams = max_streams
+        self._lock = threading.Lock()
+        self._subs: set[Subscriber] = set()
+        self._last: dict[str, dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._subs)
+
+    def subscribe(self, loop, markets=None, sources=None) -> Subscriber | None:
+        """Return a new subscriber, or ``None`` if the stream cap is reached."""
+        with self._lock:
+            if len(self._subs) >= self.max_streams:
+                return None
+            sub = Subscriber(loop, markets, sources)
+            self._subs.add(sub)
+            return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            self._subs.discard(sub)
+
+    def diff(self, row: dict) -> dict | None:
+        """Return the compact delta for *row*, or ``None`` if nothing changed."""
+        mid = row.get("market_id")
+        if not mid:
+            return None
+        last = self._last.setdefault(mid, {})
+        delta = {}
+        for field, key in FIELDS.items():
+            value = row.get(field)
+            if value is not None and last.get(key) != value:
+                delta[key] = last[key] = value
+        if not delta:
+            return None
+        delta["m"] = mid
+        if row.get("source"):
+            delta["s"] = row["source"]
+        if row.get("timestamp"):
+            delta["t"] = row["timestamp"]
+        return delta
+
+    def publish(self, rows) -> int:
+        """Diff *rows* and queue deltas for every interested subscriber."""
+        n = 0
+        with self._lock:
+            for row in rows:
+                delta = self.diff(row)
+                if delta is None:
+                    continue
+                n += 1
+                for sub in self._subs:
+                    if sub.wants(delta):
+                        sub.push(delta)
+        return n
+
+    async def events(self, sub: Subscriber, heartbeat: float = HEARTBEAT_SECONDS):
+        """Yield SSE frames for *sub* until the client goes away."""
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    await asyncio.wait_for(sub._event.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                with self._lock:
+                    batch = sub.drain()
+                if batch:
+                    data = json.dumps(batch, separators=(",", ":"))
+                    yield f"event: prices\ndata: {data}\n\n"
+        finally:
+            self.unsubscribe(sub)
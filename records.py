@@ -0,0 +1,156 @@
+"""Compact row types shared by every loader.
+
+Rows for ``markets``, ``market_snapshots``, ``market_prices``,
+``market_outcomes`` and ``trades`` are slotted dataclasses instead of dicts,
+so the full Kalshi and Polymarket catalogs don't pay for a per-row
+``__dict__`` and a copy of every key string. :func:`dumps` turns a batch
+into the JSON body PostgREST expects.
+
+Snapshot, price and outcome rows carry a ``bucket``: their timestamp floored
+to ``SNAPSHOT_BUCKET_SECONDS``. Together with the market and source it is the
+table's unique key, so writes that upsert on ``SNAPSHOT_KEY`` /
+``OUTCOME_KEY`` overwrite the rows of a retried or overlapping run instead of
+adding more. (The loaders' snapshot and outcome writes are still disabled.)
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import lru_cache
+
+try:
+    import orjson  # type: ignore
+except ModuleNotFoundError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+
+SNAPSHOT_BUCKET_SECONDS = int(os.environ.get("SNAPSHOT_BUCKET_SECONDS", "300"))
+# on_conflict keys matching the unique constraints in schema.sql;
+# market_prices shares the snapshot key
+SNAPSHOT_KEY = "market_id,source,bucket"
+OUTCOME_KEY = "market_id,source,outcome_name,bucket"
+TRADE_KEY = "venue,trade_id"
+
+
+@lru_cache(maxsize=64)
+def bucket_of(ts: str, seconds: int = SNAPSHOT_BUCKET_SECONDS) -> str:
+    """Return ISO timestamp *ts* floored to a multiple of *seconds* (UTC)."""
+    dt = datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    epoch = int(dt.timestamp()) // seconds * seconds
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def to_prob(value):
+    """Normalise a price quoted in cents (1–100) or probability (0–1)."""
+    if value is None:
+        return None
+    return value / 100 if value > 1 else value
+
+
+class Record:
+    """Mixin giving slotted dataclasses a cheap ``as_dict``."""
+
+    __slots__ = ()
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __getitem__(self, key: str):
+        # dict-style access keeps older call sites and tests working
+        return getattr(self, key)
+
+
+class Bucketed(Record):
+    """Rows whose ``bucket`` defaults to their floored ``timestamp``."""
+
+    __slots__ = ()
+
+    def __post_init__(self):
+        if self.bucket is None and self.timestamp:
+            self.bucket = bucket_of(self.timestamp)
+
+
+@dataclass(slots=True, kw_only=True)
+class MarketRow(Record):
+    market_id: str
+    market_name: str | None
+    market_description: str | None = None
+    event_name: str | None = None
+    event_ticker: str | None = None
+    expiration: str | None = None
+    tags: list = field(default_factory=list)
+    source: str
+    status: str = "TRADING"
+
+
+@dataclass(slots=True, kw_only=True)
+class SnapshotRow(Bucketed):
+    market_id: str
+    price: float | None
+    yes_bid: float | None = None
+    no_bid: float | None = None
+    volume: float | None = None
+    dollar_volume: float | None = None
+    vwap: float | None = None
+    liquidity: float | None = None
+    expiration: str | None = None
+    timestamp: str
+    source: str
+    bucket: str | None = None
+
+
+@dataclass(slots=True, kw_only=True)
+class PriceRow(Bucketed):
+    market_id: str
+    price: float | None
+    change_24h: float | None = None
+    percent_change_24h: float | None = None
+    timestamp: str
+    source: str
+    bucket: str | None = None
+
+
+@dataclass(slots=True, kw_only=True)
+class OutcomeRow(Bucketed):
+    market_id: str
+    outcome_name: str | None
+    price: float | None
+    volume: float | None = None
+    timestamp: str
+    source: str
+    bucket: str | None = None
+
+
+@dataclass(slots=True, kw_only=True)
+class TradeRow(Record):
+    venue: str
+    trade_id: str
+    market_id: str
+    price: float
+    size: float
+    timestamp: str
+
+
+def to_dicts(rows) -> list:
+    """Return *rows* with any :class:`Record` converted to a plain dict."""
+    return [r.as_dict() if isinstance(r, Record) else r for r in rows]
+
+
+def _default(obj):
+    if isinstance(obj, Record):
+        return obj.as_dict()
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"cannot serialize {type(obj).__name__}")
+
+
+def dumps(rows) -> bytes:
+    """Serialize records and/or dicts to a compact JSON array."""
+    if orjson is not None:
+        return orjson.dumps(rows, default=_default)
+    return json.dumps(rows, separators=(",", ":"), default=_default).encode()
@@ -0,0 +1,159 @@
+"""Activity-based refresh scheduling for the price update loaders.
+
+Each market gets its own refresh interval between ``REFRESH_MIN_INTERVAL``
+(hot markets) and ``REFRESH_MAX_INTERVAL`` (dormant ones) based on its recent
+dollar volume, how much its price moved since the last refresh and how close
+it is to expiring. Next-due times live in a heap so every tick only fetches
+the markets that are due. State is persisted per loader under
+``REFRESH_STATE_DIR`` between cron runs; set ``REFRESH_TICK`` to run a loader
+in a loop instead of once.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import math
+import os
+import time
+from datetime import datetime
+
+REFRESH_STATE_DIR = os.environ.get("REFRESH_STATE_DIR")
+REFRESH_TICK = float(os.environ.get("REFRESH_TICK", "0"))
+MIN_INTERVAL = float(os.environ.get("REFRESH_MIN_INTERVAL", "30"))
+MAX_INTERVAL = float(os.environ.get("REFRESH_MAX_INTERVAL", "3600"))
+
+# dollar volume that counts as fully "hot"
+HOT_VOLUME = 1_000_000
+# price move (in probability) since the last refresh that counts as fully hot
+HOT_MOVE = 0.05
+
+
+def refresh_interval(dollar_volume: float | None = None,
+                     price_move: float | None = None,
+                     expiration: datetime | None = None,
+                     now: datetime | None = None) -> float:
+    """Return seconds until a market should be refreshed again."""
+    heat = 0.0
+    if dollar_volume:
+        heat = max(heat, min(1.0, math.log10(1 + dollar_volume) / math.log10(1 + HOT_VOLUME)))
+    if price_move:
+        heat = max(heat, min(1.0, abs(price_move) / HOT_MOVE))
+    if expiration is not None and now is not None:
+        left = (expiration - now).total_seconds()
+        if left <= 3600:
+            heat = 1.0
+        elif left <= 86400:
+            heat = max(heat, 0.5)
+    # geometric interpolation: heat 0 → MAX_INTERVAL, heat 1 → MIN_INTERVAL
+    return MAX_INTERVAL * (MIN_INTERVAL / MAX_INTERVAL) ** heat
+
+
+class RefreshScheduler:
+    """Priority queue of markets keyed on their next-due time."""
+
+    def __init__(self, state: dict | None = None, path: str | None = None):
+        # market_id → {"due": epoch seconds, "price": last seen price}
+        self.state: dict[str, dict] = state or {}
+        self.path = path
+        self._heap = [(s["due"], mid) for mid, s in self.state.items()]
+        heapq.heapify(self._heap)
+
+    @classmethod
+    def load(cls, path: str) -> "RefreshScheduler":
+        if os.path.exists(path):
+            with open(path) as f:
+                return cls(json.load(f), path)
+        return cls(path=path)
+
+    @classmethod
+    def for_loader(cls, name: str) -> "RefreshScheduler | None":
+        """Return the persisted scheduler for loader *name*, if enabled."""
+        if not REFRESH_STATE_DIR:
+            return None
+        os.makedirs(REFRESH_STATE_DIR, exist_ok=True)
+        return cls.load(os.path.join(REFRESH_STATE_DIR, f"{name}.json"))
+
+    def save(self, path: str | None = None) -> None:
+        path = path or self.path
+        if not path:
+            return
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, path)
+
+    def sync(self, market_ids, now: float | None = None) -> None:
+        """Track exactly *market_ids*; new markets are due immediately."""
+        now = time.time() if now is None else now
+        ids = set(market_ids)
+        for mid in list(self.state):
+            if mid not in ids:
+                del self.state[mid]
+        for mid in ids:
+            if mid not in self.state:
+                self.state[mid] = {"due": now, "price": None}
+                heapq.heappush(self._heap, (now, mid))
+
+    def due(self, now: float | None = None, limit: int | None = None) -> list[str]:
+        """Return up to *limit* due market ids, most overdue first."""
+        now = time.time() if now is None else now
+        out: list[str] = []
+        seen: set[str] = set()
+        while self._heap and self._heap[0][0] <= now:
+            if limit is not None and len(out) >= limit:
+                break
+            due, mid = heapq.heappop(self._heap)
+            s = self.state.get(mid)
+            # skip stale heap entries left behind by record()/sync()
+            if s is None or s["due"] != due or mid in seen:
+                continue
+            seen.add(mid)
+            out.append(mid)
+        # due markets stay in the heap until record() reschedules them
+        for mid in out:
+            heapq.heappush(self._heap, (self.state[mid]["due"], mid))
+        return out
+
+    def record(self, mid: str, *, price: float | None = None,
+               dollar_volume: float | None = None,
+               expiration: datetime | None = None,
+               now: float | None = None) -> float:
+        """Reschedule *mid* after a refresh and return its new interval."""
+        now = time.time() if now is None else now
+        s = self.state.setdefault(mid, {"due": now, "price": None})
+        move = None
+        if price is not None and s.get("price") is not None:
+            move = price - s["price"]
+        now_dt = datetime.fromtimestamp(now, expiration.tzinfo) if expiration else None
+        interval = refresh_interval(dollar_volume, move, expiration, now_dt)
+        s["due"] = now + interval
+        if price is not None:
+            s["price"] = price
+        heapq.heappush(self._heap, (s["due"], mid))
+        return interval
+
+    def retry(self, mid: str, delay: float = MIN_INTERVAL,
+              now: float | None = None) -> None:
+        """Reschedule *mid* after a failed refresh, keeping its last price."""
+        now = time.time() if now is None else now
+        s = self.state.setdefault(mid, {"due": now, "price": None})
+        s["due"] = now + delay
+        heapq.heappush(self._heap, (s["due"], mid))
+
+
+def run_every(fn, tick: float = REFRESH_TICK) -> None:
+    """Call *fn* every *tick* seconds (once if *tick* is 0).
+
+    When looping, metrics are exported after every tick so a long-running
+    loader stays observable.
+    """
+    from metrics import METRICS
+
+    while True:
+        started = time.monotonic()
+        fn()
+        if not tick:
+            return
+        METRICS.export()
+        time.sleep(max(0.0, tick - (time.monotonic() - started)))
@@ -32,7 +32,12 @@ create table market_snapshots (
     liquidity numeric,
     expiration timestamptz,
     timestamp timestamptz not null,
-    source text not null
+    source text not null,
+    -- timestamp floored to the loaders' cadence (records.SNAPSHOT_BUCKET_SECONDS);
+    -- a replayed or overlapping run upserts into the same row; nulls must
+    -- collide too, or rows without a market or outcome name still pile up
+    bucket timestamptz not null,
+    unique nulls not distinct (market_id, source, bucket)
 );
 
 create table market_prices (
@@ -42,7 +47,9 @@ create table market_prices (
     change_24h numeric,
     percent_change_24h numeric,
     timestamp timestamptz not null,
-    source text not null
+    source text not null,
+    bucket timestamptz not null,
+    unique nulls not distinct (market_id, source, bucket)
 );
 
 create table market_outcomes (
@@ -52,9 +59,23 @@ create table market_outcomes (
     price numeric,
     volume integer,
     timestamp timestamptz not null,
-    source text not null
+    source text not null,
+    bucket timestamptz not null,
+    unique nulls not distinct (market_id, source, outcome_name, bucket)
 );
 
+-- Existing databases, per table (outcomes include outcome_name in the key):
+--   alter table market_snapshots add column bucket timestamptz;
+--   update market_snapshots
+--      set bucket = to_timestamp(floor(extract(epoch from timestamp) / 300) * 300);
+--   delete from market_snapshots a using market_snapshots b
+--    where a.market_id is not distinct from b.market_id and a.source = b.source
+--      and a.bucket = b.bucket and a.id < b.id;
+--      (outcomes: and a.outcome_name is not distinct from b.outcome_name)
+--   alter table market_snapshots alter column bucket set not null,
+--      add unique nulls not distinct (market_id, source, bucket);
+-- "nulls not distinct" needs Postgres 15 or later.
+
 -- Latest snapshot for each market with first seen timestamp
 create view latest_snapshots as
 select distinct on (s.market_id)
@@ -103,3 +124,220 @@ join (
     group by market_id
 ) as first_seen on first_seen.market_id = s.market_id
 order by s.market_id, s.timestamp desc;
+
+-- Append a market_prices row with the 24h change for every market whose
+-- latest snapshot has not been recorded yet. One set-based statement so the
+-- job costs a single round trip regardless of catalog size:
+--   POST /rest/v1/rpc/refresh_price_changes
+create or replace function refresh_price_changes()
+returns integer
+language sql
+as $$
+    with latest as (
+        select distinct on (market_id) market_id, price, timestamp, source, bucket
+        from market_snapshots
+        order by market_id, timestamp desc
+    ),
+    inserted as (
+        insert into market_prices (
+            market_id, price, change_24h, percent_change_24h, timestamp, source, bucket
+        )
+        select l.market_id,
+               l.price,
+               l.price - p.price,
+               case when p.price is not null and p.price <> 0
+                    then round((l.price - p.price) / p.price * 100, 2)
+                    else null
+               end,
+               l.timestamp,
+               l.source,
+               l.bucket
+        from latest l
+        left join lateral (
+            select price
+            from market_snapshots s2
+            where s2.market_id = l.market_id
+              and s2.timestamp <= l.timestamp - interval '24 hours'
+            order by s2.timestamp desc
+            limit 1
+        ) p on true
+        where not exists (
+            select 1 from market_prices mp
+            where mp.market_id = l.market_id
+              and mp.timestamp = l.timestamp
+        )
+        -- a later snapshot in the same bucket replaces the earlier change
+        on conflict (market_id, source, bucket) do update
+            set price = excluded.price,
+                change_24h = excluded.change_24h,
+                percent_change_24h = excluded.percent_change_24h,
+                timestamp = excluded.timestamp
+        returning 1
+    )
+    select count(*)::integer from inserted;
+$$;
+
+-- Kalshi ↔ Polymarket markets asking the same question (see matching.py)
+create table market_matches (
+    -- pairs go with their markets when cleanup_markets deletes them
+    kalshi_market_id text references markets(market_id) on delete cascade,
+    polymarket_market_id text references markets(market_id) on delete cascade,
+    score numeric not null,
+    matched_at timestamptz not null default now(),
+    primary key (kalshi_market_id, polymarket_market_id)
+);
+
+create index market_matches_polymarket_idx on market_matches (polymarket_market_id);
+-- Existing databases:
+--   alter table market_matches
+--     drop constraint market_matches_kalshi_market_id_fkey,
+--     add foreign key (kalshi_market_id) references markets(market_id) on delete cascade,
+--     drop constraint market_matches_polymarket_market_id_fkey,
+--     add foreign key (polymarket_market_id) references markets(market_id) on delete cascade;
+
+-- Current cross-venue price spread for every matched pair
+create view market_spreads as
+select mm.kalshi_market_id,
+       mm.polymarket_market_id,
+       mm.score,
+       k.market_name                  as kalshi_name,
+       p.market_name                  as polymarket_name,
+       k.price                        as kalshi_price,
+       p.price                        as polymarket_price,
+       k.price - p.price              as spread,
+       abs(k.price - p.price)         as abs_spread,
+       greatest(k.timestamp, p.timestamp) as timestamp
+from market_matches mm
+join latest_snapshots k on k.market_id = mm.kalshi_market_id
+join latest_snapshots p on p.market_id = mm.polymarket_market_id;
+
+-- Shard leases for loaders scaled out over several workers (see sharding.py).
+-- Market ids hash into a fixed number of shards per job; each live worker
+-- holds a lease on its share of them.
+create table ingest_workers (
+    job text not null,
+    owner text not null,
+    heartbeat_at timestamptz not null default now(),
+    primary key (job, owner)
+);
+
+create table ingest_leases (
+    job text not null,
+    shard integer not null,
+    owner text,
+    expires_at timestamptz,
+    primary key (job, shard)
+);
+
+-- Heartbeat for p_owner, rebalance and return the shards it now holds.
+-- Each live worker gets ceil(p_shards / workers) shards at most: surplus
+-- shards are released and free or expired ones claimed. Calls for one job
+-- are serialised with an advisory lock.
+--   POST /rest/v1/rpc/claim_ingest_shards
+create or replace function claim_ingest_shards(
+    p_job text, p_owner text, p_shards integer, p_ttl_seconds integer
+)
+returns setof integer
+language plpgsql
+as $$
+declare
+    ttl interval := make_interval(secs => p_ttl_seconds);
+    fair integer;
+    held integer;
+begin
+    perform pg_advisory_xact_lock(hashtext('ingest_leases:' || p_job));
+
+    insert into ingest_workers (job, owner, heartbeat_at)
+    values (p_job, p_owner, now())
+    on conflict (job, owner) do update set heartbeat_at = excluded.heartbeat_at;
+    delete from ingest_workers
+    where job = p_job and heartbeat_at < now() - ttl;
+
+    delete from ingest_leases where job = p_job and shard >= p_shards;
+    insert into ingest_leases (job, shard)
+    select p_job, s from generate_series(0, p_shards - 1) s
+    on conflict (job, shard) do nothing;
+
+    -- leases of dead workers
+    update ingest_leases set owner = null, expires_at = null
+    where job = p_job and owner is not null
+      and (expires_at < now()
+           or owner not in (select owner from ingest_workers where job = p_job));
+
+    select ceil(p_shards::numeric / count(*)) into fair
+    from ingest_workers where job = p_job;
+
+    update ingest_leases set expires_at = now() + ttl
+    where job = p_job and owner = p_owner;
+
+    update ingest_leases set owner = null, expires_at = null
+    where job = p_job and shard in (
+        select shard from ingest_leases
+        where job = p_job and owner = p_owner
+        order by shard desc
+        offset fair
+    );
+
+    select count(*) into held from ingest_leases where job = p_job and owner = p_owner;
+    update ingest_leases set owner = p_owner, expires_at = now() + ttl
+    where job = p_job and shard in (
+        select shard from ingest_leases
+        where job = p_job and owner is null
+        order by shard
+        limit greatest(fair - held, 0)
+    );
+
+    return query
+        select shard from ingest_leases
+        where job = p_job and owner = p_owner
+        order by shard;
+end;
+$$;
+
+-- Hand back every shard of p_owner (clean worker shutdown).
+create or replace function release_ingest_shards(p_job text, p_owner text)
+returns void
+language sql
+as $$
+    update ingest_leases set owner = null, expires_at = null
+    where job = p_job and owner = p_owner;
+    delete from ingest_workers where job = p_job and owner = p_owner;
+$$;
+
+-- Raw trades from both venues (see trades.py); prices are probabilities,
+-- size is in contracts. The venue's trade id makes re-ingestion idempotent.
+create table trades (
+    venue text not null,
+    trade_id text not null,
+    market_id text not null,
+    price numeric not null,
+    size numeric not null,
+    timestamp timestamptz not null,
+    primary key (venue, trade_id)
+);
+
+create index trades_market_time_idx on trades (market_id, timestamp);
+
+-- Dollar volume, contracts, VWAP and trade count per market since p_since:
+--   POST /rest/v1/rpc/trade_stats {"p_since": "...", "p_market_ids": null}
+create or replace function trade_stats(p_since timestamptz, p_market_ids text[] default null)
+returns table (
+    market_id text,
+    dollar_volume numeric,
+    contracts numeric,
+    vwap numeric,
+    trades bigint
+)
+language sql
+stable
+as $$
+    select t.market_id,
+           round(sum(t.price * t.size), 2),
+           sum(t.size),
+           round(sum(t.price * t.size) / nullif(sum(t.size), 0), 4),
+           count(*)
+    from trades t
+    where t.timestamp >= p_since
+      and (p_market_ids is null or t.market_id = any(p_market_ids))
+    group by t.market_id;
+$$;
@@ -0,0 +1,204 @@
+"""In-process full-text and faceted search over the market catalog.
+
+:class:`SearchIndex` keeps an inverted index (token → market ids) over market
+name, description, event name and tags plus one id set per facet value
+(source, category, status). Queries intersect posting sets and count facets
+with set intersections, so a lookup over the full catalog never touches
+Postgres. The expiration facet is bucketed relative to "now" and rebuilt
+from an expiration-sorted array after each batch or once a minute.
+
+``api.py`` fills the index from Supabase and feeds it every new batch of
+``latest_snapshots`` rows through :meth:`SearchIndex.upsert`.
+"""
+
+from __future__ import annotations
+
+import bisect
+import heapq
+import itertools
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+TEXT_FIELDS = ("market_name", "market_description", "event_name")
+FACETS = ("source", "category", "status")
+# (label, upper bound in seconds from now)
+EXPIRY_BUCKETS = (
+    ("expired", 0),
+    ("24h", 86_400),
+    ("7d", 7 * 86_400),
+    ("30d", 30 * 86_400),
+    ("later", float("inf")),
+)
+EXPIRY_REFRESH = 60
+# shorter trailing tokens match exactly; a one- or two-letter prefix would
+# union most of the vocabulary
+PREFIX_MIN = 3
+SORTS = {
+    "volume": lambda d: d.get("dollar_volume") or 0,
+    "change": lambda d: abs(d.get("change_24h") or 0),
+    "expiration": lambda d: -(d.get("_exp") or float("inf")),
+}
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    return _WORD.findall(text.lower())
+
+
+def _epoch(value) -> float | None:
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class SearchIndex:
+    """Thread-safe inverted index with facet counts."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.docs: dict[str, dict] = {}
+        self._terms: dict[str, set[str]] = {}
+        self._postings: dict[str, set[str]] = defaultdict(set)
+        self._facets: dict[str, dict[str, set[str]]] = {f: defaultdict(set) for f in FACETS}
+        self._vocab: list[str] | None = None
+        self._order: dict[str, list[str]] = {}
+        self._expiry: dict[str, set[str]] = {}
+        self._expiry_at = 0.0
+
+    # ───────────── updates
+    def upsert(self, rows) -> int:
+        """Merge *rows* (``markets`` and/or ``latest_snapshots`` shaped) into the index."""
+        n = 0
+        with self._lock:
+            for row in rows:
+                mid = row.get("market_id")
+                if not mid:
+                    continue
+                doc = {**self.docs.get(mid, {}), **{k: v for k, v in row.items() if v is not None}}
+                tags = doc.get("tags") or []
+                doc["category"] = str(tags[0]).lower() if tags else None
+                doc["status"] = (doc.get("status") or "TRADING").upper()
+                doc["_exp"] = _epoch(doc.get("expiration"))
+                self._reindex(mid, doc)
+                n += 1
+            if n:
+                self._order.clear()
+                self._expiry_at = 0.0
+        return n
+
+    def _reindex(self, mid: str, doc: dict) -> None:
+        old = self.docs.get(mid)
+        terms = set()
+        for f in TEXT_FIELDS:
+            terms.update(tokenize(str(doc.get(f) or "")))
+        for t in doc.get("tags") or []:
+            terms.update(tokenize(str(t)))
+        prev = self._terms.get(mid, set())
+        for t in prev - terms:
+            self._postings[t].discard(mid)
+        for t in terms - prev:
+            if t not in self._postings:
+                self._vocab = None
+            self._postings[t].add(mid)
+        self._terms[mid] = terms
+        for f in FACETS:
+            if old is not None and old.get(f) != doc.get(f):
+                self._facets[f][old.get(f)].discard(mid)
+            self._facets[f][doc.get(f)].add(mid)
+        self.docs[mid] = doc
+
+    # ───────────── queries
+    def _expand(self, token: str, prefix: bool) -> set[str]:
+        if not prefix or len(token) < PREFIX_MIN:
+            return self._postings.get(token, set())
+        if self._vocab is None:
+            self._vocab = sorted(t for t, ids in self._postings.items() if ids)
+        i = bisect.bisect_left(self._vocab, token)
+        out: set[str] = set()
+        while i < len(self._vocab) and self._vocab[i].startswith(token):
+            out |= self._postings[self._vocab[i]]
+            i += 1
+        return out
+
+    def _expiry_sets(self, now: float) -> dict[str, set[str]]:
+        if now - self._expiry_at < EXPIRY_REFRESH and self._expiry:
+            return self._expiry
+        dated = sorted((d["_exp"], mid) for mid, d in self.docs.items() if d["_exp"] is not None)
+        keys = [e for e, _ in dated]
+        sets, lo = {}, 0
+        for label, bound in EXPIRY_BUCKETS:
+            hi = bisect.bisect_right(keys, now + bound) if bound != float("inf") else len(keys)
+            sets[label] = {mid for _, mid in dated[lo:hi]}
+            lo = hi
+        sets["none"] = {mid for mid, d in self.docs.items() if d["_exp"] is None}
+        self._expiry, self._expiry_at = sets, now
+        return sets
+
+    def _ranked(self, sort: str) -> list[str]:
+        order = self._order.get(sort)
+        if order is None:
+            key = SORTS[sort]
+            order = self._order[sort] = sorted(self.docs, key=lambda m: key(self.docs[m]), reverse=True)
+        return order
+
+    def search(self, q: str = "", *, filters: dict | None = None, sort: str = "volume",
+               limit: int = 20, offset: int = 0, now: float | None = None) -> dict:
+        """Return ``{"total", "results", "facets"}`` for query *q*.
+
+        Every query token must match (the last one as a prefix, for
+        type-ahead). *filters* maps a facet (``source``, ``category``,
+        ``status``, ``expiry``) to the required value.
+        """
+        now = time.time() if now is None else now
+        if sort not in SORTS:
+            raise ValueError(f"unknown sort {sort!r}")
+        with self._lock:
+            expiry = self._expiry_sets(now)
+            toks = tokenize(q)
+            matched: set[str] | None = None
+            for i, t in enumerate(toks):
+                ids = self._expand(t, prefix=i == len(toks) - 1)
+                matched = set(ids) if matched is None else matched & ids
+                if not matched:
+                    break
+
+            groups = {**self._facets, "expiry": expiry}
+            for f, value in (filters or {}).items():
+                if value is None or f not in groups:
+                    continue
+                ids = groups[f].get(value, set())
+                matched = set(ids) if matched is None else matched & ids
+
+            base = matched if matched is not None else self.docs.keys()
+            total = len(base)
+            facets = {
+                f: {str(v): n for v, ids in values.items()
+                    if v is not None
+                    and (n := len(ids) if matched is None else len(ids & matched))}
+                for f, values in groups.items()
+            }
+
+            want = offset + limit
+            if matched is None or total > 2_000:
+                ranked = self._ranked(sort)
+                if matched is not None:
+                    ranked = (m for m in ranked if m in matched)
+                top = list(itertools.islice(ranked, want))
+            else:
+                key = SORTS[sort]
+                top = heapq.nlargest(want, matched, key=lambda m: key(self.docs[m]))
+            results = [
+                {k: v for k, v in self.docs[m].items() if not k.startswith("_")}
+                for m in top[offset:want]
+            ]
+        return {"total": total, "results": results, "facets": facets}
@@ -0,0 +1,90 @@
+"""Compact price series for charts.
+
+:func:`lttb` downsamples a series to the number of points a chart can
+actually draw (Largest-Triangle-Three-Buckets keeps the visual shape,
+including spikes). :func:`encode` turns it into columnar arrays:
+timestamps as a start epoch plus second deltas and prices as integers in
+units of ``1 / scale``. A 30-day, 5-minute series (~8,600 rows of JSON
+objects) becomes a few hundred small integers.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+# prices are probabilities; 1e-4 (one basis point) is below chart resolution
+PRICE_SCALE = 10_000
+
+
+def to_epoch(value) -> int:
+    dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def lttb(xs: list, ys: list, threshold: int) -> tuple[list, list]:
+    """Return at most *threshold* points of ``(xs, ys)`` chosen by LTTB."""
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(xs), list(ys)
+    out_x, out_y = [xs[0]], [ys[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # average of the next bucket is the third triangle vertex
+        start = int((i + 1) * every) + 1
+        end = min(int((i + 2) * every) + 1, n)
+        span = end - start or 1
+        avg_x = sum(xs[start:end]) / span
+        avg_y = sum(ys[start:end]) / span
+
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        out_x.append(xs[best])
+        out_y.append(ys[best])
+        a = best
+    out_x.append(xs[-1])
+    out_y.append(ys[-1])
+    return out_x, out_y
+
+
+def encode(ts: list[int], prices: list[float], scale: int = PRICE_SCALE) -> dict:
+    """Return ``{"t0", "dt", "p", "scale"}`` for epoch seconds and prices."""
+    if not ts:
+        return {"t0": None, "dt": [], "p": [], "scale": scale}
+    dt = [b - a for a, b in zip(ts, ts[1:])]
+    return {
+        "t0": ts[0],
+        "dt": dt,
+        "p": [round(p * scale) for p in prices],
+        "scale": scale,
+    }
+
+
+def decode(series: dict) -> tuple[list[int], list[float]]:
+    """Inverse of :func:`encode` (used by tests and Python consumers)."""
+    if series["t0"] is None:
+        return [], []
+    ts = [series["t0"]]
+    for d in series["dt"]:
+        ts.append(ts[-1] + d)
+    return ts, [p / series["scale"] for p in series["p"]]
+
+
+def build_series(rows: list[dict], width: int, scale: int = PRICE_SCALE) -> dict:
+    """Downsample ``market_snapshots`` rows to *width* points and encode them."""
+    ts, prices = [], []
+    for r in rows:
+        if r.get("price") is None or not r.get("timestamp"):
+            continue
+        ts.append(to_epoch(r["timestamp"]))
+        prices.append(float(r["price"]))
+    ts, prices = lttb(ts, prices, width)
+    return {**encode(ts, prices, scale), "points": len(ts), "raw_points": len(rows)}
@@ -0,0 +1,129 @@
+"""Split a loader's markets across several workers with leases in Postgres.
+
+With ``INGEST_SHARDS`` set, market ids are hashed into that many shards and
+each worker process only refreshes the shards it holds a lease on. Leases
+live in ``ingest_leases`` and are handed out by ``claim_ingest_shards``
+(``schema.sql``), which also records a heartbeat per worker in
+``ingest_workers``. Every claim gives each live worker its fair share: a new
+worker picks up free shards, busy workers give back the surplus, and the
+shards of a worker that stops heartbeating are freed once its lease
+expires. Because surplus is only given back on a worker's next claim, a
+starting worker registers, waits ``LEASE_SETTLE_SECONDS`` (long enough for
+every live worker to heartbeat once) and claims again before it works::
+
+    INGEST_SHARDS=32 WORKER_ID=node-a python pulse.py kalshi-update
+    INGEST_SHARDS=32 WORKER_ID=node-b python pulse.py kalshi-update
+
+Every worker of a job must use the same ``INGEST_SHARDS``.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import threading
+import time
+import zlib
+
+from common import call_rpc
+
+INGEST_SHARDS = int(os.environ.get("INGEST_SHARDS", "0"))
+LEASE_TTL_SECONDS = float(os.environ.get("LEASE_TTL_SECONDS", "90"))
+# heartbeats run every ttl/3, so half a ttl covers one from every worker
+LEASE_SETTLE_SECONDS = float(os.environ.get("LEASE_SETTLE_SECONDS", str(LEASE_TTL_SECONDS / 2)))
+WORKER_ID = os.environ.get("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def shard_of(market_id: str, shards: int) -> int:
+    """Return the shard of *market_id*; stable across processes and hosts."""
+    return zlib.crc32(str(market_id).encode()) % shards
+
+
+class ShardLease:
+    """This worker's leased shards for one job, renewed in the background."""
+
+    def __init__(self, job: str, shards: int = INGEST_SHARDS, owner: str = WORKER_ID,
+                 ttl: float = LEASE_TTL_SECONDS, settle: float = LEASE_SETTLE_SECONDS):
+        self.job = job
+        self.count = shards
+        self.owner = owner
+        self.ttl = ttl
+        self.settle = settle
+        self.shards: frozenset[int] = frozenset()
+        self._renewed = 0.0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @classmethod
+    def for_loader(cls, job: str) -> "ShardLease | None":
+        """Return a lease for *job* if sharding is enabled."""
+        if INGEST_SHARDS <= 0:
+            return None
+        return cls(job)
+
+    def claim(self) -> frozenset[int]:
+        """Heartbeat, rebalance and return the shards now held."""
+        held = call_rpc("claim_ingest_shards", {
+            "p_job": self.job,
+            "p_owner": self.owner,
+            "p_shards": self.count,
+            "p_ttl_seconds": int(self.ttl),
+        }) or []
+        shards = frozenset(int(s) for s in held)
+        if shards != self.shards:
+            logging.info("%s/%s: holding %s of %s shards", self.job, self.owner,
+                         len(shards), self.count)
+        self.shards = shards
+        self._renewed = time.monotonic()
+        return shards
+
+    def owns(self, market_id: str) -> bool:
+        # an unrenewed lease may already belong to someone else
+        if time.monotonic() - self._renewed > self.ttl:
+            return False
+        return shard_of(market_id, self.count) in self.shards
+
+    def filter(self, items, key=lambda x: x) -> list:
+        """Return the *items* whose market id (``key(item)``) this worker owns."""
+        return [it for it in items if self.owns(key(it))]
+
+    def _heartbeat(self) -> None:
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                self.claim()
+            except Exception:
+                logging.exception("lease heartbeat failed")
+
+    def start(self) -> "ShardLease":
+        """Register, let the other workers rebalance, then start heartbeating.
+
+        The first claim of a worker starting next to others returns little or
+        nothing: the shards are still held by whoever claimed first. That
+        worker gives back its surplus on its next claim, so this one claims
+        again after ``settle`` seconds.
+        """
+        self.claim()
+        if self.settle > 0:
+            time.sleep(self.settle)
+            self.claim()
+        self._thread = threading.Thread(target=self._heartbeat, name="shard-lease", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop heartbeating and hand the shards back immediately."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        try:
+            call_rpc("release_ingest_shards", {"p_job": self.job, "p_owner": self.owner})
+        except Exception:
+            logging.exception("lease release failed; shards free up after %ss", self.ttl)
+        self.shards = frozenset()
+
+    def __enter__(self) -> "ShardLease":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,232 @@
+"""Durable on-disk write spool in front of Supabase.
+
+Writers call :meth:`Spool.append`, which appends one JSON line per batch to
+the current segment file and returns immediately. :meth:`Spool.flush` replays
+everything after the last acknowledged position into a *sink* (normally
+``common.post_rows``) one batch at a time and advances the position after
+each accepted batch, so an outage just leaves the rest on disk for the next
+flush and nothing accepted is sent twice. A batch the sink rejects for good
+(it raises :class:`Rejected`, e.g. on an HTTP 4xx) is moved to
+``dead.jsonl`` so it cannot block the batches queued behind it.
+
+Layout of the spool directory::
+
+    000000000001.log   append-only segments (one JSON record per line)
+    000000000002.log
+    ack.json           {"segment": 1, "offset": 4096, "skip": 500}
+    dead.jsonl         rejected batches with the sink's error
+
+``skip`` counts the rows of the record at ``offset`` that were already
+delivered; large records are sent in several batches.
+
+A spool directory must only be used by one process at a time.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+SEGMENT_BYTES = 8 * 1024 * 1024
+
+
+class Rejected(RuntimeError):
+    """Raised by a sink for rows that will never be accepted as they are."""
+
+
+def _seg_name(n: int) -> str:
+    return f"{n:012d}.log"
+
+
+class Spool:
+    """Append-only segment log with an acknowledged read offset."""
+
+    def __init__(self, path: str, *, segment_bytes: int = SEGMENT_BYTES):
+        self.path = path
+        self.segment_bytes = segment_bytes
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        segs = self._segments()
+        self._current = segs[-1] if segs else 1
+
+    # ───────────── segments / ack
+    def _segments(self) -> list[int]:
+        return sorted(
+            int(f[:-4]) for f in os.listdir(self.path)
+            if f.endswith(".log") and f[:-4].isdigit()
+        )
+
+    def _seg_path(self, n: int) -> str:
+        return os.path.join(self.path, _seg_name(n))
+
+    def _read_ack(self) -> tuple[int, int, int]:
+        try:
+            with open(os.path.join(self.path, "ack.json")) as f:
+                j = json.load(f)
+            return int(j["segment"]), int(j["offset"]), int(j.get("skip", 0))
+        except (OSError, ValueError, KeyError):
+            segs = self._segments()
+            return (segs[0] if segs else 1), 0, 0
+
+    def _write_ack(self, segment: int, offset: int, skip: int = 0) -> None:
+        tmp = os.path.join(self.path, "ack.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"segment": segment, "offset": offset, "skip": skip}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.path, "ack.json"))
+
+    def _dead_letter(self, table: str, rows: list, conflict_key, error: Exception) -> None:
+        line = json.dumps({
+            "table": table, "conflict_key": conflict_key, "rows": rows,
+            "error": str(error), "at": datetime.now(timezone.utc).isoformat(),
+        }, separators=(",", ":"), default=str).encode() + b"\n"
+        with open(os.path.join(self.path, "dead.jsonl"), "ab") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    # ───────────── writer side
+    def append(self, table: str, rows: list, conflict_key: str | None = "market_id") -> None:
+        """Durably record *rows* destined for *table*."""
+        if not rows:
+            return
+        line = json.dumps(
+            {"table": table, "conflict_key": conflict_key, "rows": rows},
+            separators=(",", ":"), default=str,
+        ).encode() + b"\n"
+        with self._lock:
+            path = self._seg_path(self._current)
+            if os.path.exists(path) and os.path.getsize(path) >= self.segment_bytes:
+                self._current += 1
+                path = self._seg_path(self._current)
+            with open(path, "ab") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    # ───────────── reader side
+    def _records(self):
+        """Yield ``(segment, start, end, record, skip)`` from the ack position.
+
+        *skip* is the number of the record's rows already delivered.
+        """
+        ack_seg, ack_off, ack_skip = self._read_ack()
+        for seg in self._segments():
+            if seg < ack_seg:
+                continue
+            with open(self._seg_path(seg), "rb") as f:
+                if seg == ack_seg:
+                    f.seek(ack_off)
+                while True:
+                    start = f.tell()
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        break  # empty or partially written record
+                    skip = ack_skip if (seg, start) == (ack_seg, ack_off) else 0
+                    yield seg, start, f.tell(), json.loads(line), skip
+
+    def pending(self) -> int:
+        """Return the number of unacknowledged rows."""
+        return sum(len(rec["rows"]) - skip for _, _, _, rec, skip in self._records())
+
+    def flush(self, sink, *, batch_rows: int = 500) -> int:
+        """Send unacknowledged rows to ``sink(table, rows, conflict_key)``.
+
+        Consecutive records for the same table are merged, and large ones
+        split, into batches of at most *batch_rows*; rows of an upsert batch
+        that repeat a conflict key are collapsed to the last one, which
+        Postgres would otherwise reject. The ack position advances after
+        every accepted batch. A batch the sink rejects with
+        :class:`Rejected` is dead-lettered and acknowledged; any other
+        exception stops flushing and propagates. Returns the number of rows
+        delivered.
+        """
+        from common import dedupe
+
+        with self._flush_lock:
+            sent = 0
+            batch: list = []
+            key = None
+            pos = None
+
+            def send():
+                nonlocal sent, batch
+                rows = dedupe(batch, key[1]) if key[1] else batch
+                try:
+                    sink(key[0], rows, key[1])
+                    sent += len(rows)
+                except Rejected as e:
+                    print(f"❌ spool: {len(rows)} {key[0]} rows dead-lettered: {e}")
+                    self._dead_letter(key[0], rows, key[1], e)
+                self._write_ack(*pos)
+                batch = []
+
+            for seg, start, end, rec, skip in self._records():
+                rec_key = (rec["table"], rec["conflict_key"])
+                if batch and rec_key != key:
+                    send()
+                key = rec_key
+                rows = rec["rows"]
+                i = skip
+                while i < len(rows):
+                    take = min(batch_rows - len(batch), len(rows) - i)
+                    batch.extend(rows[i:i + take])
+                    i += take
+                    pos = (seg, end, 0) if i == len(rows) else (seg, start, i)
+                    if len(batch) >= batch_rows:
+                        send()
+            if batch:
+                send()
+            self._gc()
+            return sent
+
+    def _gc(self) -> None:
+        """Remove segments that are fully acknowledged and no longer written."""
+        ack_seg = self._read_ack()[0]
+        with self._lock:
+            for seg in self._segments():
+                if seg < ack_seg and seg != self._current:
+                    os.remove(self._seg_path(seg))
+
+
+class SpoolFlusher(threading.Thread):
+    """Background thread draining a :class:`Spool` every *interval* seconds."""
+
+    def __init__(self, spool: Spool, sink, *, interval: float = 2.0,
+                 batch_rows: int = 500):
+        super().__init__(daemon=True, name="spool-flusher")
+        self.spool = spool
+        self.sink = sink
+        self.interval = interval
+        self.batch_rows = batch_rows
+        self._stopping = threading.Event()
+        self._wake = threading.Event()
+
+    def notify(self) -> None:
+        """Ask for a flush without waiting for the next interval."""
+        self._wake.set()
+
+    def _flush_once(self) -> bool:
+        try:
+            self.spool.flush(self.sink, batch_rows=self.batch_rows)
+            return True
+        except Exception as e:
+            print(f"⚠️ spool flush failed, will retry: {e}")
+            return False
+
+    def run(self) -> None:
+        while not self._stopping.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self._flush_once()
+
+    def stop(self, timeout: float = 30.0) -> bool:
+        """Stop the thread and try one last flush; ``True`` if fully drained."""
+        self._stopping.set()
+        self._wake.set()
+        self.join(timeout)
+        return self._flush_once() and self.spool.pending() == 0
@@ -0,0 +1,44 @@
+import pytest
+
+import archive
+
+
+ROWS = [
+    {"id": 1, "market_id": "A", "price": 0.4, "timestamp": "2024-05-01T10:03:00Z",
+     "bucket": "2024-05-01T10:00:00Z", "source": "kalshi"},
+    {"id": 2, "market_id": "A", "price": 0.5, "timestamp": "2024-05-02T10:00:00+00:00", "source": "kalshi"},
+    {"id": 3, "market_id": "B", "price": 0.7, "timestamp": "2024-05-01T23:00:00Z", "source": "polymarket"},
+]
+
+
+def test_partition_rows_by_day_and_source():
+    parts = archive.partition_rows(ROWS)
+    assert sorted(parts) == [
+        ("2024-05-01", "kalshi"),
+        ("2024-05-01", "polymarket"),
+        ("2024-05-02", "kalshi"),
+    ]
+    assert [r["id"] for r in parts[("2024-05-01", "kalshi")]] == [1]
+
+
+def test_write_and_read_archive(tmp_path):
+    pytest.importorskip("pyarrow")
+    paths = archive.write_archive("market_snapshots", ROWS, str(tmp_path))
+    assert len(paths) == 3
+    assert all("date=" in p and "source=" in p for p in paths)
+
+    t = archive.read_archive(
+        "market_snapshots", str(tmp_path),
+        columns=["market_id", "price", "source"], sources=["kalshi"],
+    )
+    assert t.column_names == ["market_id", "price", "source"]
+    assert sorted(t.column("price").to_pylist()) == [0.4, 0.5]
+
+    t = archive.read_archive(
+        "market_snapshots", str(tmp_path), columns=["id"], start="2024-05-02",
+    )
+    assert t.column("id").to_pylist() == [2]
+
+    t = archive.read_archive("market_snapshots", str(tmp_path), columns=["id", "bucket"],
+                             sources=["kalshi"], end="2024-05-01")
+    assert t.column("bucket").to_pylist()[0].isoformat() == "2024-05-01T10:00:00+00:00"
@@ -0,0 +1,16 @@
+import bench
+
+
+def test_compare_flags_only_regressions_over_threshold():
+    base = {"results": {"a[1]": {"seconds": 1.0}, "b[1]": {"seconds": 1.0}}}
+    cur = {"results": {"a[1]": {"seconds": 1.1}, "b[1]": {"seconds": 1.5},
+                       "new[1]": {"seconds": 9.0}}}
+    msgs = bench.compare(cur, base, threshold=0.2)
+    assert len(msgs) == 1 and msgs[0].startswith("b[1]")
+
+
+def test_run_smallest_fixtures():
+    doc = bench.run(["serialize", "kalshi_outcomes"], max_size=1_000,
+                    repeat=1, log=lambda *_: None)
+    assert set(doc["results"]) == {"serialize[1000]", "kalshi_outcomes[1000]"}
+    assert all(r["seconds"] > 0 for r in doc["results"].values())
@@ -0,0 +1,46 @@
+import os
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-key")
+
+import cleanup_markets
+
+
+def test_archive_and_delete_pages_by_key(tmp_path, monkeypatch):
+    table = [{"id": i, "timestamp": "2024-01-01"} for i in range(5)]
+    written, deletes = [], []
+
+    def fetch(name, where, limit=2):
+        return table[:limit]
+
+    def delete(name, where):
+        deletes.append(where)
+        keys = {int(k) for k in where["id"][4:-1].split(",")}
+        gone = [r for r in table if r["id"] in keys]
+        table[:] = [r for r in table if r["id"] not in keys]
+        # a row that starts matching after its page was archived stays put
+        if len(deletes) == 1:
+            table.append({"id": 99, "timestamp": "2024-01-01"})
+        return len(gone)
+
+    monkeypatch.setattr(cleanup_markets, "PAGE_SIZE", 2)
+    monkeypatch.setattr(cleanup_markets, "fetch_where", fetch)
+    monkeypatch.setattr(cleanup_markets, "delete_where", delete)
+    monkeypatch.setattr(cleanup_markets, "write_archive",
+                        lambda name, rows, root: written.extend(rows) or ["p"])
+    n = cleanup_markets.archive_and_delete("market_snapshots", {}, str(tmp_path))
+    assert n == 6
+    assert sorted(r["id"] for r in written) == [0, 1, 2, 3, 4, 99]
+    assert deletes[0] == {"id": "in.(0,1)"}
+
+
+def test_failed_archive_keeps_rows(tmp_path, monkeypatch):
+    def fail(*a):
+        raise OSError("disk full")
+
+    deletes = []
+    monkeypatch.setattr(cleanup_markets, "fetch_where", lambda *a: [{"id": 1}])
+    monkeypatch.setattr(cleanup_markets, "write_archive", fail)
+    monkeypatch.setattr(cleanup_markets, "delete_where", lambda *a: deletes.append(a))
+    assert cleanup_markets.archive_and_delete("markets", {}, str(tmp_path)) is None
+    assert deletes == []
@@ -1,3 +1,4 @@
+import json
 import os
 import sys
 
@@ -6,6 +7,8 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
 os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-key")
 
+import pytest
+
 import common
 
 def test_chunked_basic():
@@ -33,6 +36,181 @@ def test_fetch_stats_concurrent_failure():
     assert failed == [7]
 
 
+def test_aggregate_trades_window_and_units():
+    from datetime import datetime, timezone
+    from records import to_prob
+
+    trades = [
+        {"timestamp": "2024-05-01T12:00:00Z", "price": 40, "size": 10},
+        {"timestamp": "2024-05-01T13:00:00Z", "price": 0.6, "size": 10},
+        {"timestamp": "2024-04-29T00:00:00Z", "price": 90, "size": 99},
+    ]
+    cutoff = datetime(2024, 4, 30, tzinfo=timezone.utc)
+    assert common.aggregate_trades(trades, cutoff, size_key="size",
+                                   to_price=to_prob) == (10.0, 20, 0.5)
+    assert common.aggregate_trades([], cutoff) == (0.0, 0, None)
+
+
+def test_aggregate_trades_treats_naive_times_as_utc():
+    from datetime import datetime
+    from records import to_prob
+
+    trades = [
+        {"timestamp": "2024-05-01T12:00:00Z", "price": 40, "size": 10},
+        {"timestamp": "2024-05-01T13:00:00", "price": 60, "size": 10},
+        {"timestamp": "2024-04-29T00:00:00Z", "price": 90, "size": 99},
+    ]
+    # Polymarket's cutoff is naive (utcnow); trades carry "Z" or no offset
+    naive = datetime(2024, 4, 30)
+    assert common.aggregate_trades(trades, naive, size_key="size",
+                                   to_price=to_prob) == (10.0, 20, 0.5)
+
+
+def test_insert_dedupes_on_conflict_key(monkeypatch):
+    import json
+    from records import SNAPSHOT_KEY, SnapshotRow
+
+    rows = [
+        SnapshotRow(market_id="A", price=0.1, timestamp="2024-05-01T12:01:00Z", source="kalshi"),
+        SnapshotRow(market_id="A", price=0.2, timestamp="2024-05-01T12:03:00Z", source="kalshi"),
+        SnapshotRow(market_id="A", price=0.3, timestamp="2024-05-01T12:06:00Z", source="kalshi"),
+    ]
+    sent = []
+
+    class Resp:
+        status_code = 201
+
+    monkeypatch.setattr(common, "_post", lambda url, body, **kw: sent.append((url, body)) or Resp())
+    common.insert_to_supabase("market_snapshots", rows, conflict_key=SNAPSHOT_KEY)
+    url, body = sent[0]
+    assert url.endswith("on_conflict=market_id,source,bucket")
+    assert [r["price"] for r in json.loads(body)] == [0.2, 0.3]
+
+
+def test_iter_json_items_across_chunk_boundaries():
+    import json
+
+    doc = {"cursor": "c", "n": 12345,
+           "markets": [{"ticker": f"T{i}", "v": i * 1.5, "x": [{"q": 'é"]'}]} for i in range(20)]}
+    body = json.dumps(doc).encode()
+    for size in (1, 7, 4096):
+        chunks = [body[i:i + size] for i in range(0, len(body), size)]
+        got = list(common.iter_json_items(chunks, "markets", fields=("ticker", "v")))
+        assert got == [{"ticker": m["ticker"], "v": m["v"]} for m in doc["markets"]]
+    assert list(common.iter_json_items([b"[1, 2", b"2, 3]"])) == [1, 22, 3]
+    assert list(common.iter_json_items([b'{"markets":[1.', b'25]}'], "markets")) == [1.25]
+    assert list(common.iter_json_items([b"[2e", b"3, -", b"1.5E-", b"1]"])) == [2000.0, -0.15]
+    assert list(common.iter_json_items([b'{"markets": null}'], "markets")) == []
+
+
+def test_failover_opens_breaker_and_probes(monkeypatch):
+    now = [0.0]
+    breaker = common.CircuitBreaker(failures=2, cooldown=30, clock=lambda: now[0])
+    monkeypatch.setattr(common, "BREAKER", breaker)
+    calls = []
+    primary_up = [False]
+
+    def fetch(url):
+        calls.append(url)
+        if url.startswith("http://a") and not primary_up[0]:
+            raise ConnectionError("down")
+        return url
+
+    urls = ["http://a/x", "http://b/x"]
+    for _ in range(3):
+        assert common.get_with_failover(fetch, urls) == "http://b/x"
+    # two failures opened a; the third call went straight to b
+    assert calls == ["http://a/x", "http://b/x", "http://a/x", "http://b/x", "http://b/x"]
+    assert breaker.state("a") == "open"
+
+    now[0] = 31
+    primary_up[0] = True
+    calls.clear()
+    assert common.get_with_failover(fetch, urls) == "http://a/x"
+    assert calls == ["http://a/x"] and breaker.state("a") == "closed"
+
+
+def test_failover_fails_fast_when_all_hosts_open(monkeypatch):
+    import time
+
+    now = [0.0]
+    breaker = common.CircuitBreaker(failures=1, cooldown=30, clock=lambda: now[0])
+    monkeypatch.setattr(common, "BREAKER", breaker)
+    for host in ("a", "b"):
+        breaker.failure(host)
+    slept = []
+    monkeypatch.setattr(common.time, "sleep", slept.append)
+
+    t = time.perf_counter()
+    for _ in range(50):
+        with pytest.raises(common.HostsUnavailable):
+            common.get_with_failover(lambda u: u, ["http://a/x", "http://b/x"])
+    assert time.perf_counter() - t < 0.5 and slept == []
+
+    # once the cooldown passes a single call probes the first host
+    now[0] = 31
+    assert common.get_with_failover(lambda u: u, ["http://a/x", "http://b/x"]) == "http://a/x"
+    assert breaker.state("a") == "closed"
+
+
+def test_hedge_timer_starts_when_the_request_runs(monkeypatch):
+    import threading
+    import time
+
+    monkeypatch.setattr(common, "BREAKER", common.CircuitBreaker())
+    monkeypatch.setattr(common, "_hedge_pool", None)
+    monkeypatch.setattr(common, "HEDGE_WORKERS", 1)
+    gate = threading.Event()
+    calls = []
+
+    def fetch(url):
+        calls.append(url)
+        if url.startswith("http://busy"):
+            gate.wait()
+        return url
+
+    # the only pool thread is taken; the next call queues behind it
+    blocker = threading.Thread(target=common._hedged,
+                               args=(fetch, "http://busy/x", "http://busy/x", 5))
+    blocker.start()
+    time.sleep(0.05)
+    threading.Timer(0.2, gate.set).start()
+    assert common._hedged(fetch, "http://a/x", "http://b/x", 0.1) == "http://a/x"
+    blocker.join()
+    assert "http://b/x" not in calls
+    common._hedge_pool.shutdown()
+
+
+def test_failover_stops_on_client_error(monkeypatch):
+    monkeypatch.setattr(common, "BREAKER", common.CircuitBreaker())
+    calls = []
+
+    class NotFound(Exception):
+        response = type("R", (), {"status_code": 404})()
+
+    def fetch(url):
+        calls.append(url)
+        raise NotFound()
+
+    assert common.get_with_failover(fetch, ["http://a/x", "http://b/x"]) is None
+    assert calls == ["http://a/x"] and common.BREAKER.state("a") == "closed"
+
+
+def test_hedged_request_takes_first_answer(monkeypatch):
+    import time
+
+    monkeypatch.setattr(common, "BREAKER", common.CircuitBreaker())
+
+    def fetch(url):
+        if url.startswith("http://slow"):
+            time.sleep(0.5)
+        return url
+
+    t = time.perf_counter()
+    got = common.get_with_failover(fetch, ["http://slow/x", "http://fast/x"], hedge_after=0.02)
+    assert got == "http://fast/x" and time.perf_counter() - t < 0.4
+
+
 def test_fetch_events(monkeypatch):
     calls = []
 
@@ -40,11 +218,15 @@ def test_fetch_events(monkeypatch):
         calls.append((url, params))
 
         class FakeResp:
+            status_code = 200
+            headers = {}
+            text = json.dumps({"events": [{"id": 1}, {"id": 2}]})
+
             def raise_for_status(self):
                 pass
 
             def json(self):
-                return {"events": [{"id": 1}, {"id": 2}]}
+                return json.loads(self.text)
 
         return FakeResp()
 
@@ -52,3 +234,134 @@ def test_fetch_events(monkeypatch):
     events = common.fetch_events(limit=2, max_pages=1)
     assert events == [{"id": 1}, {"id": 2}]
     assert calls[0][0] == common.EVENTS_URL
+
+
+def test_call_rpc(monkeypatch):
+    calls = []
+
+    class FakeResp:
+        text = "3"
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return 3
+
+    def fake_post(url, headers=None, json=None, timeout=None):
+        calls.append((url, json))
+        return FakeResp()
+
+    monkeypatch.setattr(common.requests, "post", fake_post)
+    assert common.call_rpc("some_fn", {"n": 1}) == 3
+    assert calls == [(f"{common.SUPABASE_URL}/rest/v1/rpc/some_fn", {"n": 1})]
+
+
+def _resp(status, body=None, headers=None):
+    class FakeResp:
+        status_code = status
+
+        def raise_for_status(self):
+            if status >= 400:
+                raise RuntimeError(status)
+
+        def json(self):
+            return json.loads(self.text)
+
+    FakeResp.text = json.dumps(body)
+    FakeResp.headers = headers or {}
+    return FakeResp()
+
+
+def test_cached_get_json_conditional(monkeypatch):
+    cache = common.ResponseCache(max_bytes=1024)
+    sent = []
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        sent.append(dict(headers))
+        if headers.get("If-None-Match") == '"v1"':
+            return _resp(304)
+        return _resp(200, {"n": 1}, {"ETag": '"v1"'})
+
+    monkeypatch.setattr(common.requests, "get", fake_get)
+    assert common.cached_get_json("http://x", cache=cache) == {"n": 1}
+    cached = common.cached_get_json("http://x", cache=cache)
+    assert cached == {"n": 1}
+    assert sent == [{}, {"If-None-Match": '"v1"'}]
+
+    # callers get their own copy; mutating it leaves the cache intact
+    cached["n"] = 2
+    assert common.cached_get_json("http://x", cache=cache, ttl=60) == {"n": 1}
+
+    # within the TTL no request is made at all
+    common.cached_get_json("http://x", cache=cache, ttl=60)
+    assert len(sent) == 2
+
+
+def test_response_cache_lru_and_disk(tmp_path):
+    cache = common.ResponseCache(max_bytes=8, disk_dir=str(tmp_path))
+    for k in ("a", "b", "c"):
+        cache.put(k, {"fetched_at": 0, "body": k * 4})
+    assert list(cache._mem) == ["b", "c"]
+    # evicted from memory but still served from the disk tier
+    assert cache.get("a")["body"] == "aaaa"
+    assert list(cache._mem) == ["c", "a"]
+    assert cache._bytes == 8
+
+
+def test_enrich_concurrent_yields_all_with_timeouts():
+    import time as _time
+
+    def slow(x):
+        if x == 2:
+            _time.sleep(0.5)
+        return x * 10
+
+    def fails(x):
+        if x == 1:
+            raise ValueError("boom")
+        return -x
+
+    out = dict(common.enrich_concurrent(
+        [0, 1, 2, 3], {"a": slow, "b": fails}, workers=4, timeout=0.2,
+    ))
+    assert out[0] == {"a": 0, "b": 0}
+    assert out[1] == {"a": 10, "b": None}
+    assert out[2] == {"a": None, "b": -2}
+    assert out[3] == {"a": 30, "b": -3}
+
+
+def test_post_rows_marks_client_errors_as_rejected(monkeypatch):
+    import pytest
+    from spool import Rejected
+
+    status = [400]
+
+    class Resp:
+        text = "bad"
+
+        @property
+        def status_code(self):
+            return status[0]
+
+    monkeypatch.setattr(common, "_post", lambda *a, **kw: Resp())
+    with pytest.raises(Rejected):
+        common.post_rows("markets", [{"market_id": "M"}])
+    status[0] = 503
+    with pytest.raises(RuntimeError) as e:
+        common.post_rows("markets", [{"market_id": "M"}])
+    assert not isinstance(e.value, Rejected)
+
+
+def test_enrich_timeout_excludes_queue_time():
+    import time as _time
+
+    def lookup(x):
+        if x == 0:
+            _time.sleep(0.3)  # times out but keeps the only thread busy
+        return x * 10
+
+    out = dict(common.enrich_concurrent([0, 1], {"a": lookup}, workers=1, timeout=0.1))
+    assert out[0] == {"a": None}
+    # item 1 waited behind item 0 but ran well within its own timeout
+    assert out[1] == {"a": 10}
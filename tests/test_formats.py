@@ -0,0 +1,114 @@
+import gzip
+import json
+
+import pytest
+
+import formats
+from formats import NotAcceptable, negotiate
+
+
+def test_negotiate():
+    assert negotiate(None) == "json"
+    assert negotiate("text/html, application/x-msgpack;q=0.9") == "msgpack"
+    assert negotiate("application/vnd.apache.arrow.stream") == "arrow"
+    assert negotiate("application/json", "arrow") == "arrow"
+    with pytest.raises(NotAcceptable):
+        negotiate(None, "xml")
+
+
+def test_negotiate_q_values():
+    assert negotiate("*/*") == "json"
+    assert negotiate("text/html,application/xhtml+xml,*/*;q=0.8") == "json"
+    assert negotiate("application/msgpack;q=0, */*") == "json"
+    assert negotiate("application/json;q=0.5, application/msgpack") == "msgpack"
+    assert negotiate("application/json;q=0, */*") == "msgpack"
+    with pytest.raises(NotAcceptable):
+        negotiate("application/msgpack;q=0")
+    with pytest.raises(NotAcceptable):
+        negotiate("text/html")
+
+
+def _client(monkeypatch, rows):
+    from fastapi.testclient import TestClient
+    import api
+    from search import SearchIndex
+
+    idx = SearchIndex()
+    idx.upsert(rows)
+    monkeypatch.setattr(api, "INDEX", idx)
+    return TestClient(api.app)
+
+
+ROWS = [
+    {"market_id": f"M{i}", "market_name": f"Market {i}", "source": "kalshi",
+     "price": i / 100, "dollar_volume": float(i)}
+    for i in range(12)
+]
+
+
+def test_streamed_json_matches_batches(monkeypatch):
+    monkeypatch.setattr(formats, "STREAM_BATCH", 5)
+    client = _client(monkeypatch, ROWS)
+    r = client.get("/snapshots", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    body = r.json()
+    assert body["total"] == 12
+    assert [m["market_id"] for m in body["results"]][:2] == ["M11", "M10"]
+    raw = b"".join(formats._compress(formats._json_chunks({"total": 0}, "results", []), "gzip"))
+    assert json.loads(gzip.decompress(raw)) == {"total": 0, "results": []}
+
+
+def test_arrow_snapshots_and_history(monkeypatch):
+    pa = pytest.importorskip("pyarrow")
+    import api
+
+    monkeypatch.setattr(formats, "STREAM_BATCH", 5)
+    client = _client(monkeypatch, ROWS)
+    r = client.get("/snapshots", params={"format": "arrow"})
+    assert r.headers["content-type"] == formats.MEDIA["arrow"]
+    reader = pa.ipc.open_stream(r.content)
+    batches = list(reader)
+    assert [b.num_rows for b in batches] == [5, 5, 2]
+    table = pa.Table.from_batches(batches)
+    assert table.column("dollar_volume").to_pylist()[0] == 11.0
+    assert json.loads(reader.schema.metadata[b"total"]) == 12
+
+    rows = [{"timestamp": "2024-05-01T00:00:00Z", "price": 0.4},
+            {"timestamp": "2024-05-01T00:05:00Z", "price": 0.41}]
+    monkeypatch.setattr(api, "SUPABASE_URL", "https://example.supabase.co")
+    monkeypatch.setattr(api, "fetch_all", lambda table, params: rows)
+    r = client.get("/history/KX-1", headers={"Accept": formats.MEDIA["arrow"]})
+    hist = pa.ipc.open_stream(r.content).read_all()
+    assert hist.column("t").to_pylist() == [1714521600, 1714521900]
+    assert hist.column("p").to_pylist() == [0.4, 0.41]
+    assert json.loads(hist.schema.metadata[b"market_id"]) == "KX-1"
+
+
+def test_arrow_columns_from_every_row(monkeypatch):
+    pa = pytest.importorskip("pyarrow")
+    # the first doc lacks vwap/yes_bid, as the index leaves out None fields
+    rows = [{"market_id": "A", "market_name": "A", "source": "kalshi", "dollar_volume": 9.0},
+            {"market_id": "B", "market_name": "B", "source": "kalshi", "dollar_volume": 5.0,
+             "vwap": 0.42, "yes_bid": 0.4, "liquidity": "n/a"},
+            {"market_id": "C", "market_name": "C", "source": "kalshi", "dollar_volume": 1.0,
+             "liquidity": 12.5}]
+    client = _client(monkeypatch, rows)
+    r = client.get("/snapshots", params={"format": "arrow"})
+    assert r.status_code == 200
+    table = pa.ipc.open_stream(r.content).read_all()
+    assert table.column("market_id").to_pylist() == ["A", "B", "C"]
+    assert table.column("vwap").to_pylist() == [None, 0.42, None]
+    assert table.column("yes_bid").to_pylist() == [None, 0.4, None]
+    assert table.column("liquidity").to_pylist() == [None, "n/a", "12.5"]
+
+
+def test_msgpack(monkeypatch):
+    client = _client(monkeypatch, ROWS[:3])
+    r = client.get("/search", headers={"Accept": "application/msgpack"})
+    try:
+        import msgpack
+    except ModuleNotFoundError:
+        assert r.status_code == 406
+        return
+    body = msgpack.unpackb(r.content)
+    assert body["total"] == 3 and len(body["results"]) == 3
@@ -67,3 +67,28 @@ def test_main_populates_events(monkeypatch):
 
     # ingestion is disabled so no insert should occur
     assert inserted == []
+
+
+def test_fetch_markets_keeps_only_used_fields(monkeypatch):
+    import common
+    import kalshi_fetch as kf
+
+    body = (b'{"markets": [{"ticker": "EVT-A", "last_price": 40, "yes_bid": 39,'
+            b' "rules_primary": "long text", "settlement_sources": [1, 2]}]}')
+
+    class FakeResp:
+        def raise_for_status(self):
+            pass
+
+        def iter_content(self, size):
+            return iter([body[:30], body[30:]])
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(common, "BREAKER", common.CircuitBreaker())
+    monkeypatch.setattr(common, "http_get", lambda *a, **kw: FakeResp())
+    markets = kf.fetch_markets("EVT")
+    assert markets == [{"ticker": "EVT-A", "last_price": 40, "yes_bid": 39}]
+    row = kf.format_market_row({"ticker": "EVT"}, markets[0])
+    assert row["market_id"] == "EVT-A"
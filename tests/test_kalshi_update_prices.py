@@ -0,0 +1,62 @@
+import os
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-key")
+os.environ.setdefault("KALSHI_API_KEY", "test-key")
+
+import kalshi_update_prices as kup
+
+
+def test_main_fetches_trades_only_for_selected(monkeypatch):
+    markets = [
+        {"ticker": f"EVT-{i}", "volume_24h": i, "open_interest": 0, "last_price": 50}
+        for i in range(10)
+    ]
+    markets.append({"ticker": "EVT-OI", "volume_24h": 9, "open_interest": 500, "last_price": 50})
+    markets.append({"ticker": "OTHER-X", "volume_24h": 10_000, "last_price": 50})
+
+    monkeypatch.setattr(kup, "FETCH_LIMIT", 3)
+    monkeypatch.setattr(kup, "fetch_all_markets", lambda: markets)
+    monkeypatch.setattr(
+        kup, "fetch_active_market_info",
+        lambda: {m["ticker"]: None for m in markets if m["ticker"] != "OTHER-X"},
+    )
+    fetched = []
+
+    def fake_stats(ticker):
+        fetched.append(ticker)
+        return 1.0, 2, 0.5
+
+    monkeypatch.setattr(kup, "fetch_trade_stats", fake_stats)
+    kup.main()
+    assert sorted(fetched) == ["EVT-8", "EVT-9", "EVT-OI"]
+
+
+def test_scheduled_markets_go_most_overdue_first(monkeypatch):
+    import time
+
+    from scheduler import RefreshScheduler
+
+    now = time.time()
+    markets = [
+        {"ticker": "EVT-HOT", "volume_24h": 10_000, "last_price": 50},
+        {"ticker": "EVT-COLD", "volume_24h": 1, "last_price": 50},
+        {"ticker": "EVT-LATER", "volume_24h": 5, "last_price": 50},
+    ]
+    sched = RefreshScheduler({
+        "EVT-HOT": {"due": now - 10, "price": 0.5},
+        "EVT-COLD": {"due": now - 3000, "price": 0.5},
+        "EVT-LATER": {"due": now + 600, "price": 0.5},
+    })
+    monkeypatch.setattr(kup.RefreshScheduler, "for_loader", lambda name: sched)
+    monkeypatch.setattr(kup, "FETCH_LIMIT", 1)
+    monkeypatch.setattr(kup, "fetch_all_markets", lambda: markets)
+    monkeypatch.setattr(kup, "fetch_active_market_info",
+                        lambda: {m["ticker"]: None for m in markets})
+    fetched = []
+    monkeypatch.setattr(kup, "fetch_trade_stats",
+                        lambda t: fetched.append(t) or (1.0, 2, 0.5))
+    kup.main()
+    assert fetched == ["EVT-COLD"]
+    kup.main()
+    assert fetched == ["EVT-COLD", "EVT-HOT"]
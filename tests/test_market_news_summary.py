@@ -0,0 +1,80 @@
+import market_news_summary as mns
+
+
+ROWS = [
+    {"market_id": "A", "market_name": "Alpha", "price": 0.6, "volume": 20000, "change_24h": 0.08},
+    {"market_id": "B", "market_name": None, "price": 0.2, "volume": 50000, "change_24h": -0.15},
+    {"market_id": "C", "market_name": "Gamma", "price": 0.5, "volume": 50000, "change_24h": 0.01},
+    {"market_id": "D", "market_name": "Delta", "price": 0.5, "volume": 10, "change_24h": 0.30},
+    {"market_id": "E", "market_name": "Eps", "price": None, "volume": 50000, "change_24h": 0.30},
+]
+
+
+def test_rank_movers_filters_and_orders():
+    movers = mns.rank_movers(ROWS, change_pct=5, volume_threshold=10000, limit=10)
+    assert [m["market_id"] for m in movers] == ["B", "A"]
+    assert movers[0]["market_name"] == "B"
+    assert movers[0]["change_pct"] == -15.0
+
+
+def test_detect_movers_single_request(monkeypatch):
+    calls = []
+
+    class FakeResp:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return ROWS
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        calls.append((url, params))
+        return FakeResp()
+
+    monkeypatch.setattr(mns.requests, "get", fake_get)
+    movers = mns.detect_movers(change_pct=5, volume_threshold=10000, limit=1)
+    assert len(calls) == 1
+    assert calls[0][1]["volume"] == "gte.10000"
+    assert [m["market_id"] for m in movers] == ["B"]
+
+
+def test_summaries_cached_by_headlines(tmp_path):
+    cache = mns.NewsCache(str(tmp_path / "news.sqlite"))
+    prompts = []
+
+    def chat(prompt):
+        prompts.append(prompt)
+        return f"summary {len(prompts)}"
+
+    articles = [("Headline A", "http://a"), ("Headline B", "http://b")]
+    assert mns.summarize_articles("Alpha", articles, cache=cache, chat=chat) == "summary 1"
+    # same headlines in a different order → cache hit
+    assert mns.summarize_articles("Alpha", articles[::-1], cache=cache, chat=chat) == "summary 1"
+    changed = articles + [("Headline C", "http://c")]
+    assert mns.summarize_articles("Alpha", changed, cache=cache, chat=chat) == "summary 2"
+    assert len(prompts) == 2
+
+
+def test_feed_cache_ttl(tmp_path, monkeypatch):
+    cache = mns.NewsCache(str(tmp_path / "news.sqlite"), feed_ttl=60)
+    cache.put_feed("alpha", [("t", "l")])
+    assert cache.get_feed("alpha") == [("t", "l")]
+    now = mns.time.time()
+    monkeypatch.setattr(mns.time, "time", lambda: now + 120)
+    assert cache.get_feed("alpha") is None
+
+
+def test_summarize_movers_preserves_order(tmp_path):
+    movers = [{"market_id": str(i), "market_name": f"M{i}"} for i in range(6)]
+
+    def fetch_news(query, cache=None):
+        return [] if query == "M3" else [(f"{query} news", "http://x")]
+
+    def summarize(market, articles, cache=None):
+        return f"sum {market}"
+
+    out = mns.summarize_movers(movers, fetch_news=fetch_news,
+                               summarize=summarize, workers=3)
+    assert [m["market_id"] for m, _, _ in out] == [str(i) for i in range(6)]
+    assert out[0][2] == "sum M0"
+    assert out[3][1:] == ([], "(no recent news)")
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from matching import MatchIndex, jaccard, tokens
+
+
+def _k(mid, event, name, exp="2024-11-05T00:00:00Z"):
+    return {"market_id": mid, "source": "kalshi", "event_name": event,
+            "market_name": name, "expiration": exp}
+
+
+def _p(mid, question, exp="2024-11-05T12:00:00Z"):
+    return {"market_id": mid, "source": "polymarket", "market_name": question,
+            "expiration": exp}
+
+
+def test_tokens_drop_stopwords_and_bucket_expiry():
+    t = tokens(_p("1", "Will the Fed cut rates in December?", "2024-12-18T00:00:00Z"))
+    assert t == {"fed", "cut", "rates", "december", "exp:2024-12"}
+
+
+def test_matches_same_question_across_venues_only():
+    index = MatchIndex()
+    noise = [_p(str(i), f"Will team {i} win the championship game {i}?") for i in range(200)]
+    assert index.update(noise) == []
+    index.add(_k("KXOTHER-A", "Fed rate decision December", "cut"))
+    matches = index.update([
+        _p("poly-btc", "Bitcoin above 100k on November 5 2024"),
+        _k("KXBTC-100K", "Bitcoin above 100k on November 5 2024", "100k"),
+    ])
+    assert [(k, p) for k, p, _ in matches] == [("KXBTC-100K", "poly-btc")]
+    assert matches[0][2] >= 0.45
+
+
+def test_expiry_distance_rejects_pair():
+    index = MatchIndex()
+    index.add(_p("p", "Bitcoin above 100k on November 5 2024", "2025-06-01T00:00:00Z"))
+    assert index.add(_k("K-1", "Bitcoin above 100k on November 5 2024", "100k")) == []
+
+
+def test_state_round_trip_only_reports_new_pairs(tmp_path):
+    path = str(tmp_path / "idx.json")
+    index = MatchIndex()
+    index.update([_p("p", "Will Trump win the 2024 presidential election")])
+    index.save(path)
+
+    again = MatchIndex.load(path)
+    assert again.add(_p("p", "Will Trump win the 2024 presidential election")) == []
+    found = again.add(_k("PRES-TRUMP", "2024 presidential election winner", "Trump"))
+    assert [m[:2] for m in found] == [("PRES-TRUMP", "p")]
+    assert jaccard(again.markets["p"]["tokens"], again.markets["PRES-TRUMP"]["tokens"]) >= 0.45
+
+
+def test_retain_forgets_deleted_markets():
+    index = MatchIndex()
+    index.add(_p("gone", "Bitcoin above 100k on November 5 2024"))
+    index.add(_p("kept", "Will the Fed cut rates in December?"))
+    assert index.retain(["kept", "KXBTC-100K"]) == 1
+    assert "gone" not in index.markets
+    assert all("gone" not in ids for ids in index.buckets.values())
+    assert index.add(_k("KXBTC-100K", "Bitcoin above 100k on November 5 2024", "100k")) == []
+
+
+def test_index_not_saved_when_write_fails(tmp_path, monkeypatch):
+    import matching
+
+    path = str(tmp_path / "idx.json")
+    monkeypatch.setattr(matching, "MATCH_STATE_PATH", path)
+    monkeypatch.setattr(matching, "fetch_markets", lambda: [
+        _p("p", "Bitcoin above 100k on November 5 2024"),
+        _k("KXBTC-100K", "Bitcoin above 100k on November 5 2024", "100k"),
+    ])
+    monkeypatch.setattr(matching, "fetch_spreads", lambda: [])
+
+    def reject(*a, **kw):
+        raise RuntimeError("market_matches → 409")
+
+    monkeypatch.setattr(matching, "write_rows", reject)
+    with pytest.raises(RuntimeError):
+        matching.main()
+    assert not os.path.exists(path)
+
+    sent = []
+    monkeypatch.setattr(matching, "write_rows", lambda table, rows, **kw: sent.extend(rows))
+    matching.main()
+    assert [(r["kalshi_market_id"], r["polymarket_market_id"]) for r in sent] == [
+        ("KXBTC-100K", "p")]
+    assert os.path.exists(path)
@@ -0,0 +1,50 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import Histogram, Metrics
+
+
+def test_histogram_buckets_and_quantile():
+    h = Histogram(buckets=(0.1, 1))
+    for v in (0.05, 0.5, 0.5, 5):
+        h.observe(v)
+    assert h.counts == [1, 2, 1]
+    assert h.quantile(0.5) == 1
+    assert h.quantile(1.0) == float("inf")
+
+
+def test_prometheus_and_summary(tmp_path):
+    m = Metrics(job="test")
+    m.observe_http("https://gamma.example/markets", 0.2, 200, 1000)
+    m.observe_http("https://gamma.example/markets", 0.3, 429)
+    m.retry("https://gamma.example/markets")
+    m.rows_written("market_snapshots", 500, 20_000, 0.5)
+    with m.stage("gamma"):
+        pass
+    m.timed("clob", lambda: None)()
+
+    text = m.to_prometheus()
+    assert 'pulse_http_requests_total{host="gamma.example",status="429"} 1' in text
+    assert 'pulse_http_request_seconds_bucket{host="gamma.example",le="+Inf"} 2' in text
+    assert 'pulse_http_throttled_total{host="gamma.example"} 1' in text
+
+    s = m.summary()
+    assert s["http"]["gamma.example"]["requests"] == 2
+    assert s["http"]["gamma.example"]["retries"] == 1
+    assert s["writes"]["market_snapshots"]["rows_per_sec"] == 1000.0
+    assert set(s["stages"]) == {"gamma", "clob"}
+
+    m.export(str(tmp_path))
+    assert json.loads((tmp_path / "test.json").read_text())["job"] == "test"
+    assert (tmp_path / "test.prom").read_text().startswith("# TYPE")
+
+
+def test_concurrent_stage_reports_wall_time():
+    m = Metrics(job="test")
+    slow = m.timed("clob", lambda _: time.sleep(0.1))
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(slow, range(4)))
+    s = m.summary()
+    assert 0.1 <= s["stages"]["clob"] < 0.3
+    assert s["stage_busy"]["clob"] >= 0.4
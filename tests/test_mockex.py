@@ -0,0 +1,62 @@
+import requests
+
+from mockex import MockConfig, MockExchange
+
+
+def _mock(**kw):
+    cfg = MockConfig(kalshi_events=3, markets_per_event=4, gamma_markets=25,
+                     trades_per_market=5, latency_sigma=0, **kw)
+    return MockExchange(cfg)
+
+
+def test_catalog_pagination_and_trades():
+    with _mock(max_page=10) as mock:
+        env = mock.env()
+        page = requests.get(env["POLYMARKET_GAMMA_URL"], params={"limit": 50, "offset": 20}).json()
+        assert [g["id"] for g in page] == [str(500_020 + i) for i in range(5)]
+        # server caps the page size like the real API
+        assert len(requests.get(env["POLYMARKET_GAMMA_URL"], params={"limit": 50}).json()) == 10
+
+        base = env["KALSHI_API_BASE"]
+        j = requests.get(f"{base}/markets", params={"limit": 5}).json()
+        assert len(j["markets"]) == 5 and j["cursor"] == "5"
+        trades = requests.get(f"{base}/markets/KXMOCK0-C1/trades").json()["trades"]
+        assert len(trades) == 5 and {"timestamp", "price", "size"} <= set(trades[0])
+
+        clob = requests.get(env["POLYMARKET_CLOB_URL"].format("mock-market-3")).json()
+        assert [o["name"] for o in clob["outcomes"]] == ["Yes", "No"]
+
+
+def test_postgrest_upsert_filter_delete():
+    with _mock() as mock:
+        url = f"{mock.url}/rest/v1/market_snapshots"
+        rows = [{"market_id": "A", "price": 0.1}, {"market_id": "B", "price": 0.2}]
+        assert requests.post(url, json=rows).status_code == 201
+        requests.post(url + "?on_conflict=market_id", json=[{"market_id": "A", "price": 0.3}])
+        got = requests.get(url, params={"market_id": "eq.A", "select": "price"}).json()
+        assert got == [{"price": 0.3}]
+        requests.delete(url, params={"market_id": "eq.B"})
+        assert requests.get(url).json() == [{"market_id": "A", "price": 0.3}]
+
+        known = requests.get(f"{mock.url}/rest/v1/markets",
+                             params={"source": "eq.kalshi", "select": "market_id"}).json()
+        assert len(known) == 12
+        assert mock.stats()["rows_written"]["market_snapshots"] == 3
+
+
+def test_error_injection():
+    with _mock(fail_429=1.0, retry_after=2) as mock:
+        r = requests.get(mock.env()["POLYMARKET_GAMMA_URL"])
+        assert r.status_code == 429 and r.headers["Retry-After"] == "2"
+        # PostgREST is not in the default fail_services
+        assert requests.get(f"{mock.url}/rest/v1/markets").status_code == 200
+        assert mock.stats()["requests"]["429"] == 1
+
+
+def test_run_returns_the_job_exit_code(monkeypatch, capsys):
+    import mockex
+
+    monkeypatch.setattr(mockex, "run_job", lambda mock, cmd: {"exit_code": 3, "cmd": cmd})
+    assert mockex.main(["--kalshi-events", "1", "--gamma-markets", "1",
+                        "--run", "kalshi-update"]) == 3
+    assert '"exit_code": 3' in capsys.readouterr().out
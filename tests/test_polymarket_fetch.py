@@ -17,3 +17,52 @@ def test_expiration_comparison_naive():
     exp_dt = normalize_dt("2020-01-01 00:00:00")
     assert exp_dt <= now
 
+
+
+def test_fetch_gamma_full_catalog(monkeypatch):
+    import polymarket_fetch as pf
+
+    catalog = [{"id": str(i), "volume24hr": i} for i in range(25)]
+    # upstream reshuffles between pages → a duplicate id on a later page
+    catalog.insert(12, {"id": "3"})
+    throttled = set()
+
+    class FakeResp:
+        def __init__(self, status, body=None):
+            self.status_code = status
+            self.headers = {"Retry-After": "0"}
+            self._body = body
+
+        def raise_for_status(self):
+            if self.status_code >= 400:
+                raise pf.requests.HTTPError(response=self)
+
+        def json(self):
+            return self._body
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        off, lim = params["offset"], params["limit"]
+        if off == 10 and off not in throttled:
+            throttled.add(off)
+            return FakeResp(429)
+        return FakeResp(200, catalog[off:off + lim])
+
+    monkeypatch.setattr(pf.requests, "get", fake_get)
+    monkeypatch.setattr(pf.time, "sleep", lambda s: None)
+    out = pf.fetch_gamma(limit=5, max_pages=20, workers=3)
+    assert [m["id"] for m in out] == [str(i) for i in range(25)]
+    assert throttled == {10}
+
+
+def test_malformed_gamma_records_are_skipped():
+    import polymarket_fetch as pf
+
+    raw = [
+        {"id": "ok", "endDate": "2030-01-01", "volume24hr": "12", "liquidity": "5"},
+        {"id": "bad-date", "endDate": "not a date"},
+        {"id": "bad-liquidity", "liquidity": "n/a"},
+        {"id": "bad-price", "lastTradePrice": "0.5"},
+    ]
+    out = pf.to_candidates(raw)
+    assert [c.market.market_id for c in out] == ["ok"]
+    assert out[0].liquidity == 5.0
@@ -1,6 +1,11 @@
-import polymarket_update_prices as pup
+import os
 from datetime import datetime, timezone, timedelta
 
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-key")
+
+import polymarket_update_prices as pup
+
 
 def test_load_active_market_info_filters(monkeypatch):
     now = datetime.now(timezone.utc)
@@ -37,3 +42,30 @@ def test_load_active_market_info_filters(monkeypatch):
     monkeypatch.setattr(pup, "request_json", fake_request_json)
     info = pup.load_active_market_info()
     assert set(info.keys()) == {"1", "4"}
+
+
+def test_scheduler_reaches_markets_past_fetch_limit(monkeypatch):
+    import time
+
+    from scheduler import RefreshScheduler
+
+    now = time.time()
+    active = {str(i): {"slug": f"s{i}", "expiration": None, "status": "TRADING",
+                       "liquidity_type": "clob"} for i in range(1, 6)}
+    # the most overdue market sits past the first FETCH_LIMIT entries
+    sched = RefreshScheduler({mid: {"due": now - (3000 if mid == "5" else 10), "price": None}
+                              for mid in active})
+    monkeypatch.setattr(pup.RefreshScheduler, "for_loader", lambda name: sched)
+    monkeypatch.setattr(pup, "FETCH_LIMIT", 2)
+    monkeypatch.setattr(pup, "load_active_market_info", lambda: active)
+    monkeypatch.setattr(pup, "TRADE_LOG", None)
+    fetched = []
+
+    def fake_enrich(items, lookups):
+        for m in items:
+            fetched.append(m[0])
+            yield m, {"clob": {"outcomes": []}, "stats": None}
+
+    monkeypatch.setattr(pup, "enrich_concurrent", fake_enrich)
+    pup.main()
+    assert len(fetched) == 2 and "5" in fetched
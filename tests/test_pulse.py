@@ -0,0 +1,26 @@
+import importlib.util
+import sys
+
+import pulse
+
+
+def test_commands_point_at_modules():
+    for module, _ in pulse.COMMANDS.values():
+        assert importlib.util.find_spec(module) is not None
+
+
+def test_dispatch_runs_only_the_selected_module(monkeypatch):
+    ran = []
+    monkeypatch.setattr(sys, "argv", sys.argv[:])
+    monkeypatch.setattr(
+        pulse.runpy, "run_module",
+        lambda mod, run_name, alter_sys: ran.append((mod, run_name, sys.argv[1:])),
+    )
+    assert pulse.main(["cleanup", "2024-01-01", "--low-volume"]) == 0
+    assert ran == [("cleanup_markets", "__main__", ["2024-01-01", "--low-volume"])]
+
+
+def test_import_report_budget(capsys):
+    assert pulse.import_report(["price-change"], budget_ms=60_000) == 0
+    assert pulse.import_report(["price-change"], budget_ms=0) == 1
+    assert "price-change" in capsys.readouterr().out
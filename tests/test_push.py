@@ -0,0 +1,47 @@
+import asyncio
+import json
+
+from push import Broadcaster
+
+
+def _row(mid, price, **kw):
+    return {"market_id": mid, "price": price, "source": "kalshi",
+            "timestamp": "2024-05-01T00:00:00Z", **kw}
+
+
+def test_diff_sends_only_changed_fields():
+    b = Broadcaster()
+    assert b.diff(_row("A", 0.4, dollar_volume=10)) == {
+        "p": 0.4, "v": 10, "m": "A", "s": "kalshi", "t": "2024-05-01T00:00:00Z"}
+    assert b.diff(_row("A", 0.4, dollar_volume=10)) is None
+    assert b.diff(_row("A", 0.5, dollar_volume=10))["p"] == 0.5
+
+
+def test_slow_subscriber_gets_coalesced_latest_state():
+    async def run():
+        b = Broadcaster()
+        loop = asyncio.get_running_loop()
+        sub = b.subscribe(loop, markets=["A"])
+        other = b.subscribe(loop, sources=["polymarket"])
+        for p in (0.1, 0.2, 0.3):
+            b.publish([_row("A", p), _row("B", p)])
+        assert other.pending == {}
+
+        frames = b.events(sub, heartbeat=1)
+        assert await frames.__anext__() == "retry: 5000\n\n"
+        frame = await frames.__anext__()
+        batch = json.loads(frame.split("data: ", 1)[1])
+        assert batch == [{"p": 0.3, "m": "A", "s": "kalshi", "t": "2024-05-01T00:00:00Z"}]
+        await frames.aclose()
+        assert len(b) == 1
+
+    asyncio.run(run())
+
+
+def test_stream_cap(monkeypatch):
+    from fastapi.testclient import TestClient
+    import api
+
+    monkeypatch.setattr(api, "BROADCASTER", Broadcaster(max_streams=0))
+    r = TestClient(api.app).get("/stream")
+    assert r.status_code == 503 and r.headers["Retry-After"] == "30"
@@ -0,0 +1,44 @@
+import json
+
+from records import MarketRow, OutcomeRow, SnapshotRow, bucket_of, dumps, to_dicts, to_prob
+
+
+def test_to_prob():
+    assert to_prob(None) is None
+    assert to_prob(55) == 0.55
+    assert to_prob(0.55) == 0.55
+
+
+def test_rows_are_slotted():
+    row = OutcomeRow(market_id="M", outcome_name="Yes", price=0.5,
+                     timestamp="2024-05-01T12:00:00Z", source="kalshi")
+    assert not hasattr(row, "__dict__")
+    assert row["price"] == 0.5
+
+
+def test_dumps_matches_dict_payload():
+    rows = [
+        MarketRow(market_id="M", market_name="N", tags=["kalshi"], source="kalshi"),
+        {"market_id": "raw"},
+    ]
+    assert json.loads(dumps(rows)) == [
+        {
+            "market_id": "M", "market_name": "N", "market_description": None,
+            "event_name": None, "event_ticker": None, "expiration": None,
+            "tags": ["kalshi"], "source": "kalshi", "status": "TRADING",
+        },
+        {"market_id": "raw"},
+    ]
+    snap = SnapshotRow(market_id="M", price=0.1, timestamp="2024-05-01T12:00:00Z", source="s")
+    assert to_dicts([snap])[0]["vwap"] is None
+
+
+def test_rows_are_bucketed():
+    assert bucket_of("2024-05-01T12:04:59.9Z") == "2024-05-01T12:00:00Z"
+    assert bucket_of("2024-05-01T12:05:00+00:00") == "2024-05-01T12:05:00Z"
+    assert bucket_of("2024-05-01T12:07:00", 3600) == "2024-05-01T12:00:00Z"
+    snap = SnapshotRow(market_id="M", price=0.1, timestamp="2024-05-01T12:03:10Z", source="s")
+    assert snap.bucket == "2024-05-01T12:00:00Z"
+    pinned = SnapshotRow(market_id="M", price=0.1, timestamp="2024-05-01T12:03:10Z",
+                         source="s", bucket="2024-05-01T00:00:00Z")
+    assert pinned.bucket == "2024-05-01T00:00:00Z"
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+
+import scheduler
+from scheduler import RefreshScheduler, refresh_interval
+
+
+def test_refresh_interval_bounds():
+    assert refresh_interval() == scheduler.MAX_INTERVAL
+    assert refresh_interval(dollar_volume=10_000_000) == scheduler.MIN_INTERVAL
+    assert refresh_interval(price_move=-0.2) == scheduler.MIN_INTERVAL
+    mid = refresh_interval(dollar_volume=1_000)
+    assert scheduler.MIN_INTERVAL < mid < scheduler.MAX_INTERVAL
+
+    now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    soon = now + timedelta(minutes=30)
+    assert refresh_interval(expiration=soon, now=now) == scheduler.MIN_INTERVAL
+
+
+def test_scheduler_only_returns_due(tmp_path):
+    s = RefreshScheduler()
+    s.sync(["hot", "cold", "new"], now=0)
+    assert sorted(s.due(now=0)) == ["cold", "hot", "new"]
+    s.record("hot", dollar_volume=5_000_000, now=0)
+    s.record("cold", now=0)
+    assert s.due(now=20) == ["new"]
+    s.record("new", dollar_volume=50, now=20)
+
+    path = str(tmp_path / "state.json")
+    s.save(path)
+    s = RefreshScheduler.load(path)
+    assert s.due(now=21) == []
+    assert s.due(now=30) == ["hot"]
+    assert "cold" in s.due(now=3600)
+
+    s.sync(["hot"], now=4000)
+    assert s.due(now=10_000) == ["hot"]
+
+
+def test_due_respects_limit():
+    s = RefreshScheduler()
+    s.sync([f"m{i}" for i in range(10)], now=0)
+    assert len(s.due(now=0, limit=3)) == 3
+
+
+def test_failed_refresh_is_retried_soon():
+    s = RefreshScheduler()
+    s.sync(["m"], now=0)
+    s.record("m", price=0.4, now=0)
+    s.retry("m", now=5000)
+    assert s.due(now=5000 + scheduler.MIN_INTERVAL) == ["m"]
+    assert s.state["m"]["price"] == 0.4
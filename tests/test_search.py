@@ -0,0 +1,96 @@
+import time
+
+from search import SearchIndex
+
+NOW = time.time()
+
+
+def _iso(offset):
+    from datetime import datetime, timezone
+    return datetime.fromtimestamp(NOW + offset, timezone.utc).isoformat()
+
+
+def _index():
+    idx = SearchIndex()
+    idx.upsert([
+        {"market_id": "K1", "market_name": "Trump", "event_name": "2024 presidential election",
+         "tags": ["politics"], "source": "kalshi", "expiration": _iso(3 * 86400)},
+        {"market_id": "P1", "market_name": "Will Trump win the presidency?",
+         "market_description": "Resolves on the election result", "tags": ["politics"],
+         "source": "polymarket", "expiration": _iso(40 * 86400)},
+        {"market_id": "P2", "market_name": "Bitcoin above 100k?", "tags": ["crypto"],
+         "source": "polymarket", "expiration": _iso(3600)},
+    ])
+    idx.upsert([{"market_id": "P1", "dollar_volume": 500.0},
+                {"market_id": "K1", "dollar_volume": 900.0}])
+    return idx
+
+
+def test_full_text_prefix_and_ranking():
+    idx = _index()
+    res = idx.search("trump elec", now=NOW)
+    assert [r["market_id"] for r in res["results"]] == ["K1", "P1"]
+    assert res["facets"]["source"] == {"kalshi": 1, "polymarket": 1}
+    assert res["facets"]["expiry"] == {"7d": 1, "later": 1}
+    assert idx.search("nothing", now=NOW)["total"] == 0
+
+
+def test_facet_filters_and_incremental_update():
+    idx = _index()
+    res = idx.search("", filters={"category": "politics", "expiry": "later"}, now=NOW)
+    assert [r["market_id"] for r in res["results"]] == ["P1"]
+    assert idx.search("", now=NOW)["facets"]["category"] == {"politics": 2, "crypto": 1}
+
+    idx.upsert([{"market_id": "P2", "market_name": "Ethereum above 5k?", "status": "resolved"}])
+    assert idx.search("bitcoin", now=NOW)["total"] == 0
+    hit = idx.search("ethereum", filters={"status": "RESOLVED"}, now=NOW)["results"]
+    assert hit[0]["market_id"] == "P2" and "_exp" not in hit[0]
+
+
+def test_search_endpoint(monkeypatch):
+    from fastapi.testclient import TestClient
+    import api
+
+    monkeypatch.setattr(api, "INDEX", _index())
+    client = TestClient(api.app)
+    body = client.get("/search", params={"q": "trump", "source": "kalshi"}).json()
+    assert body["total"] == 1 and body["results"][0]["market_id"] == "K1"
+    assert client.get("/search", params={"sort": "bogus"}).status_code == 422
+
+
+def test_catalog_feed_polls_new_snapshots(monkeypatch):
+    import requests
+    import api
+    from mockex import MockConfig, MockExchange
+
+    cfg = MockConfig(kalshi_events=2, markets_per_event=2, gamma_markets=3)
+    with MockExchange(cfg) as mock:
+        monkeypatch.setattr(api, "SUPABASE_URL", mock.url)
+        snaps = f"{mock.url}/rest/v1/latest_snapshots"
+        requests.post(snaps, json=[{"market_id": "500001", "price": 0.4, "dollar_volume": 10,
+                                    "timestamp": "2024-05-01T00:00:00Z"}])
+        feed = api.CatalogFeed(SearchIndex())
+        seen = []
+        feed.listeners.append(seen.extend)
+        feed.load()
+        assert len(feed.index.docs) == 7
+        assert feed.index.search("mock thing 1")["results"][0]["price"] == 0.4
+
+        requests.post(snaps, json=[{"market_id": "NEW-1", "price": 0.9, "market_name": "Brand new",
+                                    "timestamp": "2024-05-01T00:05:00Z"}])
+        assert [r["market_id"] for r in feed.poll()] == ["NEW-1"]
+        assert feed.poll() == []
+        assert [r["market_id"] for r in seen] == ["500001", "NEW-1"]
+        assert feed.index.search("brand")["total"] == 1
+
+        # a slow run stamped before NEW-1 writes after it was seen
+        monkeypatch.setattr(api, "IN_FILTER_SIZE", 1)
+        requests.post(snaps, json=[
+            {"market_id": m, "price": 0.2, "timestamp": "2024-05-01T00:03:00Z"}
+            for m in ("500002", "OLD-1", "OLD-2")])
+        requests.post(f"{mock.url}/rest/v1/markets", json=[
+            {"market_id": m, "market_name": f"Late {m}", "source": "kalshi"}
+            for m in ("OLD-1", "OLD-2")])
+        assert sorted(r["market_id"] for r in feed.poll()) == ["500002", "OLD-1", "OLD-2"]
+        assert feed.poll() == []
+        assert feed.index.search("late")["total"] == 2
@@ -0,0 +1,54 @@
+import math
+
+from series import build_series, decode, encode, lttb
+
+
+def test_lttb_keeps_endpoints_and_spike():
+    xs = list(range(1000))
+    ys = [0.5] * 1000
+    ys[437] = 0.95
+    ox, oy = lttb(xs, ys, 50)
+    assert len(ox) == 50 and ox[0] == 0 and ox[-1] == 999
+    assert 0.95 in oy
+    assert lttb(xs[:10], ys[:10], 50) == (xs[:10], ys[:10])
+
+
+def test_encode_round_trip_quantizes_prices():
+    ts = [1_700_000_000, 1_700_000_300, 1_700_000_600]
+    s = encode(ts, [0.12345, 0.5, 0.99999])
+    assert s["dt"] == [300, 300] and s["p"] == [1234, 5000, 10000]
+    t, p = decode(s)
+    assert t == ts and all(math.isclose(a, b, abs_tol=1e-4) for a, b in zip(p, [0.12345, 0.5, 0.99999]))
+
+
+def test_build_series_30_days_to_width():
+    rows = [{"timestamp": f"2024-05-01T00:00:00Z", "price": None}]
+    rows += [
+        {"timestamp": f"2024-05-{1 + i // 288:02d}T{(i % 288) // 12:02d}:{(i % 12) * 5:02d}:00Z",
+         "price": 0.5 + 0.1 * math.sin(i / 100)}
+        for i in range(30 * 288)
+    ]
+    s = build_series(rows, width=300)
+    assert s["points"] == 300 and s["raw_points"] == len(rows)
+    assert len(s["p"]) == 300 and len(s["dt"]) == 299
+    assert s["t0"] == 1714521600
+
+
+def test_history_endpoint(monkeypatch):
+    from fastapi.testclient import TestClient
+    import api
+
+    rows = [{"timestamp": "2024-05-01T00:00:00Z", "price": 0.4},
+            {"timestamp": "2024-05-01T00:05:00Z", "price": 0.41}]
+    seen = {}
+
+    def fake_fetch(table, params):
+        seen.update(params, table=table)
+        return rows
+
+    monkeypatch.setattr(api, "SUPABASE_URL", "https://example.supabase.co")
+    monkeypatch.setattr(api, "fetch_all", fake_fetch)
+    body = TestClient(api.app).get("/history/KX-1", params={"width": 100}).json()
+    assert body == {"market_id": "KX-1", "t0": 1714521600, "dt": [300], "p": [4000, 4100],
+                    "scale": 10000, "points": 2, "raw_points": 2}
+    assert seen["table"] == "market_snapshots" and seen["market_id"] == "eq.KX-1"
@@ -0,0 +1,61 @@
+import common
+from mockex import Leases, MockConfig, MockExchange
+from sharding import ShardLease, shard_of
+
+
+def test_leases_rebalance_and_expire():
+    leases = Leases()
+    a = leases.claim("job", "a", 8, 60, now=0)
+    assert a == list(range(8))
+    # b joins: gets the free half only after a gives back its surplus
+    assert leases.claim("job", "b", 8, 60, now=1) == []
+    assert leases.claim("job", "a", 8, 60, now=2) == [0, 1, 2, 3]
+    assert leases.claim("job", "b", 8, 60, now=3) == [4, 5, 6, 7]
+    # a stops heartbeating; b takes over its shards once the lease lapses
+    assert leases.claim("job", "b", 8, 60, now=50) == [4, 5, 6, 7]
+    assert leases.claim("job", "b", 8, 60, now=70) == list(range(8))
+    leases.release("job", "b")
+    assert leases.claim("job", "c", 8, 60, now=71) == list(range(8))
+
+
+def test_workers_split_markets_without_overlap(monkeypatch):
+    ids = [f"KX-{i}" for i in range(200)]
+    assert shard_of("KX-1", 16) == shard_of("KX-1", 16)
+    with MockExchange(MockConfig(kalshi_events=1, gamma_markets=1)) as mock:
+        monkeypatch.setattr(common, "SUPABASE_URL", mock.url)
+        monkeypatch.setattr(common, "SERVICE_KEY", "mock")
+        w1 = ShardLease("kalshi-update", shards=16, owner="w1", ttl=60)
+        w2 = ShardLease("kalshi-update", shards=16, owner="w2", ttl=60)
+        for w in (w1, w2, w1, w2):
+            w.claim()
+        assert len(w1.shards) == len(w2.shards) == 8
+        mine1, mine2 = set(w1.filter(ids)), set(w2.filter(ids))
+        assert not mine1 & mine2 and mine1 | mine2 == set(ids)
+
+        w2.stop()
+        w1.claim()
+        assert set(w1.filter(ids)) == set(ids)
+
+
+def test_workers_starting_together_split_shards(monkeypatch):
+    import threading
+    import time
+
+    with MockExchange(MockConfig(kalshi_events=1, gamma_markets=1)) as mock:
+        monkeypatch.setattr(common, "SUPABASE_URL", mock.url)
+        monkeypatch.setattr(common, "SERVICE_KEY", "mock")
+        workers = [ShardLease("kalshi-update", shards=16, owner=f"w{i}", ttl=60, settle=0.3)
+                   for i in range(2)]
+        threads = []
+        for w in workers:
+            threads.append(threading.Thread(target=w.start))
+            threads[-1].start()
+            time.sleep(0.05)
+        for t in threads:
+            t.join()
+        try:
+            # the second worker starts its run with a share, not with nothing
+            assert [len(w.shards) for w in workers] == [8, 8]
+        finally:
+            for w in workers:
+                w.stop()
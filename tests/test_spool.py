@@ -0,0 +1,106 @@
+import pytest
+
+import json
+
+from spool import Rejected, Spool
+
+
+def test_flush_batches_by_table(tmp_path):
+    sp = Spool(str(tmp_path))
+    sp.append("market_snapshots", [{"a": 1}, {"a": 2}], None)
+    sp.append("market_snapshots", [{"a": 3}], None)
+    sp.append("markets", [{"market_id": 1}])
+    sent = []
+    assert sp.flush(lambda t, rows, key: sent.append((t, rows, key))) == 4
+    assert sent == [
+        ("market_snapshots", [{"a": 1}, {"a": 2}, {"a": 3}], None),
+        ("markets", [{"market_id": 1}], "market_id"),
+    ]
+    assert sp.pending() == 0
+    assert sp.flush(lambda *a: sent.append(a)) == 0
+
+
+def test_failed_flush_replays_from_ack(tmp_path):
+    sp = Spool(str(tmp_path))
+    sp.append("markets", [{"market_id": 1}])
+    sp.append("market_outcomes", [{"o": 1}], None)
+
+    def down(table, rows, key):
+        if table == "market_outcomes":
+            raise RuntimeError("503")
+
+    with pytest.raises(RuntimeError):
+        sp.flush(down)
+    assert sp.pending() == 1
+
+    # a new process picks up from the acknowledged offset
+    sent = []
+    assert Spool(str(tmp_path)).flush(lambda t, rows, key: sent.append(t)) == 1
+    assert sent == ["market_outcomes"]
+
+
+def test_segments_rotate_and_are_removed(tmp_path):
+    sp = Spool(str(tmp_path), segment_bytes=64)
+    for i in range(5):
+        sp.append("markets", [{"market_id": f"M{i}", "pad": "x" * 40}])
+    assert len(sp._segments()) == 5
+    sp.flush(lambda *a: None, batch_rows=2)
+    assert sp._segments() == [5]
+    assert sp.pending() == 0
+
+
+def test_partial_flush_does_not_resend_accepted_batches(tmp_path):
+    sp = Spool(str(tmp_path))
+    sp.append("market_snapshots", [{"a": i} for i in range(5)], None)
+    calls = []
+
+    def flaky(table, rows, key):
+        calls.append([r["a"] for r in rows])
+        if len(calls) == 2:
+            raise RuntimeError("503")
+
+    with pytest.raises(RuntimeError):
+        sp.flush(flaky, batch_rows=2)
+    assert sp.pending() == 3
+    assert Spool(str(tmp_path)).flush(flaky, batch_rows=2) == 3
+    assert calls == [[0, 1], [2, 3], [2, 3], [4]]
+
+
+def test_rejected_batch_is_dead_lettered(tmp_path):
+    sp = Spool(str(tmp_path))
+    sp.append("markets", [{"market_id": 1}])
+    sp.append("market_outcomes", [{"o": 1}], None)
+    sp.append("markets", [{"market_id": 2}])
+    sent = []
+
+    def sink(table, rows, key):
+        if table == "market_outcomes":
+            raise Rejected("market_outcomes → 400: bad column")
+        sent.extend(rows)
+
+    # the bad batch no longer blocks the ones behind it
+    assert sp.flush(sink) == 2
+    assert sent == [{"market_id": 1}, {"market_id": 2}] and sp.pending() == 0
+    with open(tmp_path / "dead.jsonl") as f:
+        dead = [json.loads(line) for line in f]
+    assert [(d["table"], d["rows"]) for d in dead] == [("market_outcomes", [{"o": 1}])]
+    assert "400" in dead[0]["error"]
+
+
+def test_replayed_overlapping_keys_are_deduped(tmp_path):
+    sp = Spool(str(tmp_path))
+    sp.append("trades", [{"venue": "kalshi", "trade_id": "T1", "price": 0.4},
+                         {"venue": "kalshi", "trade_id": "T2", "price": 0.5}],
+              "venue,trade_id")
+    # a retried run spools the same trade again with a later value
+    sp.append("trades", [{"venue": "kalshi", "trade_id": "T1", "price": 0.41}],
+              "venue,trade_id")
+    sp.append("market_snapshots", [{"a": 1}, {"a": 1}], None)
+    sent = []
+    assert sp.flush(lambda t, rows, key: sent.append((t, rows))) == 4
+    assert sent == [
+        ("trades", [{"venue": "kalshi", "trade_id": "T1", "price": 0.41},
+                    {"venue": "kalshi", "trade_id": "T2", "price": 0.5}]),
+        # plain inserts have no key to collide on and are left alone
+        ("market_snapshots", [{"a": 1}, {"a": 1}]),
+    ]
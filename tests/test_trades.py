@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import common
+from records import to_prob
+from trades import TradeLog, parse_window
+
+NOW = datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+
+
+def _raw(n, start=0, with_id=True):
+    out = []
+    for i in range(start, start + n):
+        t = {"timestamp": (NOW - timedelta(minutes=10 * i)).isoformat(),
+             "price": 40 + i % 20, "size": 1 + i}
+        if with_id:
+            t["trade_id"] = f"T{i}"
+        out.append(t)
+    return out
+
+
+def test_parse_window():
+    assert parse_window("15m") == 900
+    assert parse_window("7d") == 7 * 86400
+    with pytest.raises(ValueError):
+        parse_window("1w")
+
+
+def test_record_dedups_across_runs(tmp_path, monkeypatch):
+    import trades
+
+    monkeypatch.setattr(trades, "write_rows", lambda *a, **kw: None)
+    path = str(tmp_path / "kalshi.json")
+    log = TradeLog("kalshi", path)
+    assert log.record("M", _raw(5), size_key="size", to_price=to_prob) == 5
+    assert log.record("M", _raw(5), size_key="size", to_price=to_prob) == 0
+    log.flush()
+
+    # a later run sees the same page plus two newer trades
+    again = TradeLog("kalshi", path)
+    newer = [{"trade_id": "N1", "timestamp": (NOW + timedelta(minutes=1)).isoformat(),
+              "price": 50, "size": 3},
+             {"trade_id": "N2", "timestamp": (NOW + timedelta(minutes=1)).isoformat(),
+              "price": 52, "size": 1}]
+    assert again.record("M", newer + _raw(5), size_key="size", to_price=to_prob) == 2
+    assert [r.trade_id for r in again.pending] == ["N1", "N2"]
+
+    # trades without an id get a stable content hash
+    anon = TradeLog("polymarket")
+    anon.record("P", _raw(3, with_id=False), size_key="size", to_price=to_prob)
+    ids = [r.trade_id for r in anon.pending]
+    assert len(set(ids)) == 3
+    assert anon.record("P", _raw(3, with_id=False), size_key="size", to_price=to_prob) == 0
+
+
+def test_fills_of_one_transaction_are_kept_apart():
+    fill = {"timestamp": NOW.isoformat(), "price": 50, "amount": 10,
+            "transactionHash": "0xabc"}
+    raw = [fill, {**fill, "outcome": "No"}, dict(fill)]
+    log = TradeLog("polymarket")
+    assert log.record("P", raw, size_key="amount", to_price=to_prob) == 3
+    rows = log.pending
+    assert len({r.trade_id for r in rows}) == 3
+    stored = common.aggregate_trades(raw, NOW - timedelta(hours=1), size_key="amount",
+                                     to_price=to_prob)
+    assert sum(r.size for r in rows) == stored[1]
+
+
+def test_failed_write_keeps_watermark(tmp_path, monkeypatch):
+    import trades
+
+    path = str(tmp_path / "k.json")
+    log = TradeLog("kalshi", path)
+    log.record("M", _raw(3), size_key="size", to_price=to_prob)
+
+    def reject(*a, **kw):
+        raise RuntimeError("trades → 400")
+
+    monkeypatch.setattr(trades, "write_rows", reject)
+    assert log.flush() == 0
+    assert log.marks == {} and log.pending == []
+
+    # the same trades are queued again and stored once the write goes through
+    sent = []
+    monkeypatch.setattr(trades, "write_rows", lambda t, rows, **kw: sent.extend(rows))
+    assert log.record("M", _raw(3), size_key="size", to_price=to_prob) == 3
+    assert log.flush() == 3 and len(sent) == 3
+    assert TradeLog("kalshi", path).marks["M"][1] == ["T0"]
+
+
+def test_flush_upserts_on_trade_id(tmp_path, monkeypatch):
+    from mockex import MockConfig, MockExchange
+
+    with MockExchange(MockConfig(kalshi_events=1, gamma_markets=1)) as mock:
+        monkeypatch.setattr(common, "SUPABASE_URL", mock.url)
+        monkeypatch.setattr(common, "SERVICE_KEY", "mock")
+        monkeypatch.setattr(common, "SPOOL_DIR", None)
+        for _ in range(2):
+            # a fresh log each time, as if the watermark file were lost
+            log = TradeLog("kalshi", str(tmp_path / "k.json"))
+            log.marks.clear()
+            log.record("M", _raw(4), size_key="size", to_price=to_prob)
+            assert log.flush() == 4
+        stored = mock._http.tables.rows["trades"]
+        assert sorted(r["trade_id"] for r in stored) == ["T0", "T1", "T2", "T3"]
+        assert stored[0]["venue"] == "kalshi" and stored[0]["price"] == 0.4
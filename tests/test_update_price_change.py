@@ -0,0 +1,23 @@
+import os
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-key")
+
+import pytest
+
+import update_price_change
+
+
+@pytest.mark.parametrize("result, shown", [(42, 42), (None, 0)])
+def test_main_reports_refreshed_count(monkeypatch, capsys, result, shown):
+    calls = []
+
+    def fake_rpc(fn, params=None):
+        calls.append((fn, params))
+        return result
+
+    monkeypatch.setattr(update_price_change, "call_rpc", fake_rpc)
+    update_price_change.main()
+    # the whole computation is one server-side function call
+    assert calls == [("refresh_price_changes", None)]
+    assert f"recorded 24h change for {shown} markets" in capsys.readouterr().out
@@ -0,0 +1,190 @@
+"""Raw trades from both venues, ingested incrementally into ``trades``.
+
+The price updaters download each market's recent trades only to reduce them
+to a 24h (dollar volume, contracts, VWAP) triple. With ``TRADES_STATE_DIR``
+set they also hand those trades to a :class:`TradeLog`, which:
+
+* normalises them to :class:`records.TradeRow` (probability prices, the
+  venue's trade id, or a content hash when the venue sends none);
+* drops trades at or before a per-market watermark, saved to
+  ``<TRADES_STATE_DIR>/<venue>.json``, so each run uploads only new trades;
+* upserts them into ``trades`` on ``(venue, trade_id)`` and only then
+  advances the saved watermarks, so a rejected write is retried next run.
+
+Windows over the stored history are one query (``trade_stats`` in
+``schema.sql``)::
+
+    python pulse.py trades --window 1h --limit 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from common import call_rpc, write_rows
+from records import TRADE_KEY, TradeRow
+
+TRADES_STATE_DIR = os.environ.get("TRADES_STATE_DIR")
+
+_DURATION = re.compile(r"^(\d+(?:\.\d+)?)([smhd])$")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_window(text: str) -> float:
+    """Return seconds for ``"90s"``, ``"15m"``, ``"1h"`` or ``"7d"``."""
+    m = _DURATION.match(text.strip())
+    if not m:
+        raise ValueError(f"bad window {text!r}; use e.g. 15m, 1h or 7d")
+    return float(m.group(1)) * _UNITS[m.group(2)]
+
+
+def _epoch(value) -> float:
+    dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def normalize(venue: str, market_id: str, raw: dict, *, size_key: str,
+              to_price, nth: int = 0) -> tuple[float, TradeRow] | None:
+    """Return ``(epoch, row)`` for one raw trade, or ``None`` if unusable.
+
+    Trades without a venue id are keyed on a hash of the whole record plus
+    *nth*, its position among identical records in the same response. A
+    transaction hash is not enough: one transaction can carry several fills.
+    """
+    try:
+        epoch = _epoch(raw["timestamp"])
+        price = to_price(raw["price"])
+        size = raw[size_key]
+    except (KeyError, TypeError, ValueError):
+        return None
+    tid = raw.get("trade_id") or raw.get("id")
+    if not tid:
+        basis = json.dumps([market_id, raw, nth], sort_keys=True, default=str)
+        tid = hashlib.sha1(basis.encode()).hexdigest()[:20]
+    ts = datetime.fromtimestamp(epoch, timezone.utc).isoformat().replace("+00:00", "Z")
+    return epoch, TradeRow(venue=venue, trade_id=str(tid), market_id=market_id,
+                           price=price, size=size, timestamp=ts)
+
+
+def _parse(venue: str, market_id: str, raw_trades, size_key: str, to_price):
+    seen: Counter = Counter()
+    for raw in raw_trades or ():
+        nth = 0
+        if isinstance(raw, dict) and not (raw.get("trade_id") or raw.get("id")):
+            key = json.dumps(raw, sort_keys=True, default=str)
+            nth = seen[key]
+            seen[key] += 1
+        t = normalize(venue, market_id, raw, size_key=size_key, to_price=to_price, nth=nth)
+        if t is not None:
+            yield t
+
+
+class TradeLog:
+    """Deduplicating buffer of new trades for one venue."""
+
+    def __init__(self, venue: str, path: str | None = None):
+        self.venue = venue
+        self.path = path
+        # market_id → [latest stored epoch, trade ids at that epoch]
+        self.marks: dict[str, list] = {}
+        # the same for trades queued but not yet stored; committed by flush()
+        self._pending_marks: dict[str, list] = {}
+        self.pending: list[TradeRow] = []
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.marks = json.load(f)
+
+    @classmethod
+    def for_loader(cls, venue: str) -> "TradeLog | None":
+        """Return the persisted trade log for *venue*, if enabled."""
+        if not TRADES_STATE_DIR:
+            return None
+        os.makedirs(TRADES_STATE_DIR, exist_ok=True)
+        return cls(venue, os.path.join(TRADES_STATE_DIR, f"{venue}.json"))
+
+    def record(self, market_id: str, raw_trades, *, size_key: str, to_price) -> int:
+        """Queue the trades of *market_id* not seen before; return how many."""
+        parsed = list(_parse(self.venue, market_id, raw_trades, size_key, to_price))
+        with self._lock:
+            mark, ids = (self._pending_marks.get(market_id)
+                         or self.marks.get(market_id, (0.0, [])))
+            ids = set(ids)
+            new = [(e, r) for e, r in parsed
+                   if e > mark or (e == mark and r.trade_id not in ids)]
+            if not new:
+                return 0
+            top = max(e for e, _ in new)
+            top_ids = {r.trade_id for e, r in new if e == top}
+            if top == mark:
+                top_ids |= ids
+            self._pending_marks[market_id] = [top, sorted(top_ids)]
+            self.pending.extend(r for _, r in new)
+        return len(new)
+
+    def flush(self) -> int:
+        """Store pending trades, then commit and save their watermarks.
+
+        If the write fails the pending watermarks are dropped, so the same
+        trades are queued again the next time they are fetched.
+        """
+        with self._lock:
+            rows, self.pending = self.pending, []
+            marks, self._pending_marks = self._pending_marks, {}
+        if not rows:
+            return 0
+        try:
+            write_rows("trades", rows, conflict_key=TRADE_KEY)
+        except Exception as e:
+            print(f"❌ trades: {len(rows)} rows not stored, will retry: {e}")
+            return 0
+        with self._lock:
+            self.marks.update(marks)
+        self.save()
+        return len(rows)
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            state = json.dumps(self.marks)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(state)
+        os.replace(tmp, self.path)
+
+
+def window_stats(window: float, market_ids=None) -> list[dict]:
+    """Return per-market stats over the last *window* seconds from ``trades``."""
+    since = datetime.now(timezone.utc) - timedelta(seconds=window)
+    return call_rpc("trade_stats", {
+        "p_since": since.isoformat(),
+        "p_market_ids": list(market_ids) if market_ids else None,
+    }) or []
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Volume and VWAP over stored trades")
+    ap.add_argument("--window", default="24h", help="e.g. 15m, 1h, 7d (default 24h)")
+    ap.add_argument("--market", action="append", help="limit to these market ids")
+    ap.add_argument("--limit", type=int, default=20)
+    args = ap.parse_args(argv)
+
+    rows = window_stats(parse_window(args.window), args.market)
+    rows.sort(key=lambda r: float(r.get("dollar_volume") or 0), reverse=True)
+    for r in rows[:args.limit]:
+        print(f"{float(r['dollar_volume']):>14,.2f}  {r['trades']:>6} trades  "
+              f"vwap {r['vwap']}  {r['market_id']}")
+
+
+if __name__ == "__main__":
+    main()